@@ -0,0 +1,286 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from logger import get_logger
+from recorder import Decision
+from settings import API_MAX_OVERRIDE
+from tapo_plug_adapter.dispatcher import CommandDispatcher
+from tapo_plug_adapter.session_pool import SessionPool
+
+logger = get_logger(__name__)
+
+# Seconds a client may take to send its request, and the largest request body accepted.
+REQUEST_TIMEOUT = 5
+MAX_BODY_SIZE = 4096
+
+PLUG_STATES = {"on": True, "off": False}
+
+
+@dataclass(frozen=True, slots=True)
+class Override:
+    """
+    Plug state forced through the API; the control loop keeps it until `until` (Unix time) has passed.
+    """
+
+    state: bool
+    until: float
+
+    def remaining(self, now: float) -> float:
+        return max(0.0, self.until - now)
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ControlApi:
+    """
+    Local JSON API of the controller, served from the caller's event loop:
+
+    - `GET /plugs[?ip=a,b]`: status of every managed plug, or of the listed ones
+    - `GET /plugs/<ip>`: status of one plug
+    - `PUT /plugs/<ip>/override` with `{"state": "on" | "off", "duration": seconds}`: forces the plug
+    - `DELETE /plugs/<ip>/override`: hands the plug back to the control loop
+    - `GET /plugs/<ip>/energy?aggregate=minute|hour|day`: energy buckets of one plug (default: hour)
+
+    Every answer is built from the in-memory control state and the cached plug state, so no request
+    waits for a device. An override is stored in the plug's control state and its command is queued
+    on the dispatcher without awaiting it, so the API answers while the command and its retries run.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        states: dict,
+        session_pool: SessionPool,
+        dispatcher: CommandDispatcher,
+        max_override: float = API_MAX_OVERRIDE,
+        telemetry: Optional[dict] = None,
+    ):
+        """
+        :param states: `ControlState` of every managed plug, by plug IP.
+        :param telemetry: `EnergyTelemetry` of the plugs whose energy is sampled, by plug IP.
+        """
+        self._host = host
+        self._port = port
+        self._states = states
+        self._telemetry = telemetry if telemetry is not None else {}
+        self._session_pool = session_pool
+        self._dispatcher = dispatcher
+        self._max_override = max_override
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> Optional[int]:
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+        logger.info(f"Serving the control API on http://{self._host}:{self.port}/plugs")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def status(self, ip: str, now: Optional[float] = None) -> dict:
+        """
+        :return: Temperature, last decision, cached plug state, override and last energy reading of a
+            managed plug.
+        """
+        now = time.time() if now is None else now
+        state = self._states[ip]
+        plug_adapter = self._session_pool.peek(ip)
+        telemetry = self._telemetry.get(ip)
+        override = state.override
+        if override is not None and override.remaining(now) <= 0:
+            # Expired, the next check clears it.
+            override = None
+        return {
+            "ip": ip,
+            "temp": state.temp,
+            "temp_timestamp": state.timestamp,
+            "decision": (
+                Decision(state.decision).name.lower()
+                if state.decision is not None
+                else None
+            ),
+            "decision_timestamp": state.decision_timestamp,
+            # True for ON, None while the state of the plug isn't known.
+            "plug_state": plug_adapter.cached_state if plug_adapter else None,
+            "safe_mode": state.safe_mode_timestamp is not None,
+            "override": (
+                {
+                    "state": "on" if override.state else "off",
+                    "until": override.until,
+                    "remaining": override.remaining(now),
+                }
+                if override is not None
+                else None
+            ),
+            "energy": telemetry.status() if telemetry is not None else None,
+        }
+
+    def energy(self, ip: str, aggregate: str) -> dict:
+        """
+        :return: The retained buckets of one of the plug's energy aggregates, oldest first.
+        """
+        telemetry = self._telemetry.get(ip)
+        if telemetry is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"no energy telemetry for plug {ip}")
+        try:
+            buckets = telemetry.aggregate(aggregate)
+        except KeyError:
+            raise ApiError(
+                HTTPStatus.BAD_REQUEST, 'aggregate must be "minute", "hour" or "day"'
+            )
+        return {
+            "ip": ip,
+            "aggregate": aggregate,
+            "buckets": [
+                {
+                    "start": bucket.start,
+                    "samples": bucket.count,
+                    "mean_power": bucket.mean_power,
+                    "min_power": bucket.power_min,
+                    "max_power": bucket.power_max,
+                    "energy": bucket.energy,
+                }
+                for bucket in buckets
+            ],
+        }
+
+    def handle(self, method: str, target: str, body: bytes = b"") -> tuple[int, dict]:
+        """
+        Answers a single request.
+        :return: HTTP status and JSON payload.
+        """
+        try:
+            return self._route(method, target, body)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+
+    def _route(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        if not parts or parts[0] != "plugs" or len(parts) > 3:
+            raise ApiError(HTTPStatus.NOT_FOUND, "not found")
+
+        if len(parts) == 1:
+            self._require(method, "GET")
+            ips = list(self._states)
+            if "ip" in (query := parse_qs(url.query)):
+                ips = [ip for value in query["ip"] for ip in value.split(",") if ip]
+                for ip in ips:
+                    self._require_plug(ip)
+            return HTTPStatus.OK, {"plugs": [self.status(ip) for ip in ips]}
+
+        ip = parts[1]
+        self._require_plug(ip)
+        if len(parts) == 2:
+            self._require(method, "GET")
+            return HTTPStatus.OK, self.status(ip)
+
+        if parts[2] == "energy":
+            self._require(method, "GET")
+            aggregate = parse_qs(url.query).get("aggregate", ["hour"])[0]
+            return HTTPStatus.OK, self.energy(ip, aggregate)
+
+        if parts[2] != "override":
+            raise ApiError(HTTPStatus.NOT_FOUND, "not found")
+        self._require(method, "PUT", "DELETE")
+        if method == "DELETE":
+            if self._states[ip].override is not None:
+                self._states[ip].override = None
+                logger.info(f"Manual override of plug {ip} removed through the API.")
+            return HTTPStatus.OK, self.status(ip)
+        self._override(ip, *self._parse_override(body))
+        return HTTPStatus.ACCEPTED, self.status(ip)
+
+    def _require(self, method: str, *allowed: str):
+        if method not in allowed:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "method not allowed")
+
+    def _require_plug(self, ip: str):
+        if ip not in self._states:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"unknown plug {ip}")
+
+    def _parse_override(self, body: bytes) -> tuple[bool, float]:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+        if not isinstance(data, dict) or data.get("state") not in PLUG_STATES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'state must be "on" or "off"')
+        duration = data.get("duration")
+        if (
+            isinstance(duration, bool)
+            or not isinstance(duration, (int, float))
+            or not 0 < duration <= self._max_override
+        ):
+            # Bounded, so a forgotten override can't keep a fridge off for good.
+            raise ApiError(
+                HTTPStatus.BAD_REQUEST,
+                f"duration must be a number of seconds between 0 and {self._max_override}",
+            )
+        return PLUG_STATES[data["state"]], float(duration)
+
+    def _override(self, ip: str, state: bool, duration: float):
+        self._states[ip].override = Override(state, time.time() + duration)
+        logger.info(
+            f"Manual override through the API: plug {ip} {'ON' if state else 'OFF'} for {int(duration)} seconds."
+        )
+        # Applied right away instead of at the next check; the dispatcher logs a failure and
+        # the control loop sends the command again on every check until the override ends.
+        self._dispatcher.submit(ip, state)
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, bytes]:
+        request_line = await reader.readline()
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode(errors="replace").partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if not 0 <= length <= MAX_BODY_SIZE:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        parts = request_line.decode(errors="replace").split()
+        if len(parts) < 2:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "invalid request line")
+        return parts[0], parts[1], body
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                async with asyncio.timeout(REQUEST_TIMEOUT):
+                    method, target, body = await self._read_request(reader)
+                status, payload = self.handle(method, target, body)
+            except ApiError as e:
+                status, payload = e.status, {"error": str(e)}
+            content = (json.dumps(payload) + "\n").encode()
+            status = HTTPStatus(status)
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode()
+                + content
+            )
+            await writer.drain()
+        except (ConnectionError, TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
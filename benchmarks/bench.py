@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.fakes import (
+    FakeApiClient,
+    FakeOwmAdapter,
+    FakeOwmServer,
+    FakeP110Server,
+)
+from controller import ControlState, tick
+from openweathermap_adapter.weather_service import WeatherService
+from tapo_plug_adapter.session_pool import SessionPool
+from tapo_plug_adapter.tapo_plug_adapter import PlugAdapter
+
+# Plugs that share one location, and so one weather request per round.
+PLUGS_PER_LOCATION = 10
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def bench_plugs(
+    plugs: int,
+    rounds: int,
+    p110: FakeP110Server,
+    owm: FakeOwmServer,
+    concurrency: int,
+    interval: float,
+) -> dict:
+    """
+    Runs `rounds` control ticks for each of `plugs` simulated plugs, like the fleet controller would
+    when every tick is due at the same time.
+    :param interval: Seconds between two ticks of a device in production, used to scale the handshake count to an hour.
+    :return: Machine-readable results of this plug count.
+    """
+    api_client = FakeApiClient(p110)
+    names = [f"plug-{plugs}-{index}" for index in range(plugs)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def _tick(name: str, weather, state: ControlState):
+        async with semaphore:
+            started = time.perf_counter()
+            plug_adapter = await session_pool.acquire(name)
+            await tick(plug_adapter, weather, state)
+            latencies.append(time.perf_counter() - started)
+
+    async def _open_session(name: str):
+        async with semaphore:
+            # Switching OFF connects, like the controller's start does; an idle tick wouldn't.
+            await (await session_pool.acquire(name)).turn_off()
+
+    # Every plug count sees the same temperatures, although the locations are shared between runs.
+    owm.reset()
+    # The warm-up opens every session; memory is measured once they are established.
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    session_pool = SessionPool(
+        adapter_factory=lambda ip: PlugAdapter(ip, api_client=api_client)
+    )
+    weather_service = WeatherService(FakeOwmAdapter(owm), ttl=0)
+    devices = [
+        (
+            name,
+            weather_service.for_location(f"City {index // PLUGS_PER_LOCATION}"),
+            ControlState(),
+        )
+        for index, name in enumerate(names)
+    ]
+    await asyncio.gather(*(_open_session(name) for name in names))
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    handshakes, plug_requests, owm_requests = (
+        p110.handshakes,
+        p110.requests,
+        owm.requests,
+    )
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(_tick(*device) for device in devices))
+    elapsed = time.perf_counter() - started
+
+    ticks = plugs * rounds
+    handshakes = p110.handshakes - handshakes
+    return {
+        "plugs": plugs,
+        "ticks": ticks,
+        "seconds": round(elapsed, 6),
+        "throughput_ticks_per_second": round(ticks / elapsed, 2),
+        "tick_latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+        "handshakes": handshakes,
+        "handshakes_per_device_hour": round(handshakes / ticks * 3600 / interval, 4),
+        "plug_requests_per_tick": round((p110.requests - plug_requests) / ticks, 3),
+        "owm_requests": owm.requests - owm_requests,
+        "memory_per_device_bytes": memory // plugs,
+    }
+
+
+async def run(args) -> dict:
+    p110 = FakeP110Server(
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        handshake_latency=args.handshake_latency,
+        seed=args.seed,
+    )
+    owm = FakeOwmServer(latency=args.owm_latency, seed=args.seed)
+    async with p110, owm:
+        results = [
+            await bench_plugs(
+                plugs, args.rounds, p110, owm, args.concurrency, args.interval
+            )
+            for plugs in args.plugs
+        ]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output",)
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks control ticks against local stand-ins for the P110 and OWM."
+    )
+    parser.add_argument("--plugs", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="plug request latency (s)"
+    )
+    parser.add_argument("--handshake-latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--owm-latency", type=float, default=0.02)
+    parser.add_argument(
+        "--interval", type=float, default=600, help="production tick interval (s)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Per-tick INFO logging would dominate the measurement.
+    logging.disable(logging.INFO)
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import random
+import types
+from typing import Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+
+async def http_request(
+    port: int, method: str, path: str, body: Optional[dict] = None
+) -> tuple[int, dict]:
+    """
+    Sends one HTTP/1.1 request to a local server and returns the status and the decoded JSON body.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        payload = json.dumps(body).encode() if body is not None else b""
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        data = await reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else {}
+    finally:
+        writer.close()
+
+
+class FakeHttpServer:
+    """
+    Minimal asyncio HTTP server with configurable latency and failure rate.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port: Optional[int] = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(
+            self._serve, "127.0.0.1", 0, backlog=4096
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def handle(
+        self, method: str, path: str, query: dict, body: dict
+    ) -> tuple[int, dict]:
+        raise NotImplementedError
+
+    def may_fail(self, path: str) -> bool:
+        return True
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode().split(" ", 2)
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            body = json.loads(await reader.readexactly(length)) if length else {}
+            url = urlsplit(target)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.may_fail(url.path) and self._random.random() < self.failure_rate:
+                self.failures += 1
+                status, response = 500, {"error": "injected failure"}
+            else:
+                status, response = self.handle(method, url.path, query, body)
+
+            payload = json.dumps(response).encode()
+            writer.write(
+                f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode()
+                + payload
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeP110Server(FakeHttpServer):
+    """
+    Stands in for any number of P110 plugs, addressed as /plugs/<name>/....
+
+    A handshake (`POST /plugs/<name>/handshake`) costs `handshake_latency` on top of the request latency,
+    like the KLAP key exchange of a real plug. Failures are only injected into device requests: a failed
+    handshake would send `PlugAdapter` into minutes of tenacity backoff.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        handshake_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(latency, failure_rate, seed)
+        self.handshake_latency = handshake_latency
+        self.handshakes = 0
+        self.switches = 0
+        self._device_on: dict[str, bool] = {}
+
+    def may_fail(self, path: str) -> bool:
+        return not path.endswith("/handshake")
+
+    def handle(self, method, path, query, body):
+        _, _, name, action = path.split("/", 3)
+        if action == "handshake":
+            self.handshakes += 1
+            return 200, {"session": name}
+        if action == "get_device_info":
+            return 200, {
+                "device_on": self._device_on.get(name, False),
+                "nickname": name,
+            }
+        if action in ("on", "off"):
+            device_on = action == "on"
+            if self._device_on.get(name, False) != device_on:
+                self.switches += 1
+            self._device_on[name] = device_on
+            return 200, {}
+        if action == "get_current_power":
+            return 200, {"current_power": 85 if self._device_on.get(name) else 0}
+        if action == "get_energy_usage":
+            return 200, {"today_energy": 420}
+        return 404, {"error": f"unknown action {action}"}
+
+    def device_on(self, name: str) -> bool:
+        return self._device_on.get(name, False)
+
+
+class FakeP110Device:
+    """
+    Client of one plug on a `FakeP110Server`, with the methods of the tapo P110 handler that
+    `PlugAdapter` uses.
+    """
+
+    def __init__(self, server: FakeP110Server, name: str):
+        self._server = server
+        self._name = name
+
+    async def _call(self, action: str) -> dict:
+        status, response = await http_request(
+            self._server.port, "POST", f"/plugs/{self._name}/{action}", {}
+        )
+        if status != 200:
+            raise RuntimeError(f"Plug {self._name} answered {status} to {action}")
+        return response
+
+    async def get_device_info(self):
+        return types.SimpleNamespace(**(await self._call("get_device_info")))
+
+    async def on(self):
+        await self._call("on")
+
+    async def off(self):
+        await self._call("off")
+
+    async def get_current_power(self):
+        return types.SimpleNamespace(**(await self._call("get_current_power")))
+
+    async def get_energy_usage(self):
+        return types.SimpleNamespace(**(await self._call("get_energy_usage")))
+
+
+class FakeApiClient:
+    """
+    Replacement of `tapo.ApiClient`; `p110(ip)` performs a handshake with the fake server and treats
+    the IP as the plug name.
+    """
+
+    def __init__(self, server: FakeP110Server):
+        self._server = server
+
+    async def p110(self, ip: str) -> FakeP110Device:
+        await asyncio.sleep(self._server.handshake_latency)
+        status, _ = await http_request(
+            self._server.port, "POST", f"/plugs/{ip}/handshake", {}
+        )
+        if status != 200:
+            raise RuntimeError(f"Handshake with plug {ip} failed")
+        return FakeP110Device(self._server, ip)
+
+
+class FakeOwmServer(FakeHttpServer):
+    """
+    Stands in for the OWM current weather endpoint: `GET /weather?q=<location>`.
+
+    Each location follows a sine wave around the default threshold, so plugs keep switching.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        super().__init__(latency, failure_rate, seed)
+        self._calls: dict[str, int] = {}
+
+    def reset(self):
+        """
+        Starts every location over at the beginning of its wave.
+        """
+        self._calls.clear()
+
+    def temp(self, location: str) -> float:
+        calls = self._calls.get(location, 0)
+        self._calls[location] = calls + 1
+        return [1.0, 4.0, 7.0, 4.0][calls % 4]
+
+    def handle(self, method, path, query, body):
+        if path != "/weather":
+            return 404, {"error": "not found"}
+        return 200, {"main": {"temp": self.temp(query.get("q", ""))}}
+
+
+class FakeOwmAdapter:
+    """
+    Drop-in for `WeatherAdapter` backed by a `FakeOwmServer`, usable by `WeatherService`.
+    """
+
+    def __init__(self, server: FakeOwmServer):
+        self._server = server
+
+    def city_id(self, location: str) -> Optional[int]:
+        return None
+
+    async def fetch_current_temp(self, location: str = "") -> float:
+        status, response = await http_request(
+            self._server.port, "GET", f"/weather?q={quote(location)}"
+        )
+        if status != 200:
+            raise RuntimeError(f"OWM answered {status}")
+        return response["main"]["temp"]
+
+    async def fetch_temps_by_ids(self, city_ids: list[int]) -> dict[int, float]:
+        return {}
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing an entry point should stay below this many milliseconds on a Raspberry Pi class machine;
+# pyowm alone used to take longer than that.
+DEFAULT_TARGET_MS = 150.0
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, float, float]]:
+    """
+    Parses the report of `python -X importtime`.
+    :return: (module name, nesting depth, self time in ms, cumulative time in ms) in report order,
+        where every module comes after the modules it imported.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # The header line.
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append(
+            (name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000)
+        )
+    return entries
+
+
+def direct_imports(
+    entries: list[tuple[str, int, float, float]], module: str
+) -> dict[str, float]:
+    """
+    :return: Cumulative import time in ms of every module the top-level `module` imported first.
+    """
+    index = next(
+        index
+        for index, (name, depth, _, _) in enumerate(entries)
+        if name == module and depth == 0
+    )
+    children = {}
+    for name, depth, _, cumulative in reversed(entries[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children[name] = cumulative
+    return children
+
+
+def measure_import(module: str, env: dict) -> tuple[float, dict[str, float]]:
+    """
+    Imports the module in a fresh interpreter, so nothing is cached in `sys.modules`.
+    :return: Cumulative import time of the module in ms and the time of each of its direct imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = parse_importtime(result.stderr)
+    total = next(
+        cumulative
+        for name, depth, _, cumulative in entries
+        if name == module and depth == 0
+    )
+    return total, direct_imports(entries, module)
+
+
+def startup_report(modules: list[str], runs: int, target_ms: float, env: dict) -> dict:
+    report = {"target_ms": target_ms, "modules": {}}
+    for module in modules:
+        timings = []
+        imports = {}
+        for _ in range(runs):
+            total, imports = measure_import(module, env)
+            timings.append(total)
+        slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:10]
+        median = statistics.median(timings)
+        report["modules"][module] = {
+            "median_ms": round(median, 1),
+            "min_ms": round(min(timings), 1),
+            "within_target": median <= target_ms,
+            # The first candidates for a lazy import.
+            "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+        }
+    return report
+
+
+def _environment(settings: str, directory: str) -> dict:
+    env = dict(os.environ)
+    if not os.path.exists(os.path.join(ROOT, "settings.py")):
+        # Measure against the template when no local configuration exists.
+        shutil.copy(settings, os.path.join(directory, "settings.py"))
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [directory, env.get("PYTHONPATH")])
+        )
+    return env
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measures how long importing the entry points takes in a fresh interpreter."
+    )
+    parser.add_argument("--modules", nargs="+", default=["controller", "fleet"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS)
+    parser.add_argument(
+        "--settings",
+        default=os.path.join(ROOT, "settings.template"),
+        help="settings used when there is no settings.py",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        env = _environment(args.settings, directory)
+        report = startup_report(args.modules, args.runs, args.target_ms, env)
+    print(json.dumps(report, indent=2))
+    within_target = all(
+        result["within_target"] for result in report["modules"].values()
+    )
+    return 0 if within_target else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
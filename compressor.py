@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from logger import get_logger
+from metrics import DEFERRED_COMMANDS
+from settings import (
+    COMPRESSOR_MAX_SWITCHES_PER_HOUR,
+    COMPRESSOR_MIN_REST,
+    COMPRESSOR_MIN_RUN,
+)
+
+logger = get_logger(__name__)
+
+HOUR = 60 * 60
+
+
+@dataclass(slots=True)
+class _Command:
+    state: bool
+    plug_adapter: object
+    due: float
+
+
+@dataclass(slots=True)
+class _Plug:
+    # Last state the plug was switched to, None until the guard knows it.
+    state: Optional[bool] = None
+    # Time of the last switch, None if it isn't known.
+    switched_at: Optional[float] = None
+    # Times of the switches of the last hour, oldest first.
+    switches: deque = field(default_factory=deque)
+    # Deferred command, replaced by every later command for the plug.
+    pending: Optional[_Command] = None
+
+
+class CompressorGuard:
+    """
+    Keeps the decisions from short-cycling the fridge's compressor: once switched ON a plug stays ON for
+    at least `min_run` seconds, once switched OFF it stays OFF for at least `min_rest` seconds, and it is
+    switched at most `max_switches_per_hour` times per hour. A `0` or `None` disables a limit.
+
+    A command that would break a limit is deferred to the earliest time it is allowed. A later command
+    for the same plug replaces it, and one that asks for the current state drops it. Deferred commands
+    of every plug are kept in a single heap that one task (`run()`) works through, so waiting plugs cost
+    a heap entry each and no sleeping task.
+    """
+
+    def __init__(
+        self,
+        min_run: float = COMPRESSOR_MIN_RUN,
+        min_rest: float = COMPRESSOR_MIN_REST,
+        max_switches_per_hour: Optional[int] = COMPRESSOR_MAX_SWITCHES_PER_HOUR,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if min_run < 0 or min_rest < 0:
+            raise ValueError("min_run and min_rest must not be negative")
+        if max_switches_per_hour is not None and max_switches_per_hour < 0:
+            raise ValueError("max_switches_per_hour must not be negative")
+
+        self._min_run = min_run
+        self._min_rest = min_rest
+        self._max_switches = max_switches_per_hour
+        self._clock = clock
+        self._plugs: dict[str, _Plug] = {}
+        self._queue: list[tuple[float, int, str, _Command]] = []
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._running: set[asyncio.Task] = set()
+        self._subscribers: list[Callable[[str, bool], None]] = []
+
+    def protect(self, plug_adapter) -> "ProtectedPlug":
+        """
+        :return: The adapter with its `turn_on()` and `turn_off()` going through the guard.
+        """
+        return ProtectedPlug(self, plug_adapter)
+
+    def subscribe(self, callback: Callable[[str, bool], None]):
+        """
+        Calls `callback` with the plug IP and state whenever the plug confirmed a deferred command,
+        e.g. so the command journal can mark it done.
+        """
+        self._subscribers.append(callback)
+
+    def record_switch(self, ip: str, state: bool, switched_ago: Optional[float] = 0.0):
+        """
+        Tells the guard about a switch that didn't go through it, e.g. the OFF at startup or the last
+        switch before a restart.
+        :param switched_ago: Seconds since the switch, None if only the state is known.
+        """
+        plug = self._plugs.setdefault(ip, _Plug())
+        plug.state = state
+        if switched_ago is not None:
+            plug.switched_at = self._clock() - switched_ago
+            plug.switches.append(plug.switched_at)
+
+    def switched_ago(self, ip: str) -> Optional[float]:
+        """
+        :return: Seconds since the last switch of the plug, None if it isn't known.
+        """
+        plug = self._plugs.get(ip)
+        if plug is None or plug.switched_at is None:
+            return None
+        return self._clock() - plug.switched_at
+
+    def earliest(self, ip: str, state: bool) -> float:
+        """
+        :return: Earliest time (of the guard's clock) at which the plug may be switched to `state`.
+        """
+        now = self._clock()
+        plug = self._plugs.get(ip)
+        if plug is None or plug.state is None or plug.state is state:
+            return now
+
+        due = now
+        if plug.switched_at is not None:
+            # Switching OFF ends a run, switching ON ends a rest.
+            due = plug.switched_at + (self._min_run if plug.state else self._min_rest)
+        while plug.switches and plug.switches[0] <= now - HOUR:
+            plug.switches.popleft()
+        if self._max_switches and len(plug.switches) >= self._max_switches:
+            due = max(due, plug.switches[-self._max_switches] + HOUR)
+        return max(now, due)
+
+    async def request(self, plug_adapter, state: bool) -> bool:
+        """
+        Switches the plug now if the limits allow it, otherwise defers the command.
+        :param state: True to turn the plug ON, False to turn it OFF.
+        :return: True if the command was sent, False if it was deferred.
+        """
+        ip = plug_adapter.ip
+        plug = self._plugs.setdefault(ip, _Plug())
+        due = self.earliest(ip, state)
+        if due <= self._clock():
+            plug.pending = None
+            await self._send(ip, plug, plug_adapter, state)
+            return True
+
+        if plug.pending is None or plug.pending.state is not state:
+            DEFERRED_COMMANDS.inc()
+            plug.pending = _Command(state, plug_adapter, due)
+            self._push(ip, plug.pending)
+        logger.info(
+            f"Compressor protection: turning plug {ip} {'ON' if state else 'OFF'} "
+            f"in {int(plug.pending.due - self._clock())} seconds"
+        )
+        return False
+
+    async def _send(self, ip: str, plug: _Plug, plug_adapter, state: bool):
+        if state:
+            await plug_adapter.turn_on()
+        else:
+            await plug_adapter.turn_off()
+        if plug.state is not state:
+            # Counted even if the device didn't confirm it: a switch that might have happened still wears the compressor.
+            plug.state = state
+            plug.switched_at = self._clock()
+            plug.switches.append(plug.switched_at)
+
+    def _push(self, ip: str, command: _Command):
+        # The sequence number keeps heap entries comparable when due times are equal.
+        self._sequence += 1
+        heapq.heappush(self._queue, (command.due, self._sequence, ip, command))
+        self._wakeup.set()
+
+    async def _wait_for_next_command(self):
+        self._wakeup.clear()
+        timeout = None
+        if self._queue:
+            timeout = self._queue[0][0] - self._clock()
+            if timeout <= 0:
+                return
+        try:
+            async with asyncio.timeout(timeout):
+                await self._wakeup.wait()
+        except TimeoutError:
+            pass
+
+    async def run(self):
+        """
+        Sends deferred commands once they are due, until cancelled.
+        """
+        try:
+            while True:
+                await self._wait_for_next_command()
+                while self._queue and self._queue[0][0] <= self._clock():
+                    _, _, ip, command = heapq.heappop(self._queue)
+                    plug = self._plugs[ip]
+                    if plug.pending is not command:
+                        # Replaced or dropped by a later command.
+                        continue
+                    command.due = self.earliest(ip, command.state)
+                    if command.due > self._clock():
+                        self._push(ip, command)
+                        continue
+                    plug.pending = None
+                    task = asyncio.create_task(self._send_deferred(ip, plug, command))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+        finally:
+            for task in self._running:
+                task.cancel()
+
+    async def _send_deferred(self, ip: str, plug: _Plug, command: _Command):
+        try:
+            await self._send(ip, plug, command.plug_adapter, command.state)
+        except Exception as e:
+            logger.error(
+                f"Failed to turn plug {ip} {'ON' if command.state else 'OFF'}: {str(e)}"
+            )
+            return
+        # The adapter logs and swallows device errors, so only a confirmed state is reported.
+        if command.plug_adapter.cached_state is command.state:
+            for callback in self._subscribers:
+                callback(ip, command.state)
+
+
+class ProtectedPlug:
+    """
+    A plug adapter whose commands go through a `CompressorGuard`; everything else is the adapter's.
+    """
+
+    def __init__(self, guard: CompressorGuard, plug_adapter):
+        self._guard = guard
+        self._plug_adapter = plug_adapter
+
+    def __getattr__(self, name: str):
+        return getattr(self._plug_adapter, name)
+
+    async def turn_on(self) -> bool:
+        """
+        :return: True if the command was sent, False if it was deferred.
+        """
+        return await self._guard.request(self._plug_adapter, True)
+
+    async def turn_off(self) -> bool:
+        """
+        :return: True if the command was sent, False if it was deferred.
+        """
+        return await self._guard.request(self._plug_adapter, False)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import math
+import os
+import tomllib
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+
+from logger import get_logger
+from settings import (
+    CONFIG_RELOAD_INTERVAL,
+    CONTROLLER_JITTER,
+    CONTROLLER_TIMEOUT,
+    TEMPERATURE_DELTA,
+    TEMPERATURE_THRESHOLD,
+)
+
+logger = get_logger(__name__)
+
+# Keys that may be changed while the controller runs, globally or per plug IP.
+TUNABLE_KEYS = ("threshold", "delta", "interval")
+
+
+@dataclass(frozen=True, slots=True)
+class Tuning:
+    """
+    Values of a device that can be changed without a restart.
+    """
+
+    threshold: float = TEMPERATURE_THRESHOLD
+    delta: float = TEMPERATURE_DELTA
+    # Seconds between two checks.
+    interval: float = CONTROLLER_TIMEOUT
+
+    def __post_init__(self):
+        for key in TUNABLE_KEYS:
+            value = getattr(self, key)
+            if (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float))
+                or not math.isfinite(value)
+            ):
+                raise ValueError(f"{key} must be a finite number, got {value!r}")
+        if self.delta <= 0:
+            raise ValueError("delta must be positive")
+        if self.interval <= 0:
+            raise ValueError("interval must be positive")
+
+
+@dataclass(frozen=True, slots=True)
+class RuntimeConfig:
+    """
+    Overrides read from the config file: `defaults` apply to every device, `devices` to single plug IPs.
+    """
+
+    defaults: dict[str, float] = field(default_factory=dict)
+    devices: dict[str, dict[str, float]] = field(default_factory=dict)
+
+    def tuning(self, plug_ip: str, base: Tuning = Tuning()) -> Tuning:
+        """
+        :param plug_ip: IP of the device's plug.
+        :param base: Values of the device where the file doesn't override them.
+        :return: The values the device should run with.
+        """
+        return replace(base, **{**self.defaults, **self.devices.get(plug_ip, {})})
+
+
+def _overrides(data, where: str) -> dict[str, float]:
+    if not isinstance(data, dict):
+        raise ValueError(f"{where} must be a table")
+    unknown = set(data) - set(TUNABLE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keys in {where}: {', '.join(sorted(unknown))}")
+    return dict(data)
+
+
+def parse_config(data: dict) -> RuntimeConfig:
+    """
+    Validates the content of a config file, e.g.
+    `{"threshold": 5.0, "delta": 2.0, "interval": 600, "devices": {"192.168.1.50": {"threshold": 4.0}}}`.
+    :raise ValueError: If a key is unknown or a value (alone or combined with the defaults) is invalid.
+    """
+    data = dict(data)
+    devices = data.pop("devices", {})
+    if not isinstance(devices, dict):
+        raise ValueError("devices must be a table keyed by plug IP")
+    config = RuntimeConfig(
+        _overrides(data, "the config file"),
+        {ip: _overrides(values, f"device {ip}") for ip, values in devices.items()},
+    )
+    # Every combination has to make a valid tuning, so a bad file is rejected as a whole.
+    for ip in ["", *config.devices]:
+        if config.tuning(ip).interval <= CONTROLLER_JITTER:
+            raise ValueError("interval must be larger than CONTROLLER_JITTER")
+    return config
+
+
+def load_config(path: str) -> RuntimeConfig:
+    """
+    Reads a TOML (`.toml`) or JSON file.
+    :raise ValueError: If the file can't be parsed or is invalid.
+    :raise OSError: If the file can't be read.
+    """
+    with open(path, "rb") as file:
+        if path.endswith(".toml"):
+            data = tomllib.load(file)
+        else:
+            data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError("the config file must hold a table")
+    return parse_config(data)
+
+
+class ConfigWatcher:
+    """
+    Reloads the config file when its modification time or size changes.
+
+    A file that can't be read or doesn't validate is logged and ignored: the running configuration is
+    only ever replaced as a whole by a valid one. Subscribers are called on the event loop with the
+    complete new configuration, so a check runs either on the old values or on the new ones, never on a mix.
+    """
+
+    def __init__(self, path: str, interval: float = CONFIG_RELOAD_INTERVAL):
+        self._path = path
+        self._interval = interval
+        self._subscribers: list[Callable[[RuntimeConfig], None]] = []
+        self._signature = self._stat()
+        # An invalid file at startup fails fast instead of running on values nobody asked for.
+        self._config = load_config(path)
+
+    @property
+    def config(self) -> RuntimeConfig:
+        return self._config
+
+    def subscribe(self, callback: Callable[[RuntimeConfig], None]):
+        """
+        Calls `callback` with the current configuration and again after every successful reload.
+        """
+        self._subscribers.append(callback)
+        callback(self._config)
+
+    def _stat(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def check(self) -> bool:
+        """
+        Reloads the file if it changed.
+        :return: True if a new configuration was applied.
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        loop = asyncio.get_running_loop()
+        try:
+            config = await loop.run_in_executor(None, load_config, self._path)
+        except (OSError, ValueError) as e:
+            logger.error(
+                f"Ignoring invalid config file {self._path}, keeping the running configuration: {str(e)}"
+            )
+            return False
+
+        if config == self._config:
+            return False
+        self._config = config
+        logger.info(f"Reloaded config file {self._path}")
+        for callback in self._subscribers:
+            callback(config)
+        return True
+
+    async def run(self):
+        """
+        Polls the file every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.check()
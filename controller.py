@@ -1,86 +1,457 @@
 import asyncio
 import time
+from dataclasses import dataclass, field
 from typing import Optional
 
-from logger import get_logger
+from api import ControlApi, Override
+from compressor import CompressorGuard
+from config import ConfigWatcher, RuntimeConfig, Tuning
+from events import EventSource
+from journal import CommandJournal
+from logger import configure_logging, get_logger
+from metrics import SAFE_MODE_SECONDS, TEMP_CACHE, MetricsServer, timed
 from openweathermap_adapter.weather_adapter import WeatherAdapter
-from settings import CONTROLLER_TIMEOUT, TEMPERATURE_DELTA, TEMPERATURE_THRESHOLD
-from tapo_plug_adapter.tapo_plug_adapter import PlugAdapter
+from polling import create_polling_policy
+from recorder import Decision, Recorder
+from resilience import deadline
+from snapshot import Snapshot, load_snapshot, save_snapshot
+from scheduler import Ticker
+from settings import (
+    API_HOST,
+    API_PORT,
+    CONFIG_FILE,
+    CONTROLLER_JITTER,
+    CONTROLLER_POLLING,
+    CONTROLLER_TIMEOUT,
+    ENERGY_SAMPLE_INTERVAL,
+    EVENT_LISTEN,
+    JOURNAL_FILE,
+    JOURNAL_MAX_AGE,
+    METRICS_HOST,
+    METRICS_PORT,
+    RECORDER_DIR,
+    SENSOR_SOURCE,
+    STATE_FILE,
+    STATE_MAX_AGE,
+    TAPO_PLUG_IP,
+    TEMPERATURE_SOURCE,
+    TICK_DEADLINE,
+)
+from tapo_plug_adapter.dispatcher import CommandDispatcher
+from tapo_plug_adapter.session_pool import SessionPool
+from telemetry import EnergyTelemetry
+from temperature_provider import (
+    TemperatureProvider,
+    create_sensor,
+    create_temperature_provider,
+)
 from util import is_temperature_above_threshold, is_temperature_below_threshold
 
 logger = get_logger(__name__)
 TEMP_CACHE_TTL_SECONDS = 60 * 30
 
 
-async def init():
-    await PlugAdapter().turn_off()
+@dataclass(slots=True)
+class ControlState:
+    """
+    Per-device control state: the temperature cache, the safe mode clock and the last decision.
+    """
+
+    temp: Optional[float] = None
+    timestamp: Optional[float] = None
+    first_fetch_failure_timestamp: Optional[float] = None
+    # True if the last tick fetched its temperature, False if it had to fall back to the cache.
+    measured: bool = False
+    # Time of the last tick spent in safe mode, None while not in safe mode.
+    safe_mode_timestamp: Optional[float] = None
+    # Thresholds and interval; replaced as a whole when the config file changes.
+    tuning: Tuning = field(default_factory=Tuning)
+    # Outcome and time of the last check, as served by the local API.
+    decision: Optional[Decision] = None
+    decision_timestamp: Optional[float] = None
+    # Manual override set through the local API, None while the loop decides on its own.
+    override: Optional[Override] = None
+
+
+async def init(session_pool: SessionPool, guard: Optional[CompressorGuard] = None):
+    plug_adapter = await session_pool.acquire(TAPO_PLUG_IP)
+    await plug_adapter.turn_off()
+    if guard is not None:
+        # The plug may have been ON until just now, so give the compressor its rest.
+        guard.record_switch(TAPO_PLUG_IP, False)
+
+
+async def resume(
+    session_pool: SessionPool,
+    state: ControlState,
+    snapshot: Snapshot,
+    guard: Optional[CompressorGuard] = None,
+):
+    """
+    Continues from a snapshot instead of `init()`: the cached temperature and the safe mode clock
+    survive the restart, and the plug is neither contacted nor switched off.
+    """
+    state.temp = snapshot.temp
+    state.timestamp = snapshot.timestamp
+    state.first_fetch_failure_timestamp = snapshot.first_fetch_failure_timestamp
+    plug_adapter = await session_pool.acquire(TAPO_PLUG_IP)
+    if snapshot.plug_state is not None:
+        plug_adapter.assume_state(snapshot.plug_state, snapshot.age())
+        if guard is not None:
+            # The run or rest that was going on before the restart keeps counting.
+            guard.record_switch(
+                TAPO_PLUG_IP,
+                snapshot.plug_state,
+                (
+                    time.time() - snapshot.last_switch_timestamp
+                    if snapshot.last_switch_timestamp is not None
+                    else None
+                ),
+            )
+    logger.info(
+        f"Resumed from the state snapshot of {int(snapshot.age())} seconds ago."
+    )
+
+
+async def _save_state(
+    state: ControlState, plug_adapter, guard: Optional[CompressorGuard] = None
+):
+    switched_ago = guard.switched_ago(TAPO_PLUG_IP) if guard is not None else None
+    snapshot = Snapshot(
+        temp=state.temp,
+        timestamp=state.timestamp,
+        first_fetch_failure_timestamp=state.first_fetch_failure_timestamp,
+        plug_state=plug_adapter.cached_state,
+        last_switch_timestamp=(
+            time.time() - switched_ago if switched_ago is not None else None
+        ),
+    )
+    loop = asyncio.get_running_loop()
+    try:
+        # fsync can take a while on an SD card, keep it off the event loop.
+        await loop.run_in_executor(None, save_snapshot, STATE_FILE, snapshot)
+    except OSError as e:
+        logger.warning(f"Failed to save the state snapshot: {str(e)}")
+
+
+def _track_safe_mode(state: ControlState, now: float, in_safe_mode: bool):
+    if state.safe_mode_timestamp is not None:
+        SAFE_MODE_SECONDS.inc(now - state.safe_mode_timestamp)
+    state.safe_mode_timestamp = now if in_safe_mode else None
+
+
+@timed("tick")
+async def tick(
+    plug_adapter,
+    temperature_provider: TemperatureProvider,
+    state: ControlState,
+    recorder: Optional[Recorder] = None,
+) -> Optional[float]:
+    """
+    Runs a single control iteration: fetches the temperature and changes the power status if needed.
+    :param plug_adapter: Adapter of the smart plug that powers the fridge.
+    :param temperature_provider: Source of the temperature, e.g. the OWM adapter or a local sensor.
+    :param state: Control state of the device, updated in place.
+    :param recorder: Recorder the outcome of the iteration is appended to, if any.
+    :return: The temperature the decision was based on, None if no valid temperature was available
+        or a manual override decided.
+    """
+    # Retries of the weather fetch and the plug commands give up once the deadline has passed.
+    with deadline(TICK_DEADLINE):
+        return await _tick(plug_adapter, temperature_provider, state, recorder)
+
+
+async def _tick(
+    plug_adapter,
+    temperature_provider: TemperatureProvider,
+    state: ControlState,
+    recorder: Optional[Recorder],
+) -> Optional[float]:
+    logger.info("Checking threshold temperature.")
+    now = time.time()
+    current_temp = None
+    state.measured = False
+    if state.override is not None:
+        if now < state.override.until:
+            return await _apply_override(plug_adapter, state, recorder, now)
+        state.override = None
+        logger.info("Manual override expired, back to automatic control.")
+    try:
+        current_temp = await temperature_provider.fetch_current_temp()
+        state.temp = current_temp
+        state.timestamp = now
+        state.first_fetch_failure_timestamp = None
+        state.measured = True
+    except Exception as e:
+        logger.error(f"Failed to fetch current temperature: {str(e)}")
+        has_cache = (
+            state.temp is not None
+            and state.timestamp is not None
+            and now - state.timestamp <= TEMP_CACHE_TTL_SECONDS
+        )
+        TEMP_CACHE.inc(result="hit" if has_cache else "miss")
+        if has_cache:
+            current_temp = state.temp
+            logger.warning(
+                f"Using cached temperature {current_temp} °C (valid for 30 minutes)."
+            )
+        else:
+            if state.first_fetch_failure_timestamp is None:
+                state.first_fetch_failure_timestamp = now
+
+            unavailable_for_seconds = now - state.first_fetch_failure_timestamp
+            if unavailable_for_seconds >= TEMP_CACHE_TTL_SECONDS:
+                # The idea for this "safety" policy is food safety first.
+                logger.error(
+                    "Weather data unavailable for over 30 minutes. Entering safe mode and forcing fridge ON."
+                )
+                _track_safe_mode(state, now, True)
+                started = time.monotonic()
+                await plug_adapter.turn_on()
+                _record(
+                    state,
+                    recorder,
+                    plug_adapter,
+                    None,
+                    Decision.SAFE_MODE,
+                    time.monotonic() - started,
+                    now,
+                )
+            else:
+                minutes_left = int(
+                    (TEMP_CACHE_TTL_SECONDS - unavailable_for_seconds) // 60
+                )
+                logger.warning(
+                    f"No valid temperature data yet. Waiting up to 30 minutes before safe mode. Remaining: {minutes_left} minutes."
+                )
+                _record(
+                    state, recorder, plug_adapter, None, Decision.NO_DATA, None, now
+                )
+            return None
+
+    _track_safe_mode(state, now, False)
+    tuning = state.tuning
+    started = time.monotonic()
+    if is_temperature_above_threshold(current_temp, tuning.threshold):
+        decision = Decision.ON
+        await plug_adapter.turn_on()
+    elif is_temperature_below_threshold(current_temp, tuning.threshold, tuning.delta):
+        decision = Decision.OFF
+        await plug_adapter.turn_off()
+    else:
+        decision = Decision.IDLE
+        logger.info(
+            f"Controller is in an idle state. The temperature is between {tuning.threshold - tuning.delta} °C and {tuning.threshold} °C"
+        )
+        # No command is sent while idle, so refresh the cached plug state from time to time.
+        await plug_adapter.reconcile()
+    _record(
+        state,
+        recorder,
+        plug_adapter,
+        current_temp,
+        decision,
+        time.monotonic() - started,
+        now,
+    )
+
+    return current_temp
+
+
+async def _apply_override(
+    plug_adapter, state: ControlState, recorder: Optional[Recorder], now: float
+) -> Optional[float]:
+    override = state.override
+    logger.info(
+        f"Manual override keeps the plug {'ON' if override.state else 'OFF'} for {int(override.until - now)} more seconds."
+    )
+    started = time.monotonic()
+    # Sent on every check, so an override survives a failed command or a switch from the Tapo app.
+    if override.state:
+        await plug_adapter.turn_on()
+    else:
+        await plug_adapter.turn_off()
+    _record(
+        state,
+        recorder,
+        plug_adapter,
+        state.temp,
+        Decision.OVERRIDE,
+        time.monotonic() - started,
+        now,
+    )
+    return None
+
+
+def _record(
+    state: ControlState,
+    recorder: Optional[Recorder],
+    plug_adapter,
+    temp: Optional[float],
+    decision: Decision,
+    latency: Optional[float],
+    timestamp: float,
+):
+    state.decision = decision
+    state.decision_timestamp = timestamp
+    if recorder is not None:
+        recorder.append(
+            temp, decision, plug_adapter.cached_state, latency, timestamp=timestamp
+        )
+
+
+def _apply_config(
+    config: RuntimeConfig, state: ControlState, ticker: Ticker, polling_policy, events
+):
+    """
+    Switches the running loop to the thresholds and interval of the config file. The plug session,
+    the temperature cache and the safe mode clock are kept.
+    """
+    tuning = config.tuning(TAPO_PLUG_IP)
+    state.tuning = tuning
+    ticker.interval = tuning.interval
+    for target in (polling_policy, events):
+        if target is not None:
+            target.threshold = tuning.threshold
+            target.delta = tuning.delta
+    if polling_policy is not None:
+        # The regular cadence of the adaptive and forecast policies.
+        polling_policy.interval = tuning.interval
+    if events is not None:
+        events.heartbeat = tuning.interval
+    logger.info(
+        f"Running with threshold {tuning.threshold} °C, delta {tuning.delta} °C and interval {tuning.interval} seconds."
+    )
 
 
 async def control():
     """
     Checks temperature against its thresholds every 10 minutes and changes the power status if needed.
     """
-    await init()
+    # Read before anything is switched, so an invalid file stops the controller right away.
+    config_watcher = ConfigWatcher(CONFIG_FILE) if CONFIG_FILE else None
+    session_pool = SessionPool()
+    guard = CompressorGuard()
+    state = ControlState()
+    snapshot = load_snapshot(STATE_FILE) if STATE_FILE else None
+    command_journal = CommandJournal(JOURNAL_FILE) if JOURNAL_FILE else None
+    if command_journal is not None:
+        # A command the guard deferred is done once the plug confirms it.
+        guard.subscribe(command_journal.confirm)
+    # A plug with an unconfirmed command gets that command again instead of the startup OFF.
+    replaying = command_journal is not None and any(
+        intent.ip == TAPO_PLUG_IP
+        for intent in command_journal.outstanding(JOURNAL_MAX_AGE)
+    )
+    if snapshot is not None and 0 <= snapshot.age() <= STATE_MAX_AGE:
+        await resume(session_pool, state, snapshot, guard)
+    elif not replaying:
+        await init(session_pool, guard)
+
+    async def _acquire(ip: str):
+        plug = guard.protect(await session_pool.acquire(ip))
+        return journal.track(plug) if journal is not None else plug
+
+    journal = None
+    if command_journal is not None:
+        # A command the plug never confirmed before the restart is sent again, through the guard.
+        await command_journal.replay(_acquire, ips={TAPO_PLUG_IP})
+        # Set afterwards, so the replayed command isn't journaled a second time.
+        journal = command_journal
     weather_adapter = WeatherAdapter()
-    temp_cache: dict[str, Optional[float]] = {"temp": None, "timestamp": None}
-    first_fetch_failure_timestamp = None
-
-    while True:
-        # Create a new smart plug adapter each time. #techdebt
-        # TODO: Maybe fix in the future. See #24 for more info.
-        plug_adapter = PlugAdapter()
-        logger.info("Checking threshold temperature.")
-        now = time.time()
-        current_temp = None
-        try:
-            current_temp = weather_adapter.get_current_temp()
-            temp_cache["temp"] = current_temp
-            temp_cache["timestamp"] = now
-            first_fetch_failure_timestamp = None
-        except Exception as e:
-            logger.error(f"Failed to fetch current temperature: {str(e)}")
-            has_cache = (
-                temp_cache["temp"] is not None
-                and temp_cache["timestamp"] is not None
-                and now - temp_cache["timestamp"] <= TEMP_CACHE_TTL_SECONDS
-            )
-            if has_cache:
-                current_temp = temp_cache["temp"]
-                logger.warning(
-                    f"Using cached temperature {current_temp} °C (valid for 30 minutes)."
+    temperature_provider = create_temperature_provider(
+        TEMPERATURE_SOURCE, weather_adapter, SENSOR_SOURCE
+    )
+    ticker = Ticker(CONTROLLER_TIMEOUT, CONTROLLER_JITTER)
+    polling_policy = create_polling_policy(CONTROLLER_POLLING, weather_adapter)
+    recorder = Recorder(RECORDER_DIR) if RECORDER_DIR else None
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+        await metrics_server.start()
+
+    events = None
+    if CONTROLLER_POLLING == "event":
+        # Readings are pushed instead of polled; the check only runs when one crosses a threshold.
+        events = EventSource(temperature_provider)
+        await events.start(
+            EVENT_LISTEN, create_sensor(SENSOR_SOURCE) if SENSOR_SOURCE else None
+        )
+        temperature_provider = events.provider
+
+    telemetry = {}
+    telemetry_task = None
+    if ENERGY_SAMPLE_INTERVAL:
+        # Sampling runs beside the control loop and never waits for it or delays it.
+        telemetry[TAPO_PLUG_IP] = EnergyTelemetry(session_pool, TAPO_PLUG_IP)
+        telemetry_task = asyncio.create_task(telemetry[TAPO_PLUG_IP].run())
+
+    api = None
+    dispatcher = None
+    if API_PORT:
+        # Overrides go through the compressor guard and the journal like the checks do.
+        dispatcher = CommandDispatcher(session_pool, acquire=_acquire)
+        api = ControlApi(
+            API_HOST,
+            API_PORT,
+            {TAPO_PLUG_IP: state},
+            session_pool,
+            dispatcher,
+            telemetry=telemetry,
+        )
+        await api.start()
+
+    # Commands held back by the compressor protection are sent by this task when they are due.
+    guard_task = asyncio.create_task(guard.run())
+
+    config_task = None
+    if config_watcher is not None:
+        config_watcher.subscribe(
+            lambda config: _apply_config(config, state, ticker, polling_policy, events)
+        )
+        config_task = asyncio.create_task(config_watcher.run())
+
+    try:
+        while True:
+            # The session is reused between ticks and only reconnects when it fails (fix for #24).
+            plug_adapter = await session_pool.acquire(TAPO_PLUG_IP)
+            try:
+                plug = guard.protect(plug_adapter)
+                if journal is not None:
+                    plug = journal.track(plug)
+                current_temp = await tick(plug, temperature_provider, state, recorder)
+            except Exception as e:
+                # The plug is down beyond its retries; keep controlling and try again at the next check.
+                logger.error(f"Control tick failed: {str(e)}")
+                current_temp = None
+            if STATE_FILE:
+                await _save_state(state, plug_adapter, guard)
+            interval = None
+            if polling_policy is not None:
+                interval = await polling_policy.next_interval(
+                    current_temp, measured=state.measured
                 )
+            if events is not None:
+                await events.wait()
             else:
-                if first_fetch_failure_timestamp is None:
-                    first_fetch_failure_timestamp = now
-
-                unavailable_for_seconds = now - first_fetch_failure_timestamp
-                if unavailable_for_seconds >= TEMP_CACHE_TTL_SECONDS:
-                    # The idea for this "safety" policy is food safety first.
-                    logger.error(
-                        "Weather data unavailable for over 30 minutes. Entering safe mode and forcing fridge ON."
-                    )
-                    await plug_adapter.turn_on()
-                else:
-                    minutes_left = int(
-                        (TEMP_CACHE_TTL_SECONDS - unavailable_for_seconds) // 60
-                    )
-                    logger.warning(
-                        f"No valid temperature data yet. Waiting up to 30 minutes before safe mode. Remaining: {minutes_left} minutes."
-                    )
-                time.sleep(CONTROLLER_TIMEOUT)
-                continue
-
-        if is_temperature_above_threshold(current_temp):
-            await plug_adapter.turn_on()
-        elif is_temperature_below_threshold(current_temp):
-            await plug_adapter.turn_off()
-        else:
-            logger.info(
-                f"Controller is in an idle state. The temperature is between {TEMPERATURE_THRESHOLD - TEMPERATURE_DELTA} °C and {TEMPERATURE_THRESHOLD} °C"
-            )
-
-        time.sleep(CONTROLLER_TIMEOUT)
+                await ticker.wait(interval)
+    finally:
+        guard_task.cancel()
+        if config_task is not None:
+            config_task.cancel()
+        if events is not None:
+            await events.stop()
+        if telemetry_task is not None:
+            telemetry_task.cancel()
+        if api is not None:
+            await api.stop()
+            await dispatcher.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if journal is not None:
+            await journal.close()
 
 
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(control())
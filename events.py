@@ -0,0 +1,193 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from logger import get_logger
+from settings import (
+    CONTROLLER_TIMEOUT,
+    EVENT_DEBOUNCE,
+    EVENT_SENSOR_INTERVAL,
+    SENSOR_MAX_AGE,
+    TEMPERATURE_DELTA,
+    TEMPERATURE_THRESHOLD,
+)
+from temperature_provider import FusedProvider, TemperatureProvider, parse_reading
+from util import is_temperature_above_threshold, is_temperature_below_threshold
+
+logger = get_logger(__name__)
+
+ABOVE = 1
+BAND = 0
+BELOW = -1
+
+
+def zone(
+    temp: float,
+    threshold: float = TEMPERATURE_THRESHOLD,
+    delta: float = TEMPERATURE_DELTA,
+) -> int:
+    """
+    :return: `ABOVE` where the fridge must run, `BELOW` where it must be off, `BAND` inside the hysteresis band.
+    """
+    if is_temperature_above_threshold(temp, threshold):
+        return ABOVE
+    if is_temperature_below_threshold(temp, threshold, delta):
+        return BELOW
+    return BAND
+
+
+@dataclass(slots=True)
+class Reading:
+    temp: float
+    timestamp: float = field(default_factory=time.time)
+
+
+class PushedTemperature:
+    """
+    Temperature provider that answers with the latest pushed reading while it is recent enough.
+    """
+
+    def __init__(self, max_age: float = SENSOR_MAX_AGE):
+        self._max_age = max_age
+        self.latest: Optional[Reading] = None
+
+    async def fetch_current_temp(self) -> float:
+        if self.latest is None or time.time() - self.latest.timestamp > self._max_age:
+            raise LookupError("No recent pushed temperature reading")
+        return self.latest.temp
+
+
+class EventSource:
+    """
+    Collects pushed temperature readings and wakes the control loop only when it has something to decide.
+
+    Readings arrive through `push()`, a line based TCP listener (one temperature per line, e.g. from a
+    sensor daemon or a webhook relay) or a local sensor that is polled cheaply. `wait()` returns as soon
+    as the temperature has entered the ON or OFF zone it wasn't acted on yet and stayed there for
+    `debounce` seconds; readings inside the hysteresis band, or in the zone already acted on, are
+    coalesced into the latest one without waking the loop. At the latest `heartbeat` seconds after the
+    last wakeup it returns anyway, so retries and safe mode still happen when readings stop.
+    """
+
+    def __init__(
+        self,
+        fallback: TemperatureProvider,
+        heartbeat: float = CONTROLLER_TIMEOUT,
+        debounce: float = EVENT_DEBOUNCE,
+    ):
+        self._queue: asyncio.Queue[Reading] = asyncio.Queue()
+        self._pushed = PushedTemperature()
+        self._provider = FusedProvider(self._pushed, fallback)
+        # Public so a reloaded config can change them between two waits.
+        self.heartbeat = heartbeat
+        self.threshold = TEMPERATURE_THRESHOLD
+        self.delta = TEMPERATURE_DELTA
+        self._debounce = debounce
+        self._acted_zone: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def provider(self) -> TemperatureProvider:
+        """
+        Provider for `tick()`: the latest pushed reading, falling back to `fallback` when there is none.
+        """
+        return self._provider
+
+    def push(self, temp: float, timestamp: Optional[float] = None):
+        """
+        Queues a reading; never blocks, so it can be called from any callback on the event loop.
+        """
+        self._queue.put_nowait(
+            Reading(temp) if timestamp is None else Reading(temp, timestamp)
+        )
+
+    async def start(
+        self,
+        listen: Optional[str] = None,
+        sensor: Optional[TemperatureProvider] = None,
+        sensor_interval: float = EVENT_SENSOR_INTERVAL,
+    ):
+        """
+        :param listen: `host:port` of the reading listener, None for no listener. Port 0 picks a free port.
+        :param sensor: Local sensor polled every `sensor_interval` seconds, None for no sensor.
+        """
+        if listen is not None:
+            host, _, port = listen.rpartition(":")
+            self._server = await asyncio.start_server(self._serve, host, int(port))
+            logger.info(f"Accepting temperature readings on {host}:{self.port}")
+        if sensor is not None:
+            task = asyncio.create_task(self._poll(sensor, sensor_interval))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def port(self) -> Optional[int]:
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    self.push(parse_reading(line.decode("ascii")))
+                except ValueError as e:
+                    logger.warning(f"Ignoring malformed temperature reading: {str(e)}")
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _poll(self, sensor: TemperatureProvider, interval: float):
+        while True:
+            try:
+                self.push(await sensor.fetch_current_temp())
+            except Exception as e:
+                logger.warning(f"Failed to read the local sensor: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def _drain(self, reading: Optional[Reading] = None) -> Optional[Reading]:
+        # Only the newest reading matters; everything queued before it is coalesced away.
+        while not self._queue.empty():
+            reading = self._queue.get_nowait()
+        if reading is not None:
+            self._pushed.latest = reading
+        return reading
+
+    async def wait(self):
+        """
+        Sleeps until a reading crosses into a zone that needs a decision, or for at most `heartbeat` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.heartbeat
+        try:
+            async with asyncio.timeout_at(deadline):
+                while True:
+                    reading = self._drain(await self._queue.get())
+                    if not self._needs_decision(reading):
+                        continue
+                    # A spike that falls back within the debounce window doesn't switch the plug.
+                    await asyncio.sleep(self._debounce)
+                    if self._needs_decision(self._drain(reading)):
+                        break
+        except TimeoutError:
+            pass
+
+        latest = self._pushed.latest
+        if latest is not None and self._zone(latest) != BAND:
+            # Inside the band the plug keeps its state, so only a zone it was switched for is remembered.
+            self._acted_zone = self._zone(latest)
+
+    def _zone(self, reading: Reading) -> int:
+        return zone(reading.temp, self.threshold, self.delta)
+
+    def _needs_decision(self, reading: Reading) -> bool:
+        return self._zone(reading) not in (BAND, self._acted_zone)
@@ -0,0 +1,432 @@
+import asyncio
+import heapq
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Collection, Optional
+
+from api import ControlApi
+from compressor import CompressorGuard
+from config import ConfigWatcher, RuntimeConfig, Tuning
+from controller import ControlState, tick
+from journal import CommandJournal
+from logger import configure_logging, get_logger
+from metrics import MetricsServer
+from openweathermap_adapter.weather_service import LocationWeather, WeatherService
+from recorder import Recorder
+from scheduler import Ticker, jittered, next_deadline
+from settings import (
+    API_HOST,
+    API_PORT,
+    CONFIG_FILE,
+    CONTROLLER_JITTER,
+    CONTROLLER_TIMEOUT,
+    ENERGY_SAMPLE_INTERVAL,
+    FLEET_DEVICES,
+    FLEET_MAX_CONCURRENCY,
+    JOURNAL_FILE,
+    JOURNAL_MAX_AGE,
+    METRICS_HOST,
+    METRICS_PORT,
+    RECORDER_DIR,
+)
+from tapo_plug_adapter.dispatcher import CommandDispatcher, CommandResult
+from tapo_plug_adapter.session_pool import SessionPool
+from telemetry import EnergyTelemetry
+from temperature_provider import TemperatureProvider, create_temperature_provider
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceConfig:
+    """
+    Configuration of a single fridge: the plug that powers it and the location used for its temperature.
+    """
+
+    plug_ip: str
+    location: str
+    interval: float = CONTROLLER_TIMEOUT
+    # Local sensor preferred over the location's OWM temperature, see `temperature_provider.create_sensor()`.
+    sensor: Optional[str] = None
+
+    def __post_init__(self):
+        if self.interval <= 0:
+            raise ValueError(
+                f"interval of the device at {self.plug_ip} must be positive"
+            )
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "DeviceConfig":
+        return cls(
+            plug_ip=config["plug_ip"],
+            location=config["location"],
+            interval=config.get("interval", CONTROLLER_TIMEOUT),
+            sensor=config.get("sensor"),
+        )
+
+
+@dataclass(slots=True)
+class FleetDevice:
+    """
+    A managed fridge together with its own control state and fetch schedule.
+    """
+
+    config: DeviceConfig
+    weather: LocationWeather
+    # Where the tick reads the temperature: the location's weather, or a local sensor falling back to it.
+    temperature_provider: TemperatureProvider
+    state: ControlState = field(default_factory=ControlState)
+    next_run: float = 0.0
+    recorder: Optional[Recorder] = None
+    telemetry: Optional[EnergyTelemetry] = None
+
+    @property
+    def base_tuning(self) -> Tuning:
+        """
+        Thresholds from the settings and the interval of the device entry, before the config file.
+        """
+        return Tuning(interval=self.config.interval)
+
+
+class FleetController:
+    """
+    Drives any number of plugs from a single event loop.
+
+    Devices are kept in a heap ordered by their next run time. A device only gets a task while its
+    tick is running, and at most `max_concurrency` ticks run at the same time, so an idle device
+    costs nothing more than its small state object.
+    """
+
+    def __init__(
+        self,
+        configs: list[DeviceConfig],
+        max_concurrency: int = FLEET_MAX_CONCURRENCY,
+        jitter: float = CONTROLLER_JITTER,
+        weather_service=None,
+    ):
+        """
+        :param weather_service: Source of the temperatures by location, a `WeatherService` of this
+            process by default; workers of the sharded runner read the supervisor's one instead.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        # Devices that share a location share one cached temperature and one OWM request.
+        self._weather_service = weather_service or WeatherService()
+        self._runtime_config: Optional[RuntimeConfig] = None
+        self._session_pool = SessionPool()
+        self._devices = [self._create_device(config) for config in configs]
+        # Control state and energy telemetry by plug IP, the view of the local API.
+        self._states = {device.config.plug_ip: device.state for device in self._devices}
+        self._telemetry = {
+            device.config.plug_ip: device.telemetry
+            for device in self._devices
+            if device.telemetry is not None
+        }
+
+        self._max_concurrency = max_concurrency
+        self._jitter = jitter
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._queue: list[tuple[float, int, FleetDevice]] = []
+        self._sequence = 0
+        self._running: set[asyncio.Task] = set()
+        # Commands from the API and switch_all() go through the compressor guard like the checks do.
+        self._dispatcher = CommandDispatcher(self._session_pool, acquire=self._acquire)
+        # One guard and one task for the deferred commands of every plug.
+        self._guard = CompressorGuard()
+        self._journal: Optional[CommandJournal] = None
+
+    def _create_device(self, config: DeviceConfig) -> FleetDevice:
+        weather = self._weather_service.for_location(config.location)
+        return FleetDevice(
+            config,
+            weather,
+            create_temperature_provider(
+                "fused" if config.sensor else "owm", weather, config.sensor
+            ),
+            ControlState(tuning=Tuning(interval=config.interval)),
+            # Every plug gets its own series, so samples of different fridges never interleave.
+            recorder=(
+                Recorder(os.path.join(RECORDER_DIR, config.plug_ip))
+                if RECORDER_DIR
+                else None
+            ),
+            telemetry=(
+                EnergyTelemetry(
+                    self._session_pool, config.plug_ip, interval=ENERGY_SAMPLE_INTERVAL
+                )
+                if ENERGY_SAMPLE_INTERVAL
+                else None
+            ),
+        )
+
+    @property
+    def devices(self) -> list[FleetDevice]:
+        return self._devices
+
+    def apply_config(self, config: RuntimeConfig):
+        """
+        Gives every device the thresholds and interval of the config file. Sessions, caches and the
+        safe mode clocks are kept; a new interval applies from the device's next run on.
+        """
+        self._runtime_config = config
+        for device in self._devices:
+            device.state.tuning = config.tuning(
+                device.config.plug_ip, device.base_tuning
+            )
+
+    def set_devices(self, configs: list[DeviceConfig]):
+        """
+        Changes the managed devices while the fleet runs: new plugs are checked right away, removed
+        ones are no longer checked, and the others keep their state and schedule. A removed plug is
+        left in its current state.
+        """
+        wanted = {config.plug_ip: config for config in configs}
+        for device in list(self._devices):
+            ip = device.config.plug_ip
+            if wanted.get(ip) != device.config:
+                self._devices.remove(device)
+                del self._states[ip]
+                telemetry = self._telemetry.pop(ip, None)
+                if telemetry is not None:
+                    telemetry.forget()
+                self._session_pool.discard(ip)
+                if self._journal is not None:
+                    # Left in its current state, so nothing is replayed for it either.
+                    self._journal.discard(ip)
+                logger.info(f"Stopped controlling plug {ip}")
+
+        for config in configs:
+            if config.plug_ip in self._states:
+                continue
+            device = self._create_device(config)
+            if self._runtime_config is not None:
+                device.state.tuning = self._runtime_config.tuning(
+                    config.plug_ip, device.base_tuning
+                )
+            self._devices.append(device)
+            self._states[config.plug_ip] = device.state
+            if device.telemetry is not None:
+                self._telemetry[config.plug_ip] = device.telemetry
+            logger.info(f"Started controlling plug {config.plug_ip}")
+            if self._wakeup is not None:
+                device.next_run = time.monotonic()
+                self._schedule(device)
+
+    def _is_managed(self, device: FleetDevice) -> bool:
+        return self._states.get(device.config.plug_ip) is device.state
+
+    def _schedule(self, device: FleetDevice):
+        # The sequence number keeps heap entries comparable when run times are equal.
+        self._sequence += 1
+        run_at = jittered(
+            device.next_run, min(self._jitter, device.state.tuning.interval / 2)
+        )
+        heapq.heappush(self._queue, (run_at, self._sequence, device))
+        self._wakeup.set()
+
+    async def switch_all(
+        self, state: bool, ips: Optional[Collection[str]] = None
+    ) -> list[CommandResult]:
+        """
+        Switches every plug at once, e.g. to force the whole site ON or OFF. The commands go through
+        the compressor protection, so a plug that was switched too recently is switched once allowed.
+        :param state: True to turn the plugs ON, False to turn them OFF.
+        :param ips: Only switch these plugs, every plug if None.
+        :return: Outcome and latency of every plug, in the order of the devices.
+        """
+        results = await self._dispatcher.dispatch(
+            {
+                device.config.plug_ip: state
+                for device in self._devices
+                if ips is None or device.config.plug_ip in ips
+            }
+        )
+        switched = [result.ip for result in results if result.ok]
+        deferred = [result.ip for result in results if result.deferred]
+        failed = [
+            result.ip for result in results if not result.ok and not result.deferred
+        ]
+        logger.info(
+            f"Switched {len(switched)} of {len(results)} plugs {'ON' if state else 'OFF'} "
+            f"in {max((result.latency for result in results), default=0.0):.1f} s"
+        )
+        if deferred:
+            logger.info(
+                f"Compressor protection deferred the command for plugs {', '.join(deferred)}"
+            )
+        if failed:
+            logger.error(f"Failed to switch plugs {', '.join(failed)}")
+        return results
+
+    async def init(self, keep: Collection[str] = ()):
+        """
+        Turns every plug off, the same way the single device controller starts.
+        :param keep: Plugs that are left alone, e.g. because their journaled command is sent instead.
+        """
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._wakeup = asyncio.Event()
+        # Sent through the guard, which counts the OFF: the plug may have been ON until just now,
+        # so the compressor gets its rest.
+        await self.switch_all(False, [ip for ip in self._states if ip not in keep])
+
+        # Spread the first runs over one interval so the devices don't all fire at once.
+        now = time.monotonic()
+        count = len(self._devices)
+        for index, device in enumerate(self._devices):
+            device.next_run = now + device.state.tuning.interval * index / count
+            self._schedule(device)
+
+    async def _acquire(self, ip: str):
+        plug = self._guard.protect(await self._session_pool.acquire(ip))
+        return self._journal.track(plug) if self._journal is not None else plug
+
+    async def _tick(self, device: FleetDevice):
+        try:
+            await tick(
+                await self._acquire(device.config.plug_ip),
+                device.temperature_provider,
+                device.state,
+                device.recorder,
+            )
+        except Exception as e:
+            logger.error(
+                f"Control tick failed for plug {device.config.plug_ip}: {str(e)}"
+            )
+        finally:
+            if self._is_managed(device):
+                device.next_run = next_deadline(
+                    device.next_run, device.state.tuning.interval, time.monotonic()
+                )
+                self._schedule(device)
+
+    async def _wait_for_next_run(self):
+        self._wakeup.clear()
+        timeout = None
+        if self._queue:
+            timeout = self._queue[0][0] - time.monotonic()
+            if timeout <= 0:
+                return
+        # asyncio.timeout() never swallows a cancellation of run() that races with the wakeup.
+        try:
+            async with asyncio.timeout(timeout):
+                await self._wakeup.wait()
+        except TimeoutError:
+            pass
+
+    async def run(
+        self,
+        config_file: Optional[str] = CONFIG_FILE,
+        metrics_port: Optional[int] = METRICS_PORT,
+        api_port: Optional[int] = API_PORT,
+        journal_file: Optional[str] = JOURNAL_FILE,
+    ):
+        """
+        Runs the control loop of every device until cancelled.
+        :param config_file: Config file watched for new thresholds and intervals, None for none.
+        :param metrics_port: Port of the metrics endpoint, None for none.
+        :param api_port: Port of the local API, None for none.
+        :param journal_file: Journal of the plug commands, None for none.
+        """
+        config_watcher = ConfigWatcher(config_file) if config_file else None
+        if config_watcher is not None:
+            config_watcher.subscribe(self.apply_config)
+        journal = CommandJournal(journal_file) if journal_file else None
+        replaying = set()
+        if journal is not None:
+            # A command the guard deferred is done once the plug confirms it.
+            self._guard.subscribe(journal.confirm)
+            # Plugs with an unconfirmed command get that command again instead of the startup OFF.
+            replaying = {intent.ip for intent in journal.outstanding(JOURNAL_MAX_AGE)}
+        await self.init(keep=replaying)
+        if journal is not None:
+            # Commands the plugs never confirmed before the restart are sent again, through the guard;
+            # those of plugs this fleet no longer controls are dropped.
+            await journal.replay(self._acquire, ips=set(self._states))
+            # Set afterwards, so the replayed commands aren't journaled a second time.
+            self._journal = journal
+        metrics_server = None
+        if metrics_port:
+            metrics_server = MetricsServer(METRICS_HOST, metrics_port)
+            await metrics_server.start()
+        api = None
+        if api_port:
+            api = ControlApi(
+                API_HOST,
+                api_port,
+                self._states,
+                self._session_pool,
+                self._dispatcher,
+                telemetry=self._telemetry,
+            )
+            await api.start()
+        guard_task = asyncio.create_task(self._guard.run())
+        energy_task = None
+        if ENERGY_SAMPLE_INTERVAL:
+            energy_task = asyncio.create_task(self._sample_energy())
+        config_task = None
+        if config_watcher is not None:
+            config_task = asyncio.create_task(config_watcher.run())
+        logger.info(
+            f"Fleet controller started with {len(self._devices)} devices (max concurrency {self._max_concurrency})."
+        )
+        try:
+            while True:
+                await self._wait_for_next_run()
+                while self._queue and self._queue[0][0] <= time.monotonic():
+                    _, _, device = heapq.heappop(self._queue)
+                    if not self._is_managed(device):
+                        continue
+                    await self._semaphore.acquire()
+                    task = asyncio.create_task(self._tick(device))
+                    self._running.add(task)
+                    task.add_done_callback(self._on_tick_done)
+        finally:
+            for task in self._running:
+                task.cancel()
+            if api is not None:
+                await api.stop()
+            await self._dispatcher.close()
+            guard_task.cancel()
+            if energy_task is not None:
+                energy_task.cancel()
+            if config_task is not None:
+                config_task.cancel()
+            if metrics_server is not None:
+                await metrics_server.stop()
+            if journal is not None:
+                self._journal = None
+                await journal.close()
+
+    async def _sample_energy(self):
+        """
+        Samples the energy metering of every plug once per `ENERGY_SAMPLE_INTERVAL`, at most
+        `max_concurrency` plugs at the same time, from one task for the whole fleet.
+        """
+        ticker = Ticker(ENERGY_SAMPLE_INTERVAL)
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def _sample(telemetry: EnergyTelemetry):
+            async with semaphore:
+                await telemetry.sample()
+
+        while True:
+            await asyncio.gather(
+                *(_sample(telemetry) for telemetry in list(self._telemetry.values()))
+            )
+            await ticker.wait()
+
+    def _on_tick_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._semaphore.release()
+
+
+def load_device_configs() -> list[DeviceConfig]:
+    return [DeviceConfig.from_dict(config) for config in FLEET_DEVICES]
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(FleetController(load_device_configs()).run())
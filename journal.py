@@ -0,0 +1,382 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Collection, Optional
+
+from logger import get_logger
+from metrics import JOURNAL_BATCH_RECORDS, REPLAYED_COMMANDS
+from settings import JOURNAL_COMPACT_THRESHOLD, JOURNAL_MAX_AGE
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Intent:
+    """
+    A plug state the controller decided on, journaled before the command is sent.
+    """
+
+    seq: int
+    ip: str
+    # True for ON.
+    state: bool
+    # UNIX time of the decision.
+    at: float
+
+
+def _intent_line(intent: Intent) -> bytes:
+    return (
+        json.dumps(
+            {"seq": intent.seq, "ip": intent.ip, "state": intent.state, "at": intent.at}
+        )
+        + "\n"
+    ).encode()
+
+
+def _done_line(seq: int) -> bytes:
+    return (json.dumps({"seq": seq, "done": True}) + "\n").encode()
+
+
+def _checkpoint_line(seq: int) -> bytes:
+    # Keeps the sequence numbers growing across compactions that leave no intent behind.
+    return (json.dumps({"seq": seq}) + "\n").encode()
+
+
+def _load(path: str) -> tuple[dict[str, Intent], int, int, int]:
+    """
+    :return: Outstanding intents by plug IP, the last sequence number, the number of records and the
+        size of the file up to the last complete record.
+    """
+    intents: dict[str, Intent] = {}
+    done: set[int] = set()
+    last_seq = records = size = 0
+    try:
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                    seq = int(record["seq"])
+                    if "ip" in record:
+                        intent = Intent(
+                            seq,
+                            record["ip"],
+                            bool(record["state"]),
+                            float(record["at"]),
+                        )
+                        current = intents.get(intent.ip)
+                        # A later decision for the plug supersedes the earlier one.
+                        if current is None or current.seq < seq:
+                            intents[intent.ip] = intent
+                    elif record.get("done"):
+                        done.add(seq)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(
+                        f"Dropping the journal {path} from byte {size} on: {str(e)}"
+                    )
+                    break
+                last_seq = max(last_seq, seq)
+                records += 1
+                size += len(line)
+    except FileNotFoundError:
+        pass
+    outstanding = {
+        ip: intent for ip, intent in intents.items() if intent.seq not in done
+    }
+    return outstanding, last_seq, records, size
+
+
+def _replace(path: str, data: bytes):
+    """
+    Writes the file atomically, the same way `snapshot.save_snapshot()` does, and syncs the directory so
+    the rename survives a power cut too.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".journal-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+class CommandJournal:
+    """
+    Append-only journal of the plug states the controller decided on, so a command that was lost to a
+    crash, or that its retries gave up on, is sent again on the next start (`replay()`).
+
+    Every decision is an intent record with a sequence number; a record with the same number marks it
+    done once the plug confirmed the state. Only the latest intent of a plug counts, so replaying is
+    idempotent: each plug is sent the one state it should be in, at most once per outstanding intent.
+
+    Intents are written with group commit: records arriving while an fsync runs are written together by
+    the next one, so a burst of commands costs a couple of fsyncs instead of one each. Done records ride
+    along with the next batch; losing them only means a harmless replay. Once `compact_threshold`
+    finished records pile up, the next batch rewrites the file with only the outstanding intents.
+    """
+
+    def __init__(self, path: str, compact_threshold: int = JOURNAL_COMPACT_THRESHOLD):
+        if compact_threshold < 1:
+            raise ValueError("compact_threshold must be at least 1")
+
+        self._path = path
+        self._compact_threshold = compact_threshold
+        self._intents, self._seq, self._records, size = _load(path)
+        # A torn record from a crash is cut off, so the next appends start on a fresh line.
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            os.truncate(path, size)
+        self._file = open(path, "ab")
+        self._buffer: list[bytes] = []
+        # Batch collecting records while the previous one is written, None if there is nothing to write.
+        self._batch: Optional[asyncio.Future] = None
+        self._flusher: Optional[asyncio.Task] = None
+        # After a failed write the end of the file is unknown, so the next batch rewrites it as a whole.
+        self._rewrite = False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def outstanding(self, max_age: Optional[float] = None) -> list[Intent]:
+        """
+        :param max_age: Only the intents younger than this many seconds, all of them if None.
+        :return: The intents that were not confirmed yet, oldest first.
+        """
+        now = time.time()
+        return sorted(
+            (
+                intent
+                for intent in self._intents.values()
+                if max_age is None or now - intent.at <= max_age
+            ),
+            key=lambda intent: intent.seq,
+        )
+
+    def track(self, plug_adapter) -> "JournaledPlug":
+        """
+        :return: The adapter with its `turn_on()` and `turn_off()` journaled.
+        """
+        return JournaledPlug(self, plug_adapter)
+
+    async def record(self, ip: str, state: bool) -> Intent:
+        """
+        Journals the decision to switch the plug and waits until it is on disk.
+        :raises OSError: If the journal couldn't be written.
+        """
+        self._seq += 1
+        intent = Intent(self._seq, ip, state, time.time())
+        self._intents[ip] = intent
+        self._append(_intent_line(intent))
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+            if self._flusher is None:
+                self._flusher = asyncio.create_task(self._flush())
+        # A cancelled caller must not cancel the batch the other callers wait for.
+        await asyncio.shield(self._batch)
+        return intent
+
+    def complete(self, intent: Intent):
+        """
+        Marks the intent done, e.g. once the plug confirmed its state. An intent that was superseded
+        by a later one for the same plug is done already.
+        """
+        if self._intents.get(intent.ip) is intent:
+            del self._intents[intent.ip]
+        self._append(_done_line(intent.seq))
+
+    def confirm(self, ip: str, state: bool):
+        """
+        Marks the outstanding intent of the plug done if it asked for `state`, e.g. once a command the
+        compressor protection deferred was finally sent (see `CompressorGuard.subscribe()`).
+        """
+        intent = self._intents.get(ip)
+        if intent is not None and intent.state is state:
+            self.complete(intent)
+
+    def discard(self, ip: str):
+        """
+        Drops the outstanding intent of a plug that is no longer controlled.
+        """
+        intent = self._intents.get(ip)
+        if intent is not None:
+            self.complete(intent)
+
+    async def send(self, plug_adapter, state: bool) -> Optional[bool]:
+        """
+        Journals the command, sends it and marks it done if the plug confirmed the state.
+        A command the journal couldn't be written for is still sent.
+        :return: What the adapter's command returned.
+        """
+        if plug_adapter.cached_state is state:
+            # Answered from the adapter's state cache, nothing goes to the plug that could be lost.
+            return await _switch(plug_adapter, state)
+        try:
+            intent = await self.record(plug_adapter.ip, state)
+        except OSError as e:
+            logger.error(
+                f"Failed to journal the command for plug {plug_adapter.ip}: {str(e)}"
+            )
+            return await _switch(plug_adapter, state)
+        return await self._execute(plug_adapter, intent)
+
+    async def _execute(self, plug_adapter, intent: Intent) -> Optional[bool]:
+        sent = await _switch(plug_adapter, intent.state)
+        # The adapter logs and swallows device errors, so only a confirmed state counts as done.
+        if plug_adapter.cached_state is intent.state:
+            self.complete(intent)
+        return sent
+
+    async def replay(
+        self,
+        acquire: Callable[[str], Awaitable],
+        max_age: float = JOURNAL_MAX_AGE,
+        ips: Optional[Collection[str]] = None,
+    ) -> int:
+        """
+        Sends every outstanding intent again, concurrently. Intents older than `max_age` seconds are
+        dropped instead: the plug has been left alone for too long to trust an old decision.
+        :param acquire: Returns the adapter of a plug IP.
+        :param ips: The plugs that are still controlled, all of them if None. The intents of other
+            plugs are dropped, e.g. of plugs that moved to another worker of a sharded fleet.
+        :return: The number of intents the plugs confirmed.
+        """
+        now = time.time()
+        due = []
+        for intent in self.outstanding():
+            if ips is not None and intent.ip not in ips:
+                logger.info(
+                    f"Dropping the journaled command for plug {intent.ip}, it is no longer controlled here"
+                )
+                self.complete(intent)
+            elif now - intent.at > max_age:
+                logger.warning(
+                    f"Dropping the journaled command to turn plug {intent.ip} {'ON' if intent.state else 'OFF'}, "
+                    f"it is {int(now - intent.at)} seconds old"
+                )
+                self.complete(intent)
+            else:
+                due.append(intent)
+        results = await asyncio.gather(
+            *(self._replay(acquire, intent) for intent in due)
+        )
+        return sum(results)
+
+    async def _replay(self, acquire, intent: Intent) -> bool:
+        logger.info(
+            f"Replaying the journaled command to turn plug {intent.ip} {'ON' if intent.state else 'OFF'}"
+        )
+        REPLAYED_COMMANDS.inc()
+        try:
+            await self._execute(await acquire(intent.ip), intent)
+        except Exception as e:
+            logger.error(f"Failed to replay the command for plug {intent.ip}: {str(e)}")
+            return False
+        return self._intents.get(intent.ip) is not intent
+
+    def _append(self, line: bytes):
+        self._buffer.append(line)
+        self._records += 1
+
+    def _take_batch(self) -> tuple[bytes, Optional[bytes]]:
+        """
+        :return: The buffered records, and the whole compacted file instead if it is time to compact.
+        """
+        data = b"".join(self._buffer)
+        self._buffer = []
+        compacted = None
+        finished = self._records - len(self._intents)
+        if self._rewrite or finished >= self._compact_threshold:
+            # Built from memory, which already holds the buffered records.
+            compacted = _checkpoint_line(self._seq) + b"".join(
+                _intent_line(intent) for intent in self.outstanding()
+            )
+            self._records = 1 + len(self._intents)
+            self._rewrite = False
+        return data, compacted
+
+    def _write(self, data: bytes, compacted: Optional[bytes]):
+        if compacted is not None:
+            self._file.close()
+            try:
+                _replace(self._path, compacted)
+            finally:
+                self._file = open(self._path, "ab")
+            return
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._batch is not None:
+                batch, self._batch = self._batch, None
+                JOURNAL_BATCH_RECORDS.observe(len(self._buffer))
+                data, compacted = self._take_batch()
+                try:
+                    # fsync can take a while on an SD card, keep it off the event loop.
+                    await loop.run_in_executor(None, self._write, data, compacted)
+                except OSError as e:
+                    self._rewrite = True
+                    batch.set_exception(e)
+                    # Retrieved here, so a batch whose callers were all cancelled doesn't warn.
+                    batch.exception()
+                else:
+                    batch.set_result(None)
+        finally:
+            self._flusher = None
+
+    async def close(self):
+        """
+        Writes the records still buffered and closes the file.
+        """
+        if self._flusher is not None:
+            await asyncio.shield(self._flusher)
+        data, compacted = self._take_batch()
+        try:
+            if data or compacted is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._write, data, compacted
+                )
+        except OSError as e:
+            logger.warning(f"Failed to write the journal {self._path}: {str(e)}")
+        finally:
+            self._file.close()
+
+
+async def _switch(plug_adapter, state: bool) -> Optional[bool]:
+    if state:
+        return await plug_adapter.turn_on()
+    return await plug_adapter.turn_off()
+
+
+class JournaledPlug:
+    """
+    A plug adapter whose commands go through a `CommandJournal`; everything else is the adapter's.
+    """
+
+    def __init__(self, journal: CommandJournal, plug_adapter):
+        self._journal = journal
+        self._plug_adapter = plug_adapter
+
+    def __getattr__(self, name: str):
+        return getattr(self._plug_adapter, name)
+
+    async def turn_on(self) -> Optional[bool]:
+        return await self._journal.send(self._plug_adapter, True)
+
+    async def turn_off(self) -> Optional[bool]:
+        return await self._journal.send(self._plug_adapter, False)
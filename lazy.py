@@ -0,0 +1,39 @@
+import importlib.util
+import sys
+import types
+
+
+class _MissingModule(types.ModuleType):
+    """
+    Stands in for a dependency that isn't installed, so importing the module that needs it still works.
+    """
+
+    def __getattr__(self, attribute):
+        raise ModuleNotFoundError(
+            f"No module named '{self.__name__}'", name=self.__name__
+        )
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Returns a module that is only executed when one of its attributes is first accessed.
+
+    Used for heavy dependencies (pyowm pulls in requests, urllib3 and certifi), so that importing the
+    controller stays fast and works without them, e.g. in tests. Only top-level packages can be
+    imported lazily: looking up a submodule would import its parent right away.
+    :param name: Name of a top-level module or package.
+    :return: The module, already loaded if something imported it before.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return _MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,25 +1,228 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, TimedRotatingFileHandler
+from typing import Callable, Optional
 
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-
-
-LOG_FILE = os.path.join(LOG_DIR, "fsppc-info.log")
-FILE_HANDLER = TimedRotatingFileHandler(
-    LOG_FILE,
-    when="midnight",
-    interval=1,
-    backupCount=7,
-    encoding="utf-8",
-)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[FILE_HANDLER, logging.StreamHandler()],
-)
+LOG_FILE_NAME = "fsppc-info.log"
+TEXT_LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Records waiting for the writer thread; when it is full, new records are dropped instead of blocking.
+QUEUE_SIZE = 10000
+# The writer flushes after this many records or this many seconds, whichever comes first.
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BatchedFileHandler(TimedRotatingFileHandler):
+    """
+    Rotating file handler that leaves flushing to the writer thread, which flushes once per batch.
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the caller: records that don't fit into the queue are counted and dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter:
+    """
+    Background thread that writes queued records to the handlers and flushes them in batches.
+    Records dropped since the last batch are reported with a warning at the end of the next one.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        handlers: list[logging.Handler],
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        dropped: Optional[Callable[[], int]] = None,
+    ):
+        """
+        :param dropped: Returns the number of records dropped so far, e.g. `DroppingQueueHandler.dropped`.
+        """
+        self._queue = log_queue
+        self._handlers = handlers
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._dropped = dropped
+        self._reported = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Writes every queued record and stops the thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _handle(self, record: logging.LogRecord):
+        for handler in self._handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _report_dropped(self):
+        dropped = self._dropped() if self._dropped is not None else 0
+        if dropped > self._reported:
+            # Written directly, a warning that went through the full queue would be dropped too.
+            self._handle(
+                logging.getLogger(__name__).makeRecord(
+                    __name__,
+                    logging.WARNING,
+                    __file__,
+                    0,
+                    f"Dropped {dropped - self._reported} log records, the log queue was full",
+                    None,
+                    None,
+                )
+            )
+            self._reported = dropped
+
+    def _flush(self):
+        self._report_dropped()
+        for handler in self._handlers:
+            # A closed console stream (e.g. at interpreter exit) must not kill the writer thread.
+            try:
+                if isinstance(handler, BatchedFileHandler):
+                    handler.flush_batch()
+                else:
+                    handler.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, last_flush + self._flush_interval - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout if pending else None)
+            except queue.Empty:
+                record = None
+
+            if record is self._STOP:
+                self._flush()
+                return
+            if record is not None:
+                self._handle(record)
+                pending += 1
+
+            if pending and (
+                pending >= self._batch_size
+                or time.monotonic() - last_flush >= self._flush_interval
+            ):
+                self._flush()
+                pending = 0
+                last_flush = time.monotonic()
+            elif not pending:
+                last_flush = time.monotonic()
+
+
+_LOG_WRITER = None
+
+
+def configure_logging(
+    log_dir: str = LOG_DIR, log_format: Optional[str] = None
+) -> LogWriter:
+    """
+    Sets up the file and console logging of the entry points; importing this module has no side effects.
+
+    Log calls only put the record on a queue; the disk and console writes happen on the writer thread.
+    Calling it again returns the running writer.
+    :param log_dir: Directory of the daily rotated log file, created if needed.
+    :param log_format: "text" or "json" for one JSON object per line; `LOG_FORMAT` of the settings if None.
+    :return: The started log writer.
+    """
+    global _LOG_WRITER
+    if _LOG_WRITER is not None:
+        return _LOG_WRITER
+
+    if log_format is None:
+        # Read here, so modules can log without settings (e.g. in tests).
+        from settings import LOG_FORMAT as log_format
+    if log_format not in ("text", "json"):
+        raise ValueError(f"Unknown log format '{log_format}'")
+
+    os.makedirs(log_dir, exist_ok=True)
+    formatter = (
+        JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_LOG_FORMAT)
+    )
+    file_handler = BatchedFileHandler(
+        os.path.join(log_dir, LOG_FILE_NAME),
+        when="midnight",
+        interval=1,
+        backupCount=7,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    # The record is merged with its arguments (and traceback) before it is queued; the writer's formatter adds the rest.
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    _LOG_WRITER = LogWriter(
+        queue_handler.queue,
+        [file_handler, stream_handler],
+        dropped=lambda: queue_handler.dropped,
+    )
+    _LOG_WRITER.start()
+    atexit.register(_LOG_WRITER.stop)
+
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler], force=True)
+    return _LOG_WRITER
 
 
 def get_logger(name: str):
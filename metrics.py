@@ -0,0 +1,345 @@
+import asyncio
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Optional
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets, from a fast local call to a long retry chain.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+    1800,
+)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def remove(self, **labels):
+        """
+        Stops exporting the series, e.g. of a plug that is no longer controlled.
+        """
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self._buckets = tuple(sorted(buckets))
+        # Label key -> (count per bucket, sum, count).
+        self._values: dict[tuple, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self._buckets), 0.0, 0)
+            )
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        return self._values.get(_label_key(labels), ([], 0.0, 0))[2]
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            values = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            ]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+OPERATION_SECONDS = REGISTRY.register(
+    Histogram(
+        "fsppc_operation_seconds",
+        "Duration of weather fetches, plug commands and control ticks, retries included.",
+    )
+)
+OPERATION_ERRORS = REGISTRY.register(
+    Counter("fsppc_operation_errors_total", "Operations that raised after all retries.")
+)
+RETRIES = REGISTRY.register(
+    Counter("fsppc_retries_total", "Retries scheduled by the tenacity policies.")
+)
+TEMP_CACHE = REGISTRY.register(
+    Counter(
+        "fsppc_temp_cache_total",
+        "Lookups of the cached temperature after a failed fetch, by result (hit or miss).",
+    )
+)
+SAFE_MODE_SECONDS = REGISTRY.register(
+    Counter("fsppc_safe_mode_seconds_total", "Time spent in safe mode.")
+)
+CIRCUIT_REJECTIONS = REGISTRY.register(
+    Counter(
+        "fsppc_circuit_rejections_total",
+        "Calls rejected without a request because the endpoint's circuit is open.",
+    )
+)
+COLLAPSED_COMMANDS = REGISTRY.register(
+    Counter(
+        "fsppc_collapsed_commands_total",
+        "Queued plug commands replaced by a later command for the same plug before they were sent.",
+    )
+)
+
+DEFERRED_COMMANDS = REGISTRY.register(
+    Counter(
+        "fsppc_deferred_commands_total",
+        "Plug commands delayed by the compressor protection.",
+    )
+)
+REJECTED_READINGS = REGISTRY.register(
+    Counter(
+        "fsppc_rejected_readings_total",
+        "Temperature readings left out of the aggregate, by source and reason (error, timeout or outlier).",
+    )
+)
+PLUG_POWER = REGISTRY.register(
+    Gauge("fsppc_plug_power_watts", "Last power reading of the plug, by ip.")
+)
+PLUG_ENERGY_TODAY = REGISTRY.register(
+    Gauge(
+        "fsppc_plug_energy_today_watt_hours",
+        "Energy used today as reported by the plug, by ip.",
+    )
+)
+PLUG_ENERGY = REGISTRY.register(
+    Counter(
+        "fsppc_plug_energy_watt_hours_total",
+        "Energy integrated from the power readings, by ip.",
+    )
+)
+REPLAYED_COMMANDS = REGISTRY.register(
+    Counter(
+        "fsppc_replayed_commands_total",
+        "Journaled plug commands sent again on start because the plug hadn't confirmed them.",
+    )
+)
+JOURNAL_BATCH_RECORDS = REGISTRY.register(
+    Histogram(
+        "fsppc_journal_batch_records",
+        "Records written to the command journal by one fsync.",
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+)
+
+
+def timed(operation: str):
+    """
+    Records the duration of every call of the decorated function or coroutine function in
+    `OPERATION_SECONDS`, and failed calls in `OPERATION_ERRORS`.
+    :param operation: Value of the `operation` label.
+    """
+
+    def _decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def _async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    OPERATION_ERRORS.inc(operation=operation)
+                    raise
+                finally:
+                    OPERATION_SECONDS.observe(
+                        time.perf_counter() - started, operation=operation
+                    )
+
+            return _async_wrapper
+
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                OPERATION_ERRORS.inc(operation=operation)
+                raise
+            finally:
+                OPERATION_SECONDS.observe(
+                    time.perf_counter() - started, operation=operation
+                )
+
+        return _wrapper
+
+    return _decorator
+
+
+def count_retry(retry_state):
+    """
+    Tenacity `before_sleep` hook that counts the retry of the called function.
+    """
+    RETRIES.inc(operation=getattr(retry_state.fn, "__name__", "unknown"))
+
+
+class MetricsServer:
+    """
+    Serves the registry in the Prometheus text format on `GET /metrics`, from the caller's event loop.
+    """
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY):
+        self._host = host
+        self._port = port
+        self._registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> Optional[int]:
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+        logger.info(f"Serving metrics on http://{self._host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b""):
+                pass
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+                status = "200 OK"
+                body = self._registry.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
@@ -1,39 +1,165 @@
+import asyncio
 import logging
+from typing import Optional
 
-from pyowm import OWM
-from pyowm.commons import exceptions
-from tenacity import after_log, before_log, retry, stop_after_attempt, wait_exponential
+from tenacity import (
+    after_log,
+    before_log,
+    retry,
+    retry_if_not_exception_type,
+    wait_exponential,
+)
 
+from lazy import lazy_import
 from logger import get_logger
-from settings import OWM_API_KEY, OWM_LOCATION
+from metrics import count_retry, timed
+from resilience import (
+    CircuitOpenError,
+    circuit_breaker,
+    stop_retrying,
+    wait_within_deadline,
+)
+from settings import OWM_API_KEY, OWM_CITY_IDS, OWM_LOCATION
 
 logger = get_logger(__name__)
+# Loaded when the first adapter is created; importing pyowm costs more than the rest of the controller.
+pyowm = lazy_import("pyowm")
+
+# OWM's group endpoint accepts at most 20 city IDs per request.
+MAX_GROUP_SIZE = 20
+
+# Every adapter talks to the same API, so they share one circuit breaker.
+OWM_BREAKER = circuit_breaker("owm")
 
 
 class WeatherAdapter:
-    def __init__(self):
-        self._owm = OWM(OWM_API_KEY)
+    def __init__(
+        self, location: str = OWM_LOCATION, city_ids: dict[str, int] = OWM_CITY_IDS
+    ):
+        """
+        :param city_ids: OWM city ID by location name, for locations to fetch with group requests.
+        """
+        self._location = location
+        self._owm = pyowm.OWM(OWM_API_KEY)
         self._manager = self._owm.weather_manager()
+        self._city_ids = dict(city_ids)
 
-    @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=30, max=180),
-        before=before_log(logger, logging.INFO),
-        after=after_log(logger, logging.ERROR),
-        reraise=True,
-    )
-    def get_current_temp(self):
+    def _fetch_temp(self, location: Optional[str] = None):
+        location = location or self._location
         logger.info("🌡️ Fetching current temperature from OWM API.")
         try:
-            current_weather = self._manager.weather_at_place(OWM_LOCATION).weather
+            # A numeric location is an OWM city ID, e.g. of a station next to the fridge.
+            if location.strip().isdigit():
+                observation = self._manager.weather_at_id(int(location))
+            else:
+                observation = self._manager.weather_at_place(location)
+            current_weather = observation.weather
             current_temperature = current_weather.temperature("celsius")["temp"]
             logger.info(f"Current temperature: {current_temperature} °C")
             return current_temperature
-        except exceptions.NotFoundError as e:
-            logger.error(f"Cannot find the city '{OWM_LOCATION}': {str(e)}")
+        except pyowm.commons.exceptions.NotFoundError as e:
+            logger.error(f"Cannot find the city '{location}': {str(e)}")
             raise
         except Exception as e:
             logger.error(
                 f"An error occurred during temperature fetching from OWM API: {str(e)}"
             )
             raise
+
+    def _fetch_temps_by_ids(self, city_ids: list[int]) -> dict[int, float]:
+        logger.info(
+            f"🌡️ Fetching current temperature for {len(city_ids)} cities from OWM API."
+        )
+        try:
+            observations = self._manager.weather_at_ids(city_ids)
+            return {
+                observation.location.id: observation.weather.temperature("celsius")[
+                    "temp"
+                ]
+                for observation in observations
+            }
+        except Exception as e:
+            logger.error(
+                f"An error occurred during temperature fetching from OWM API: {str(e)}"
+            )
+            raise
+
+    def _fetch_forecast(
+        self, location: Optional[str] = None
+    ) -> list[tuple[float, float]]:
+        location = location or self._location
+        logger.info("🌡️ Fetching temperature forecast from OWM API.")
+        try:
+            forecast = self._manager.forecast_at_place(location, "3h").forecast
+            return [
+                (weather.reference_time(), weather.temperature("celsius")["temp"])
+                for weather in forecast.weathers
+            ]
+        except Exception as e:
+            logger.error(
+                f"An error occurred during forecast fetching from OWM API: {str(e)}"
+            )
+            raise
+
+    def city_id(self, location: str) -> Optional[int]:
+        """
+        Resolves a location to its OWM city ID. pyowm's bundled city registry doesn't load on
+        Python 3.11, so names are only resolved through `OWM_CITY_IDS`.
+        :param location: City name such as "Paris, FR", or a numeric city ID.
+        :return: The city ID, None if the location is neither numeric nor in `OWM_CITY_IDS`.
+        """
+        if location.strip().isdigit():
+            return int(location)
+        return self._city_ids.get(location)
+
+    @timed("fetch_current_temp")
+    @retry(
+        stop=stop_retrying(10),
+        wait=wait_within_deadline(wait_exponential(multiplier=1, min=30, max=180)),
+        retry=retry_if_not_exception_type(CircuitOpenError),
+        before=before_log(logger, logging.INFO),
+        after=after_log(logger, logging.ERROR),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    async def fetch_current_temp(self, location: Optional[str] = None):
+        """
+        Fetches the current temperature without blocking. The pyowm call runs in the default executor
+        and the retry waits are asyncio sleeps, so the event loop keeps running while OWM is down.
+        :param location: Location to fetch, defaults to the location of the adapter.
+        """
+        loop = asyncio.get_running_loop()
+        with OWM_BREAKER.guard():
+            return await loop.run_in_executor(None, self._fetch_temp, location)
+
+    @timed("fetch_temps_by_ids")
+    @retry(
+        stop=stop_retrying(10),
+        wait=wait_within_deadline(wait_exponential(multiplier=1, min=30, max=180)),
+        retry=retry_if_not_exception_type(CircuitOpenError),
+        before=before_log(logger, logging.INFO),
+        after=after_log(logger, logging.ERROR),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    async def fetch_temps_by_ids(self, city_ids: list[int]) -> dict[int, float]:
+        """
+        Fetches the current temperature of up to `MAX_GROUP_SIZE` cities with a single OWM group request.
+        :return: Temperature in °C keyed by city ID.
+        """
+        loop = asyncio.get_running_loop()
+        with OWM_BREAKER.guard():
+            return await loop.run_in_executor(None, self._fetch_temps_by_ids, city_ids)
+
+    async def fetch_forecast(
+        self, location: Optional[str] = None
+    ) -> list[tuple[float, float]]:
+        """
+        Fetches the 5 day forecast in 3 hour steps, the finest resolution of the free OWM plan.
+        Not retried: callers fall back to regular polling and try again on their next check.
+        :param location: Location to fetch, defaults to the location of the adapter.
+        :return: List of (UNIX timestamp, temperature in °C) pairs ordered by time.
+        """
+        loop = asyncio.get_running_loop()
+        with OWM_BREAKER.guard():
+            return await loop.run_in_executor(None, self._fetch_forecast, location)
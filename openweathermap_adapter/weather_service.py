@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import Optional
+
+from logger import get_logger
+from openweathermap_adapter.weather_adapter import MAX_GROUP_SIZE, WeatherAdapter
+from settings import WEATHER_BATCH_WINDOW, WEATHER_CACHE_TTL
+
+logger = get_logger(__name__)
+
+
+class LocationWeather:
+    """
+    View of the weather service bound to one location. It can be used wherever a `WeatherAdapter` is expected.
+    """
+
+    __slots__ = ("_service", "_location")
+
+    def __init__(self, service: "WeatherService", location: str):
+        self._service = service
+        self._location = location
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    async def fetch_current_temp(self) -> float:
+        return await self._service.get_temp(self._location)
+
+
+class WeatherService:
+    """
+    Process wide source of current temperatures shared by every controller.
+
+    Each location is fetched at most once per `ttl` seconds. Concurrent callers for the same location
+    wait on the same in-flight request, and locations requested within `batch_window` seconds of each
+    other are fetched together through OWM's group endpoint when their city IDs are known.
+    """
+
+    def __init__(
+        self,
+        weather_adapter: Optional[WeatherAdapter] = None,
+        ttl: float = WEATHER_CACHE_TTL,
+        batch_window: float = WEATHER_BATCH_WINDOW,
+    ):
+        self._weather_adapter = weather_adapter or WeatherAdapter()
+        self._ttl = ttl
+        self._batch_window = batch_window
+        self._cache: dict[str, tuple[float, float]] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._pending: list[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    def for_location(self, location: str) -> LocationWeather:
+        return LocationWeather(self, location)
+
+    def cached_temp(self, location: str) -> Optional[float]:
+        """
+        Returns the cached temperature of a location if it is still fresh, otherwise None.
+        """
+        cached = self._cache.get(location)
+        if cached is None or time.monotonic() - cached[1] >= self._ttl:
+            return None
+        return cached[0]
+
+    async def get_temp(self, location: str) -> float:
+        """
+        Returns the current temperature of a location, fetching it only if the cached value expired.
+        :param location: Location string such as "Paris, FR".
+        :return: Temperature in °C.
+        """
+        cached = self.cached_temp(location)
+        if cached is not None:
+            return cached
+
+        future = self._in_flight.get(location)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            # Mark the exception as retrieved in case every waiter was cancelled.
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._in_flight[location] = future
+            self._pending.append(location)
+            if self._flush_handle is None:
+                self._flush_handle = loop.call_later(
+                    self._batch_window, self._start_flush
+                )
+
+        # A cancelled caller must not cancel the fetch the other callers are waiting on.
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        locations, self._pending = self._pending, []
+        self._flush_handle = None
+        task = asyncio.create_task(self._flush(locations))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, locations: list[str]):
+        try:
+            by_city_id: dict[int, list[str]] = {}
+            by_place: list[str] = []
+            for location in locations:
+                city_id = self._weather_adapter.city_id(location)
+                if city_id is None:
+                    by_place.append(location)
+                else:
+                    by_city_id.setdefault(city_id, []).append(location)
+
+            city_ids = list(by_city_id)
+            groups = [
+                city_ids[start : start + MAX_GROUP_SIZE]
+                for start in range(0, len(city_ids), MAX_GROUP_SIZE)
+            ]
+            await asyncio.gather(
+                *(self._fetch_group(group, by_city_id) for group in groups),
+                *(self._fetch_place(location) for location in by_place),
+            )
+        except Exception as e:
+            logger.error(f"Failed to fetch weather for {len(locations)} locations: {e}")
+            # Nobody may be left waiting on a fetch that will never finish.
+            for location in locations:
+                self._resolve(location, error=e)
+
+    async def _fetch_group(self, city_ids: list[int], by_city_id: dict[int, list[str]]):
+        try:
+            temps = await self._weather_adapter.fetch_temps_by_ids(city_ids)
+        except Exception as e:
+            for city_id in city_ids:
+                for location in by_city_id[city_id]:
+                    self._resolve(location, error=e)
+            return
+
+        for city_id in city_ids:
+            for location in by_city_id[city_id]:
+                if city_id in temps:
+                    self._resolve(location, temp=temps[city_id])
+                else:
+                    self._resolve(
+                        location,
+                        error=LookupError(f"OWM returned no weather for '{location}'"),
+                    )
+
+    async def _fetch_place(self, location: str):
+        try:
+            temp = await self._weather_adapter.fetch_current_temp(location)
+        except Exception as e:
+            self._resolve(location, error=e)
+            return
+        self._resolve(location, temp=temp)
+
+    def _resolve(
+        self,
+        location: str,
+        temp: Optional[float] = None,
+        error: Optional[Exception] = None,
+    ):
+        future = self._in_flight.pop(location, None)
+        if error is None:
+            self._cache[location] = (temp, time.monotonic())
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(temp)
+        else:
+            future.set_exception(error)
@@ -0,0 +1,252 @@
+import time
+from collections import deque
+from typing import Optional
+
+from logger import get_logger
+from settings import (
+    ADAPTIVE_MAX_INTERVAL,
+    ADAPTIVE_MIN_INTERVAL,
+    ADAPTIVE_MIN_RATE,
+    ADAPTIVE_WINDOW,
+    CONTROLLER_TIMEOUT,
+    FORECAST_MAX_SLEEP,
+    FORECAST_REFRESH_INTERVAL,
+    FORECAST_WAKE_MARGIN,
+    TEMPERATURE_DELTA,
+    TEMPERATURE_THRESHOLD,
+)
+
+logger = get_logger(__name__)
+# Check again after this share of the estimated time to the next crossing.
+ADAPTIVE_SAFETY_FACTOR = 0.5
+
+
+def threshold_crossings(
+    points: list[tuple[float, float]],
+    threshold: float = TEMPERATURE_THRESHOLD,
+    delta: float = TEMPERATURE_DELTA,
+) -> list[float]:
+    """
+    Finds the times at which a temperature series crosses either hysteresis boundary.
+    :param points: List of (UNIX timestamp, temperature in °C) pairs ordered by time.
+    :param threshold: Upper boundary, the fridge turns on at or above it.
+    :param delta: Hysteresis; the lower boundary is `threshold - delta`.
+    :return: Sorted crossing times, linearly interpolated between the points.
+    """
+    crossings = []
+    for (t0, v0), (t1, v1) in zip(points, points[1:]):
+        for boundary in (threshold, threshold - delta):
+            if (v0 - boundary) * (v1 - boundary) < 0 or (
+                v1 == boundary and v0 != boundary
+            ):
+                crossings.append(t0 + (boundary - v0) * (t1 - t0) / (v1 - v0))
+    return sorted(crossings)
+
+
+def temperature_slope(samples) -> Optional[float]:
+    """
+    Estimates how fast the temperature changes with a least squares fit over the samples.
+    :param samples: Iterable of (UNIX timestamp, temperature in °C) pairs.
+    :return: Slope in °C per second, None if the samples don't span any time.
+    """
+    samples = list(samples)
+    if len(samples) < 2:
+        return None
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_v = sum(v for _, v in samples) / len(samples)
+    variance = sum((t - mean_t) ** 2 for t, _ in samples)
+    if variance == 0:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / variance
+
+
+def seconds_to_crossing(
+    temp: float,
+    slope: Optional[float],
+    min_rate: float,
+    threshold: float = TEMPERATURE_THRESHOLD,
+    delta: float = TEMPERATURE_DELTA,
+) -> float:
+    """
+    Estimates the time until the temperature reaches a hysteresis boundary that can switch the plug.
+
+    Above the band only the lower boundary can switch the plug off, below it only the upper one can
+    switch it on, and inside the band both count. Each boundary is assumed to be approached at least
+    at `min_rate`, so a flat or receding trend still brings the controller back eventually.
+    :param temp: Current temperature in °C.
+    :param slope: Recent trend in °C per second, None if unknown.
+    :param min_rate: Slowest rate in °C per second at which a boundary is assumed to be approached.
+    :param threshold: Upper boundary, the fridge turns on at or above it.
+    :param delta: Hysteresis; the lower boundary is `threshold - delta`.
+    :return: Seconds until the earliest relevant boundary is expected to be reached.
+    """
+    slope = slope or 0.0
+    lower = threshold - delta
+    if temp >= threshold:
+        boundaries = (lower,)
+    elif temp <= lower:
+        boundaries = (threshold,)
+    else:
+        boundaries = (threshold, lower)
+
+    estimates = []
+    for boundary in boundaries:
+        distance = boundary - temp
+        rate = slope if distance > 0 else -slope
+        estimates.append(abs(distance) / max(rate, min_rate))
+    return min(estimates)
+
+
+class AdaptivePolicy:
+    """
+    Checks often close to a hysteresis boundary and rarely far away from it.
+
+    The trend of the last `window` measurements gives an estimate of when the next boundary is
+    reached; the controller checks again after half of that time, bounded by `min_interval` and
+    `max_interval`.
+    """
+
+    def __init__(
+        self,
+        window: int = ADAPTIVE_WINDOW,
+        min_interval: float = ADAPTIVE_MIN_INTERVAL,
+        max_interval: float = ADAPTIVE_MAX_INTERVAL,
+        min_rate: float = ADAPTIVE_MIN_RATE,
+        clock=time.time,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("min_interval must be positive and not above max_interval")
+        if min_rate <= 0:
+            raise ValueError("min_rate must be positive")
+        self._samples: deque[tuple[float, float]] = deque(maxlen=max(window, 2))
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        # Configured per hour, used per second.
+        self._min_rate = min_rate / 3600
+        self._clock = clock
+        # Public so a reloaded config can change them between two checks.
+        self.threshold = TEMPERATURE_THRESHOLD
+        self.delta = TEMPERATURE_DELTA
+        self.interval = CONTROLLER_TIMEOUT
+
+    async def next_interval(
+        self, current_temp: Optional[float], measured: bool = True
+    ) -> float:
+        """
+        Returns how many seconds the controller should sleep before the next check.
+        :param current_temp: Temperature the decision of this tick was based on, None if there was none.
+        :param measured: False if the temperature came from the cache; it is then left out of the trend.
+        """
+        if current_temp is None:
+            # Without a measurement the safe mode clock is running, keep the regular cadence.
+            return self.interval
+
+        if measured:
+            self._samples.append((self._clock(), current_temp))
+        slope = temperature_slope(self._samples)
+        estimate = seconds_to_crossing(
+            current_temp, slope, self._min_rate, self.threshold, self.delta
+        )
+        interval = min(
+            max(estimate * ADAPTIVE_SAFETY_FACTOR, self._min_interval),
+            self._max_interval,
+        )
+        logger.info(
+            f"Next threshold crossing estimated in {int(estimate // 60)} minutes, sleeping {int(interval // 60)} minutes."
+        )
+        return interval
+
+
+class ForecastPolicy:
+    """
+    Wakes the controller only around the times the forecast crosses a hysteresis boundary.
+
+    The forecast is fetched once per `refresh_interval`. Between crossings the controller sleeps up
+    to `max_sleep` seconds; from `margin` seconds before until `margin` seconds after a crossing it
+    polls at the regular cadence (`interval`), so the actual switch still happens on a measured value.
+    """
+
+    def __init__(
+        self,
+        weather_adapter,
+        refresh_interval: float = FORECAST_REFRESH_INTERVAL,
+        margin: float = FORECAST_WAKE_MARGIN,
+        max_sleep: float = FORECAST_MAX_SLEEP,
+        clock=time.time,
+    ):
+        self._weather_adapter = weather_adapter
+        self._clock = clock
+        self._refresh_interval = refresh_interval
+        self._margin = margin
+        self._max_sleep = max_sleep
+        self._forecast: list[tuple[float, float]] = []
+        self._fetched_at: Optional[float] = None
+        # Public so a reloaded config can change them between two checks.
+        self.threshold = TEMPERATURE_THRESHOLD
+        self.delta = TEMPERATURE_DELTA
+        self.interval = CONTROLLER_TIMEOUT
+
+    async def _refresh_forecast(self, now: float):
+        if (
+            self._fetched_at is not None
+            and now - self._fetched_at < self._refresh_interval
+        ):
+            return
+        self._forecast = await self._weather_adapter.fetch_forecast()
+        self._fetched_at = now
+
+    async def next_interval(
+        self, current_temp: Optional[float], measured: bool = True
+    ) -> float:
+        """
+        Returns how many seconds the controller should sleep before the next check.
+        :param current_temp: Temperature the decision of this tick was based on, None if there was none.
+        :param measured: False if the temperature came from the cache.
+        """
+        if current_temp is None:
+            # Without a measurement the safe mode clock is running, keep the regular cadence.
+            return self.interval
+
+        now = self._clock()
+        try:
+            await self._refresh_forecast(now)
+        except Exception as e:
+            logger.error(f"Failed to fetch forecast: {str(e)}")
+            return self.interval
+
+        # Anchor the forecast on the measured temperature, so a biased forecast is corrected right away.
+        points = [(now, current_temp)] + [
+            point for point in self._forecast if point[0] > now
+        ]
+        for crossing in threshold_crossings(points, self.threshold, self.delta):
+            if crossing + self._margin <= now:
+                continue
+            wake_at = crossing - self._margin
+            if wake_at <= now:
+                return self.interval
+            interval = min(wake_at - now, self._max_sleep)
+            logger.info(
+                f"Next threshold crossing expected in {int((crossing - now) // 60)} minutes, sleeping {int(interval // 60)} minutes."
+            )
+            return interval
+
+        logger.info(
+            f"No threshold crossing expected, sleeping {int(self._max_sleep // 60)} minutes."
+        )
+        return self._max_sleep
+
+
+def create_polling_policy(mode: str, weather_adapter):
+    """
+    :param mode: "fixed", "adaptive", "forecast" or "event".
+    :param weather_adapter: Adapter used to fetch forecasts.
+    :return: The policy for the given mode, None for the fixed `CONTROLLER_TIMEOUT` cadence and for
+        event-driven control, which wakes up on readings instead (see `events.EventSource`).
+    """
+    if mode in ("fixed", "event"):
+        return None
+    if mode == "adaptive":
+        return AdaptivePolicy()
+    if mode == "forecast":
+        return ForecastPolicy(weather_adapter)
+    raise ValueError(f"Unknown polling mode '{mode}'")
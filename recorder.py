@@ -0,0 +1,205 @@
+import math
+import mmap
+import os
+import time
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from enum import IntEnum
+from typing import Optional
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Decision(IntEnum):
+    """
+    Outcome of a control tick as stored by the recorder.
+    """
+
+    IDLE = 0
+    ON = 1
+    OFF = 2
+    SAFE_MODE = 3
+    NO_DATA = 4
+    # A manual override set through the local API decided the plug state.
+    OVERRIDE = 5
+
+
+# Column name -> array typecode. Every column is stored in its own file per day, so a reader can map
+# only what it needs and a value is found by its row index alone.
+COLUMNS = {
+    "time": "d",
+    "temp": "d",
+    "decision": "b",
+    "plug_state": "b",
+    "latency": "f",
+}
+
+PLUG_STATE_UNKNOWN = -1
+
+
+def _day(timestamp: float) -> date:
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+@dataclass(slots=True)
+class Series:
+    """
+    Recorded samples, one array per column. Missing temperatures and latencies are NaN and an unknown
+    plug state is `PLUG_STATE_UNKNOWN`.
+    """
+
+    time: array = field(default_factory=lambda: array(COLUMNS["time"]))
+    temp: array = field(default_factory=lambda: array(COLUMNS["temp"]))
+    decision: array = field(default_factory=lambda: array(COLUMNS["decision"]))
+    plug_state: array = field(default_factory=lambda: array(COLUMNS["plug_state"]))
+    latency: array = field(default_factory=lambda: array(COLUMNS["latency"]))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class Recorder:
+    """
+    Append-only time series of every control tick, segmented into one directory per UTC day.
+
+    Each column is a flat file of fixed-size native values, so segments can be memory-mapped and read
+    straight into arrays. A row whose columns were only partly written (e.g. after a crash) is ignored.
+
+    The column files are opened for each sample and closed right after, so a fleet with a recorder per
+    plug holds no file descriptors between checks.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        # Day whose segment was checked for a torn row, None until the next sample checks it again.
+        self._day: Optional[date] = None
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def _segment(self, day: date) -> str:
+        return os.path.join(self._directory, day.isoformat())
+
+    def _open(self, day: date):
+        segment = self._segment(day)
+        os.makedirs(segment, exist_ok=True)
+        _truncate_torn_row(segment)
+        self._day = day
+
+    def append(
+        self,
+        temp: Optional[float],
+        decision: Decision,
+        plug_state: Optional[bool] = None,
+        latency: Optional[float] = None,
+        timestamp: Optional[float] = None,
+    ):
+        """
+        Appends one sample.
+        :param temp: Temperature the decision was based on, None if there was none.
+        :param decision: What the tick decided.
+        :param plug_state: Plug state after the tick, None if unknown.
+        :param latency: Seconds spent talking to the plug, None if it wasn't contacted.
+        :param timestamp: UNIX time of the sample, defaults to now.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        day = _day(timestamp)
+        values = {
+            "time": timestamp,
+            "temp": math.nan if temp is None else temp,
+            "decision": int(decision),
+            "plug_state": PLUG_STATE_UNKNOWN if plug_state is None else int(plug_state),
+            "latency": math.nan if latency is None else latency,
+        }
+        try:
+            if day != self._day:
+                self._open(day)
+            segment = self._segment(day)
+            for name, typecode in COLUMNS.items():
+                with open(os.path.join(segment, name), "ab") as file:
+                    file.write(array(typecode, [values[name]]).tobytes())
+        except OSError as e:
+            logger.error(f"Failed to record sample: {str(e)}")
+            # The row may be torn now; the next sample repairs the segment first.
+            self._day = None
+
+    def close(self):
+        """
+        Nothing is kept open between samples; the next sample checks its segment for a torn row again.
+        """
+        self._day = None
+
+    def read(self, start: Optional[date] = None, end: Optional[date] = None) -> Series:
+        return read_series(self._directory, start, end)
+
+
+def _truncate_torn_row(segment: str):
+    """
+    Cuts every column of a segment back to the number of complete rows, so appends stay aligned.
+    """
+    sizes = {}
+    for name, typecode in COLUMNS.items():
+        path = os.path.join(segment, name)
+        sizes[name] = os.path.getsize(path) if os.path.exists(path) else 0
+    rows = min(
+        sizes[name] // array(typecode).itemsize for name, typecode in COLUMNS.items()
+    )
+    for name, typecode in COLUMNS.items():
+        size = rows * array(typecode).itemsize
+        if sizes[name] != size:
+            logger.warning(f"Dropping incomplete sample from {segment}")
+            os.truncate(os.path.join(segment, name), size)
+
+
+def _read_column(path: str, typecode: str) -> array:
+    values = array(typecode)
+    try:
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            size -= size % values.itemsize
+            if size:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    values.frombytes(mapped[:size])
+    except FileNotFoundError:
+        pass
+    return values
+
+
+def read_series(
+    directory: str, start: Optional[date] = None, end: Optional[date] = None
+) -> Series:
+    """
+    Reads the recorded samples of every day between `start` and `end` (both inclusive).
+    :param directory: Directory the recorder writes to.
+    :param start: First UTC day to read, defaults to the first recorded day.
+    :param end: Last UTC day to read, defaults to the last recorded day.
+    :return: The samples ordered by day and, within a day, by the order they were written in.
+    """
+    series = Series()
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return series
+
+    for name in names:
+        try:
+            day = date.fromisoformat(name)
+        except ValueError:
+            continue
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+
+        segment = os.path.join(directory, name)
+        columns = {
+            column: _read_column(os.path.join(segment, column), typecode)
+            for column, typecode in COLUMNS.items()
+        }
+        # Drop a trailing row that was not written to every column.
+        rows = min(len(values) for values in columns.values())
+        for column, values in columns.items():
+            getattr(series, column).extend(values[:rows])
+    return series
@@ -0,0 +1,239 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from logger import get_logger
+from metrics import CIRCUIT_REJECTIONS
+from settings import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    RETRY_BUDGET_CAPACITY,
+    RETRY_BUDGET_PER_MINUTE,
+)
+
+logger = get_logger(__name__)
+
+# Monotonic time by which the current control tick must have decided, None outside of a tick.
+# Tasks copy the context when they are created, so every fleet device has its own deadline.
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an endpoint that is known to be down.
+    """
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Bounds the retries of every call made inside the block to `seconds` from now. A deadline that is
+    already set is only ever shortened, never extended.
+    """
+    expires_at = None if seconds is None else time.monotonic() + seconds
+    current = _DEADLINE.get()
+    if current is not None and (expires_at is None or current < expires_at):
+        expires_at = current
+    token = _DEADLINE.set(expires_at)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Seconds left until the current deadline, None if there is none.
+    """
+    expires_at = _DEADLINE.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every retry policy: each retry takes a token and tokens are refilled at a
+    fixed rate. While a dependency is down, retries of all callers stop once the bucket is empty
+    instead of multiplying the load.
+    """
+
+    def __init__(
+        self,
+        capacity: float = RETRY_BUDGET_CAPACITY,
+        per_minute: float = RETRY_BUDGET_PER_MINUTE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._capacity = capacity
+        self._rate = per_minute / 60
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token for one retry.
+        :return: False if the budget is exhausted and the call should not be retried.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+RETRY_BUDGET = RetryBudget()
+
+
+class stop_retrying:
+    """
+    Tenacity stop condition: stops after `max_attempts` attempts, once the deadline of the current
+    tick has passed, or when the shared retry budget is exhausted.
+    """
+
+    def __init__(self, max_attempts: int, budget: Optional[RetryBudget] = None):
+        self._max_attempts = max_attempts
+        self._budget = budget
+
+    def __call__(self, retry_state) -> bool:
+        if retry_state.attempt_number >= self._max_attempts:
+            return True
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            logger.warning("Tick deadline exceeded, giving up retrying.")
+            return True
+        budget = self._budget or RETRY_BUDGET
+        if not budget.try_acquire():
+            logger.warning("Retry budget exhausted, giving up retrying.")
+            return True
+        return False
+
+
+class wait_within_deadline:
+    """
+    Tenacity wait strategy that never sleeps past the deadline of the current tick.
+    """
+
+    def __init__(self, wait):
+        self._wait = wait
+
+    def __call__(self, retry_state) -> float:
+        seconds = self._wait(retry_state)
+        remaining = remaining_time()
+        if remaining is not None:
+            seconds = max(0.0, min(seconds, remaining))
+        return seconds
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one endpoint. After `failure_threshold` consecutive failures the circuit
+    opens and calls fail fast. Once `reset_timeout` has passed, a single caller is let through as a
+    half-open probe: its success closes the circuit, its failure opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        # Time the circuit opened or the last probe started.
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        :return: True if the endpoint may be called, False while the circuit is open or a probe is in flight.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            # A probe that never reported back (e.g. it was cancelled) is replaced after the same timeout.
+            if self._clock() - self._opened_at >= self._reset_timeout:
+                self._state = self.HALF_OPEN
+                self._opened_at = self._clock()
+                logger.info(f"Circuit of {self.name} is half-open, probing.")
+                return True
+            CIRCUIT_REJECTIONS.inc(endpoint=self.name)
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit of {self.name} closed.")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self._failure_threshold
+            ):
+                logger.warning(
+                    f"Circuit of {self.name} opened after {self._failures} failures."
+                )
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    @contextmanager
+    def guard(self):
+        """
+        Runs the block as a call to the endpoint and records its outcome.
+        :raises CircuitOpenError: Without running the block if the endpoint is known to be down.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Returns the circuit breaker of an endpoint, shared by every adapter that talks to it.
+    """
+    with _BREAKERS_LOCK:
+        if name not in _BREAKERS:
+            _BREAKERS[name] = CircuitBreaker(name)
+        return _BREAKERS[name]
@@ -0,0 +1,71 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+def next_deadline(deadline: float, interval: float, now: float) -> float:
+    """
+    Advances a deadline along its own grid instead of from the current time, so ticks don't drift.
+    :param deadline: The previous deadline.
+    :param interval: Seconds between two deadlines.
+    :param now: Current monotonic time.
+    :return: The first deadline `deadline + k * interval` (k >= 1) that lies in the future; missed deadlines are skipped.
+    """
+    deadline += interval
+    if deadline <= now:
+        missed = (now - deadline) // interval + 1
+        deadline += missed * interval
+    return deadline
+
+
+def jittered(deadline: float, jitter: float) -> float:
+    """
+    Moves a deadline by a random offset from [-jitter, jitter] seconds. The offset is not carried over to the next deadline.
+    """
+    if not jitter:
+        return deadline
+    return deadline + random.uniform(-jitter, jitter)
+
+
+class Ticker:
+    """
+    Drift-free periodic timer that sleeps with asyncio, so other coroutines can share the event loop.
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.0):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if jitter < 0 or jitter >= interval:
+            raise ValueError("jitter must be non-negative and smaller than interval")
+
+        self._interval = interval
+        self._jitter = jitter
+        self._deadline = None
+
+    @property
+    def interval(self) -> float:
+        """
+        Seconds between two ticks. A new value applies from the next tick on, counted from the last deadline.
+        """
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval: float):
+        if interval <= 0 or self._jitter >= interval:
+            raise ValueError("interval must be positive and larger than the jitter")
+        self._interval = interval
+
+    async def wait(self, interval: Optional[float] = None):
+        """
+        Sleeps until the next tick. The first call anchors the grid one interval from now.
+        :param interval: Sleep this many seconds from now instead and move the grid to the new deadline.
+        """
+        now = time.monotonic()
+        if interval is not None:
+            self._deadline = now + interval
+        else:
+            if self._deadline is None:
+                self._deadline = now
+            self._deadline = next_deadline(self._deadline, self._interval, now)
+        await asyncio.sleep(max(0.0, jittered(self._deadline, self._jitter) - now))
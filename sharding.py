@@ -0,0 +1,403 @@
+import asyncio
+import bisect
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fleet import DeviceConfig, FleetController, load_device_configs
+from logger import LOG_DIR, configure_logging, get_logger
+from openweathermap_adapter.weather_service import LocationWeather, WeatherService
+from resilience import deadline, remaining_time
+from settings import (
+    API_PORT,
+    FLEET_WORKER_RESTART_DELAY,
+    FLEET_WORKERS,
+    JOURNAL_FILE,
+    METRICS_PORT,
+)
+
+logger = get_logger(__name__)
+
+# Points per worker on the hash ring; more points spread the plugs more evenly.
+VIRTUAL_NODES = 160
+# Seconds between two checks of the worker processes.
+SUPERVISE_INTERVAL = 1.0
+# A worker that ran this long before it died starts over with the shortest restart delay.
+STABLE_RUN_TIME = 60.0
+MAX_RESTART_DELAY = 60.0
+
+
+def _hash(key: str) -> int:
+    # hash() of a string differs between processes, the ring has to be the same everywhere.
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of plug IPs onto workers: adding or removing a worker only moves the plugs
+    between it and its neighbours on the ring, and adding a plug never moves another one.
+    """
+
+    def __init__(self, nodes=(), virtual_nodes: int = VIRTUAL_NODES):
+        self._virtual_nodes = virtual_nodes
+        self._hashes: list[int] = []
+        self._nodes: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for replica in range(self._virtual_nodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str):
+        kept = [
+            (point, owner)
+            for point, owner in zip(self._hashes, self._nodes)
+            if owner != node
+        ]
+        self._hashes = [point for point, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> str:
+        """
+        :return: The node owning `key`: the first point on the ring at or after the key's hash.
+        """
+        if not self._hashes:
+            raise LookupError("the ring has no nodes")
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class WeatherServer:
+    """
+    Serves the supervisor's `WeatherService` to the workers over a Unix socket, so every location is
+    fetched once for the whole machine and not once per worker. One JSON line per request
+    (`{"location": "Paris, FR", "timeout": 170.0}`) and per answer (`{"temp": 6.5}` or
+    `{"error": "..."}`). The timeout is what is left of the worker's tick deadline; the fetch and its
+    retries give up after it, so a worker never waits on a fetch it stopped caring about.
+    """
+
+    def __init__(self, weather_service: WeatherService, path: str):
+        self._weather_service = weather_service
+        self._path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._serve, self._path)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    timeout = request.get("timeout")
+                    with deadline(timeout):
+                        async with asyncio.timeout(timeout):
+                            temp = await self._weather_service.get_temp(
+                                request["location"]
+                            )
+                    answer = {"temp": temp}
+                except TimeoutError:
+                    answer = {"error": "timed out"}
+                except Exception as e:
+                    answer = {"error": str(e) or type(e).__name__}
+                writer.write((json.dumps(answer) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class RemoteWeatherService:
+    """
+    Worker side of the `WeatherServer`; it can be used wherever a `WeatherService` is expected.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+    def for_location(self, location: str) -> LocationWeather:
+        return LocationWeather(self, location)
+
+    async def get_temp(self, location: str) -> float:
+        """
+        Bounded by the current deadline (`resilience.deadline()`), which is sent along so the
+        supervisor stops working on the request when the worker stops waiting for it.
+        :raises RuntimeError: If the supervisor couldn't fetch the temperature.
+        :raises TimeoutError: If the deadline passed first.
+        """
+        timeout = remaining_time()
+        async with asyncio.timeout(timeout):
+            # A connection per request keeps concurrent ticks independent; a local connect costs microseconds.
+            reader, writer = await asyncio.open_unix_connection(self._path)
+            try:
+                writer.write(
+                    (
+                        json.dumps({"location": location, "timeout": timeout}) + "\n"
+                    ).encode()
+                )
+                await writer.drain()
+                answer = json.loads(await reader.readline())
+            finally:
+                writer.close()
+        if "error" in answer:
+            raise RuntimeError(answer["error"])
+        return answer["temp"]
+
+
+def _offset_port(port: Optional[int], index: int) -> Optional[int]:
+    # Every worker serves its own metrics and API next to the others'.
+    return port + index if port else None
+
+
+async def _work(index: int, configs: list[DeviceConfig], weather_path: str, connection):
+    fleet = FleetController(configs, weather_service=RemoteWeatherService(weather_path))
+    run_task = asyncio.create_task(
+        fleet.run(
+            metrics_port=_offset_port(METRICS_PORT, index),
+            api_port=_offset_port(API_PORT, index),
+            # Two processes must never append to the same journal.
+            journal_file=f"{JOURNAL_FILE}.{index}" if JOURNAL_FILE else None,
+        )
+    )
+
+    def _on_message():
+        try:
+            fleet.set_devices(connection.recv())
+        except (EOFError, OSError):
+            # The supervisor is gone; don't keep controlling plugs nobody supervises.
+            run_task.cancel()
+
+    loop = asyncio.get_running_loop()
+    loop.add_reader(connection.fileno(), _on_message)
+    try:
+        await run_task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        loop.remove_reader(connection.fileno())
+
+
+def _worker_main(
+    index: int, configs: list[DeviceConfig], weather_path: str, connection
+):
+    # Each worker rotates its own log file; processes must not rotate the same one.
+    configure_logging(os.path.join(LOG_DIR, f"worker-{index}"))
+    # The supervisor stops the workers; a Ctrl+C in the terminal must not kill them first.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_work(index, configs, weather_path, connection))
+
+
+@dataclass(slots=True)
+class _Worker:
+    index: int
+    configs: list[DeviceConfig] = field(default_factory=list)
+    process: Optional[multiprocessing.Process] = None
+    connection: Optional[object] = None
+    started_at: float = 0.0
+    crashes: int = 0
+    restart_at: Optional[float] = None
+
+
+class ShardedFleet:
+    """
+    Runs the fleet in several worker processes, so the KLAP handshakes and the parsing of the plugs'
+    answers use every core instead of one event loop.
+
+    Plugs are assigned to workers by consistent hashing on their IP. Each worker is an ordinary
+    `FleetController` for its share; the temperatures come from the supervisor's single weather
+    service. A worker that dies is started again after a growing delay, and a change of the device
+    list only reaches the workers whose share changed, which keep their other plugs running.
+    """
+
+    def __init__(
+        self,
+        configs: list[DeviceConfig],
+        workers: Optional[int] = FLEET_WORKERS,
+        restart_delay: float = FLEET_WORKER_RESTART_DELAY,
+    ):
+        workers = workers or os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self._ring = HashRing(f"worker-{index}" for index in range(workers))
+        self._workers = [_Worker(index) for index in range(workers)]
+        self._restart_delay = restart_delay
+        # Spawned workers start from a fresh interpreter instead of a copy of the running event loop.
+        self._context = multiprocessing.get_context("spawn")
+        self._weather_server: Optional[WeatherServer] = None
+        self._assign(configs)
+
+    def assignment(self) -> dict[int, list[str]]:
+        """
+        :return: Plug IPs by worker index.
+        """
+        return {
+            worker.index: [config.plug_ip for config in worker.configs]
+            for worker in self._workers
+        }
+
+    def _assign(self, configs: list[DeviceConfig]) -> list[_Worker]:
+        shares: dict[str, list[DeviceConfig]] = {
+            f"worker-{worker.index}": [] for worker in self._workers
+        }
+        for config in configs:
+            shares[self._ring.node_for(config.plug_ip)].append(config)
+
+        changed = []
+        for worker in self._workers:
+            share = shares[f"worker-{worker.index}"]
+            if share != worker.configs:
+                worker.configs = share
+                changed.append(worker)
+        return changed
+
+    def set_devices(self, configs: list[DeviceConfig]):
+        """
+        Rebalances after plugs were added or removed. Only workers whose share changed are told,
+        and they switch over without a restart.
+        """
+        for worker in self._assign(configs):
+            logger.info(
+                f"Worker {worker.index} now controls {len(worker.configs)} plugs"
+            )
+            if worker.process is not None and worker.process.is_alive():
+                try:
+                    worker.connection.send(worker.configs)
+                except OSError:
+                    # It is dying; the restart starts it with the new share.
+                    pass
+
+    def _start(self, worker: _Worker):
+        connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker.index,
+                worker.configs,
+                self._weather_server.path,
+                child_connection,
+            ),
+            name=f"fsppc-worker-{worker.index}",
+            daemon=True,
+        )
+        try:
+            process.start()
+        except BaseException:
+            connection.close()
+            raise
+        finally:
+            child_connection.close()
+        worker.process = process
+        worker.connection = connection
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logger.info(
+            f"Started worker {worker.index} (pid {process.pid}) with {len(worker.configs)} plugs"
+        )
+
+    def _restart_delay_of(self, worker: _Worker) -> float:
+        worker.crashes += 1
+        return min(MAX_RESTART_DELAY, self._restart_delay * 2 ** (worker.crashes - 1))
+
+    def _supervise(self, now: float):
+        for worker in self._workers:
+            if worker.process is not None and not worker.process.is_alive():
+                if now - worker.started_at >= STABLE_RUN_TIME:
+                    worker.crashes = 0
+                delay = self._restart_delay_of(worker)
+                logger.error(
+                    f"Worker {worker.index} exited with code {worker.process.exitcode}, "
+                    f"restarting it in {delay:.1f} seconds"
+                )
+                worker.connection.close()
+                worker.process = None
+                worker.restart_at = now + delay
+            if worker.process is None and (
+                worker.restart_at is None or worker.restart_at <= now
+            ):
+                try:
+                    self._start(worker)
+                except Exception as e:
+                    # E.g. the process limit was reached; try again later instead of stopping every worker.
+                    delay = self._restart_delay_of(worker)
+                    logger.error(
+                        f"Cannot start worker {worker.index}, trying again in {delay:.1f} seconds: {str(e)}"
+                    )
+                    worker.restart_at = now + delay
+
+    async def run(self, weather_service: Optional[WeatherService] = None):
+        """
+        Starts the workers and keeps them running until cancelled.
+        """
+        with tempfile.TemporaryDirectory(prefix="fsppc-") as directory:
+            self._weather_server = WeatherServer(
+                weather_service or WeatherService(),
+                os.path.join(directory, "weather.sock"),
+            )
+            await self._weather_server.start()
+            logger.info(
+                f"Sharded fleet started with {len(self._workers)} workers and "
+                f"{sum(len(worker.configs) for worker in self._workers)} devices."
+            )
+            try:
+                while True:
+                    self._supervise(time.monotonic())
+                    await asyncio.sleep(SUPERVISE_INTERVAL)
+            finally:
+                for worker in self._workers:
+                    if worker.process is not None:
+                        worker.process.terminate()
+                for worker in self._workers:
+                    if worker.process is not None:
+                        worker.process.join(5)
+                        worker.connection.close()
+                        worker.process = None
+                await self._weather_server.stop()
+
+
+def _reload_devices(sharded_fleet: ShardedFleet):
+    try:
+        settings = importlib.reload(sys.modules["settings"])
+        configs = [DeviceConfig.from_dict(config) for config in settings.FLEET_DEVICES]
+    except Exception as e:
+        logger.error(
+            f"Keeping the current devices, cannot reload FLEET_DEVICES: {str(e)}"
+        )
+        return
+    sharded_fleet.set_devices(configs)
+
+
+async def main():
+    sharded_fleet = ShardedFleet(load_device_configs())
+    loop = asyncio.get_running_loop()
+    # `kill -HUP` picks up plugs added to (or removed from) FLEET_DEVICES in settings.py.
+    loop.add_signal_handler(signal.SIGHUP, _reload_devices, sharded_fleet)
+    await sharded_fleet.run()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(main())
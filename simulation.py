@@ -0,0 +1,203 @@
+import math
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError as e:
+    # Only the threshold tuning needs NumPy, the controller itself runs without it.
+    raise ImportError(
+        "simulation.py needs NumPy, install it with: pip install -r requirements-dev.txt"
+    ) from e
+
+from util import is_temperature_above_threshold, is_temperature_below_threshold
+
+# Upper bound of threshold/delta pairs times samples evaluated at once, about 100 MB of intermediates.
+MAX_CELLS_PER_CHUNK = 4_000_000
+
+# Temperatures (°C) outside of which a wrong plug state is unsafe: the fridge being off above
+# `WARM_LIMIT` risks the food, the fridge running below `COLD_LIMIT` risks the compressor.
+WARM_LIMIT = 10.0
+COLD_LIMIT = 0.0
+
+
+@dataclass(slots=True)
+class SweepResult:
+    """
+    Outcome of replaying one temperature series for every (threshold, delta) pair. All arrays are
+    indexed by pair.
+    """
+
+    thresholds: np.ndarray
+    deltas: np.ndarray
+    switches: np.ndarray
+    on_hours: np.ndarray
+    warm_minutes: np.ndarray
+    cold_minutes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.thresholds)
+
+    def best(self, count: int = 10) -> list[int]:
+        """
+        Ranks the pairs by unsafe minutes, then by switches, then by compressor hours.
+        :return: Indices of the `count` best pairs.
+        """
+        order = np.lexsort(
+            (self.on_hours, self.switches, self.warm_minutes + self.cold_minutes)
+        )
+        return order[:count].tolist()
+
+
+def parameter_grid(thresholds, deltas) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds every combination of the given thresholds and positive deltas.
+    :return: Flat arrays of thresholds and deltas, one entry per pair.
+    """
+    thresholds, deltas = np.meshgrid(
+        np.asarray(thresholds, dtype=float), np.asarray(deltas, dtype=float)
+    )
+    mask = deltas > 0
+    return thresholds[mask], deltas[mask]
+
+
+def plug_states(temps: np.ndarray, thresholds: np.ndarray, deltas: np.ndarray):
+    """
+    Replays the controller's hysteresis for every pair. The plug starts OFF, as after `init()`, and
+    only changes when a sample is above the threshold or below threshold - delta. Missing (NaN)
+    temperatures keep the current state.
+    :param temps: Temperatures in °C, shape (samples,).
+    :param thresholds: Thresholds, shape (pairs,).
+    :param deltas: Deltas, shape (pairs,).
+    :return: Boolean plug state after every sample, shape (pairs, samples).
+    """
+    temps = temps[np.newaxis, :]
+    thresholds = thresholds[:, np.newaxis]
+    deltas = deltas[:, np.newaxis]
+    above = is_temperature_above_threshold(temps, thresholds)
+    below = is_temperature_below_threshold(temps, thresholds, deltas)
+
+    # Every sample outside the band decides the state; inside the band the last decision holds.
+    # Forward-fill the index of the last deciding sample, -1 meaning "nothing decided yet".
+    positions = np.arange(temps.shape[1])
+    last_decision = np.where(above | below, positions, -1)
+    np.maximum.accumulate(last_decision, axis=1, out=last_decision)
+    decided = last_decision >= 0
+    states = np.take_along_axis(above, np.maximum(last_decision, 0), axis=1)
+    return states & decided
+
+
+def simulate(
+    times,
+    temps,
+    thresholds,
+    deltas,
+    warm_limit: float = WARM_LIMIT,
+    cold_limit: float = COLD_LIMIT,
+) -> SweepResult:
+    """
+    Replays a temperature series through the decision logic of `util` for every (threshold, delta)
+    pair at once.
+
+    A sample's state holds until the next sample. Safe mode is not simulated: a missing temperature
+    simply keeps the plug as it was.
+    :param times: UNIX timestamps of the samples in ascending order, e.g. `Series.time` of the recorder.
+    :param temps: Temperatures in °C, NaN where none was available.
+    :param thresholds: Threshold of every pair, see `parameter_grid()`.
+    :param deltas: Delta of every pair.
+    :param warm_limit: Above this temperature a switched off fridge counts as unsafe.
+    :param cold_limit: Below this temperature a running fridge counts as unsafe.
+    :return: Switch counts, compressor hours and unsafe minutes of every pair.
+    """
+    times = np.asarray(times, dtype=float)
+    temps = np.asarray(temps, dtype=float)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+    deltas = np.atleast_1d(np.asarray(deltas, dtype=float))
+    if times.shape != temps.shape or times.ndim != 1:
+        raise ValueError("times and temps must be one dimensional and of equal length")
+    if thresholds.shape != deltas.shape:
+        raise ValueError("thresholds and deltas must have the same length")
+
+    durations = np.diff(times, append=times[-1]) if len(times) else times
+    warm = (temps > warm_limit).astype(float) * durations
+    cold = (temps < cold_limit).astype(float) * durations
+
+    pairs = len(thresholds)
+    switches = np.zeros(pairs, dtype=np.int64)
+    on_seconds = np.zeros(pairs)
+    warm_seconds = np.zeros(pairs)
+    cold_seconds = np.zeros(pairs)
+
+    chunk = max(1, MAX_CELLS_PER_CHUNK // max(len(temps), 1))
+    for start in range(0, pairs, chunk):
+        end = min(start + chunk, pairs)
+        states = plug_states(temps, thresholds[start:end], deltas[start:end])
+        # The initial OFF state counts as the previous state of the first sample.
+        switches[start:end] = np.count_nonzero(
+            np.diff(states, axis=1, prepend=False), axis=1
+        )
+        on_seconds[start:end] = states @ durations
+        warm_seconds[start:end] = ~states @ warm
+        cold_seconds[start:end] = states @ cold
+
+    return SweepResult(
+        thresholds=thresholds,
+        deltas=deltas,
+        switches=switches,
+        on_hours=on_seconds / 3600,
+        warm_minutes=warm_seconds / 60,
+        cold_minutes=cold_seconds / 60,
+    )
+
+
+def synthetic_series(
+    days: float,
+    step: float = 600,
+    mean: float = 5.0,
+    amplitude: float = 4.0,
+    noise: float = 0.5,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a daily temperature cycle with noise, for sweeps without recorded data.
+    :param days: Length of the series in days.
+    :param step: Seconds between samples, defaults to the controller's 10 minutes.
+    :param mean: Mean temperature in °C.
+    :param amplitude: Half of the difference between the daily maximum and minimum.
+    :param noise: Standard deviation of the added noise in °C.
+    :param seed: Seed of the random generator, so a sweep can be repeated.
+    :return: Timestamps and temperatures.
+    """
+    times = np.arange(0, days * 86400, step, dtype=float)
+    rng = np.random.default_rng(seed)
+    temps = (
+        mean
+        + amplitude * np.sin(2 * math.pi * times / 86400)
+        + rng.normal(0, noise, len(times))
+    )
+    return times, temps
+
+
+if __name__ == "__main__":
+    from recorder import read_series
+    from settings import RECORDER_DIR
+
+    series = read_series(RECORDER_DIR) if RECORDER_DIR else None
+    if series:
+        times, temps = series.time, series.temp
+        print(f"Replaying {len(series)} recorded samples.")
+    else:
+        times, temps = synthetic_series(days=90)
+        print(f"No recorded samples, replaying {len(times)} synthetic samples.")
+
+    result = simulate(
+        times,
+        temps,
+        *parameter_grid(np.arange(2.0, 10.01, 0.25), np.arange(0.25, 5.01, 0.25)),
+    )
+    print("threshold  delta  switches  on hours  warm min  cold min")
+    for index in result.best():
+        print(
+            f"{result.thresholds[index]:9.2f}  {result.deltas[index]:5.2f}  "
+            f"{result.switches[index]:8d}  {result.on_hours[index]:8.1f}  "
+            f"{result.warm_minutes[index]:8.0f}  {result.cold_minutes[index]:8.0f}"
+        )
@@ -0,0 +1,90 @@
+import bisect
+import statistics
+from collections import deque
+from typing import Optional
+
+
+class RollingMedian:
+    """
+    Median of the last `window` samples.
+
+    The window is also kept sorted, so a sample costs one insertion and one removal in a list of
+    `window` items: constant for the handful of samples a window holds, whatever the length of the series.
+    """
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self._window = window
+        self._samples: deque[float] = deque()
+        self._sorted: list[float] = []
+
+    def add(self, value: float) -> float:
+        """
+        :return: The median including `value`.
+        """
+        if len(self._samples) == self._window:
+            oldest = self._samples.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._samples.append(value)
+        bisect.insort(self._sorted, value)
+
+        middle = len(self._sorted) // 2
+        if len(self._sorted) % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+
+class Ewma:
+    """
+    Exponentially weighted moving average; `alpha` is the weight of the newest sample, 1 disables smoothing.
+    """
+
+    def __init__(self, alpha: float):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self._alpha = alpha
+        self.value: Optional[float] = None
+
+    def add(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self._alpha * (value - self.value)
+        return self.value
+
+
+class Smoother:
+    """
+    Rolling median followed by an EWMA: the median drops single spikes, the average evens out the noise
+    that is left. Both only ever look at a fixed amount of state, so a sample costs O(1).
+    """
+
+    def __init__(self, window: int, alpha: float):
+        self._median = RollingMedian(window)
+        self._ewma = Ewma(alpha)
+
+    def add(self, value: float) -> float:
+        """
+        :return: The smoothed temperature including `value`.
+        """
+        return self._ewma.add(self._median.add(value))
+
+
+def reject_outliers(
+    readings: dict[str, float], max_deviation: float
+) -> dict[str, float]:
+    """
+    Drops readings more than `max_deviation` away from the median of all readings. With fewer than
+    three readings there is no majority to tell which one is wrong, so they are all kept.
+    :param readings: Temperature by source name.
+    :return: The readings that agree with the majority.
+    """
+    if len(readings) < 3:
+        return dict(readings)
+    median = statistics.median(readings.values())
+    return {
+        name: temp
+        for name, temp in readings.items()
+        if abs(temp - median) <= max_deviation
+    }
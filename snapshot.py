@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+@dataclass(slots=True)
+class Snapshot:
+    """
+    What the controller needs to pick up where it left off after a restart. All times are UNIX
+    timestamps, so they stay meaningful across processes.
+    """
+
+    temp: Optional[float] = None
+    timestamp: Optional[float] = None
+    first_fetch_failure_timestamp: Optional[float] = None
+    # Last plug state confirmed by the device, None if it wasn't known.
+    plug_state: Optional[bool] = None
+    # Time of the last switch of the plug, None if it wasn't known.
+    last_switch_timestamp: Optional[float] = None
+    saved_at: float = field(default_factory=time.time)
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (time.time() if now is None else now) - self.saved_at
+
+
+def save_snapshot(path: str, snapshot: Snapshot):
+    """
+    Writes the snapshot atomically: readers see either the previous or the new file, never a torn one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    data = json.dumps({"version": SNAPSHOT_VERSION, **asdict(snapshot)})
+    fd, temp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    :return: The saved snapshot, None if there is none or it can't be read.
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.pop("version", None) != SNAPSHOT_VERSION:
+            raise ValueError("unsupported snapshot version")
+        return Snapshot(**data)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable state snapshot {path}: {str(e)}")
+        return None
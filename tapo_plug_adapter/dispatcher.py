@@ -0,0 +1,153 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from logger import get_logger
+from metrics import COLLAPSED_COMMANDS
+from settings import PLUG_COMMAND_CONCURRENCY
+from tapo_plug_adapter.session_pool import SessionPool
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CommandResult:
+    """
+    Outcome of a plug command. Commands that were collapsed into a later one share its result.
+    """
+
+    ip: str
+    # The state that was sent, True for ON.
+    state: bool
+    ok: bool
+    # Seconds from acquiring the session to the end of the command, retries included.
+    latency: float
+    error: Optional[str] = None
+    # True if the compressor protection held the command back; it is sent once it is allowed.
+    deferred: bool = False
+
+
+@dataclass(slots=True)
+class _Pending:
+    state: bool
+    futures: list[asyncio.Future] = field(default_factory=list)
+
+
+class CommandDispatcher:
+    """
+    Sends ON/OFF commands to many plugs at once, so switching a whole site takes about as long as the
+    slowest plug instead of the sum of all of them.
+
+    Up to `max_concurrency` commands run at the same time. Commands for the same plug never overlap and
+    run in the order they were submitted; while one is running, further commands for that plug wait,
+    and only the latest of them is sent (an ON followed by an OFF just sends OFF).
+    """
+
+    def __init__(
+        self,
+        session_pool: SessionPool,
+        max_concurrency: int = PLUG_COMMAND_CONCURRENCY,
+        acquire: Optional[Callable[[str], Awaitable]] = None,
+    ):
+        """
+        :param acquire: Returns the adapter the commands for a plug IP are sent through, e.g. one
+            protected by the `CompressorGuard`; `session_pool.acquire()` if None.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self._session_pool = session_pool
+        self._acquire = acquire if acquire is not None else session_pool.acquire
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: dict[str, _Pending] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    def submit(self, ip: str, state: bool) -> asyncio.Future:
+        """
+        Queues a command for the plug without waiting for it.
+        :param ip: Local IP address of the smart plug.
+        :param state: True to turn the plug ON, False to turn it OFF.
+        :return: Future of the `CommandResult` of the command that was actually sent.
+        """
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(ip)
+        if pending is None:
+            pending = self._pending[ip] = _Pending(state)
+        else:
+            COLLAPSED_COMMANDS.inc()
+            pending.state = state
+        pending.futures.append(future)
+
+        if ip not in self._workers:
+            self._workers[ip] = asyncio.create_task(self._drain(ip))
+        return future
+
+    async def dispatch(self, commands: dict[str, bool]) -> list[CommandResult]:
+        """
+        Sends one command per plug concurrently and waits for all of them.
+        :param commands: Target state by plug IP, True for ON.
+        :return: Results in the order of `commands`.
+        """
+        return list(
+            await asyncio.gather(
+                *(self.submit(ip, state) for ip, state in commands.items())
+            )
+        )
+
+    async def close(self):
+        """
+        Cancels every command that hasn't finished yet.
+        """
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        for pending in self._pending.values():
+            for future in pending.futures:
+                future.cancel()
+        self._pending.clear()
+
+    async def _drain(self, ip: str):
+        pending = None
+        try:
+            while (pending := self._pending.pop(ip, None)) is not None:
+                result = await self._execute(ip, pending.state)
+                for future in pending.futures:
+                    if not future.done():
+                        future.set_result(result)
+        except asyncio.CancelledError:
+            if pending is not None:
+                for future in pending.futures:
+                    future.cancel()
+            raise
+        finally:
+            del self._workers[ip]
+
+    async def _execute(self, ip: str, state: bool) -> CommandResult:
+        async with self._semaphore:
+            started = time.monotonic()
+            error = None
+            deferred = False
+            try:
+                plug_adapter = await self._acquire(ip)
+                if state:
+                    sent = await plug_adapter.turn_on()
+                else:
+                    sent = await plug_adapter.turn_off()
+                # Only a protected adapter answers False, for a command it deferred.
+                if sent is False:
+                    deferred = True
+                # The adapter logs and swallows device errors, so only a confirmed state counts as success.
+                elif plug_adapter.cached_state is not state:
+                    error = "state not confirmed by the device"
+            except Exception as e:
+                error = str(e)
+            latency = time.monotonic() - started
+
+        if deferred:
+            return CommandResult(ip, state, False, latency, deferred=True)
+        if error is not None:
+            logger.error(
+                f"Failed to turn {'ON' if state else 'OFF'} plug {ip}: {error}"
+            )
+        return CommandResult(ip, state, error is None, latency, error)
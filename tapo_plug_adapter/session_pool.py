@@ -0,0 +1,102 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from logger import get_logger
+from settings import (
+    PLUG_SESSION_HEALTH_CHECK_INTERVAL,
+    PLUG_SESSION_IDLE_TIMEOUT,
+)
+from tapo_plug_adapter.tapo_plug_adapter import PlugAdapter
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class _Session:
+    adapter: PlugAdapter
+    last_used: float
+
+
+class SessionPool:
+    """
+    Keeps one long-lived `PlugAdapter` per plug IP, so the KLAP handshake is done once and not on every tick.
+
+    Sessions that were not used for `idle_timeout` seconds are dropped. A session that has not talked to
+    its device for `health_check_interval` seconds is probed before it is handed out, unless its cached
+    plug state is still fresh, and a session that fails is reconnected on its next command.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = PLUG_SESSION_IDLE_TIMEOUT,
+        health_check_interval: float = PLUG_SESSION_HEALTH_CHECK_INTERVAL,
+        adapter_factory=None,
+    ):
+        # Creates the adapter of a plug from its IP; benchmarks use it to plug in stand-in devices.
+        self._adapter_factory = adapter_factory or PlugAdapter
+        self._idle_timeout = idle_timeout
+        self._health_check_interval = health_check_interval
+        self._sessions: dict[str, _Session] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._sessions
+
+    def peek(self, ip: str) -> Optional[PlugAdapter]:
+        """
+        Returns the session of a plug if there is one, without creating, probing or touching it.
+        """
+        session = self._sessions.get(ip)
+        return session.adapter if session is not None else None
+
+    def expire_idle(self, now: Optional[float] = None):
+        """
+        Drops every session that was not used for longer than the idle timeout.
+        """
+        now = time.monotonic() if now is None else now
+        expired = [
+            ip
+            for ip, session in self._sessions.items()
+            if now - session.last_used > self._idle_timeout
+        ]
+        for ip in expired:
+            logger.info(f"Closing idle smart plug session at {ip}")
+            del self._sessions[ip]
+        self._last_sweep = now
+
+    async def acquire(self, ip: str) -> PlugAdapter:
+        """
+        Returns the session for the given plug, creating it on first use.
+        :param ip: Local IP address of the smart plug.
+        :return: Plug adapter bound to the plug.
+        """
+        now = time.monotonic()
+        if now - self._last_sweep >= self._idle_timeout:
+            self.expire_idle(now)
+
+        session = self._sessions.get(ip)
+        if session is None:
+            session = _Session(self._adapter_factory(ip), now)
+            self._sessions[ip] = session
+        else:
+            session.last_used = now
+            last_success = session.adapter.last_success
+            # While the cached plug state is fresh, commands don't contact the device, so there is nothing to probe.
+            if (
+                last_success is not None
+                and session.adapter.cached_state is None
+                and now - last_success >= self._health_check_interval
+            ):
+                await session.adapter.check_health()
+
+        return session.adapter
+
+    def discard(self, ip: str):
+        """
+        Forgets the session of a plug, e.g. when the plug is removed from the fleet.
+        """
+        self._sessions.pop(ip, None)
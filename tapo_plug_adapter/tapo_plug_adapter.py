@@ -1,53 +1,155 @@
 import logging
+import time
+from typing import Optional
 
-from tapo import ApiClient
-from tenacity import after_log, before_log, retry, stop_after_attempt, wait_exponential
+from tenacity import (
+    after_log,
+    before_log,
+    retry,
+    retry_if_not_exception_type,
+    wait_exponential,
+)
 
+from lazy import lazy_import
 from logger import get_logger
-from settings import TAPO_EMAIL, TAPO_PASSWORD, TAPO_PLUG_IP
+from metrics import count_retry, timed
+from resilience import (
+    CircuitOpenError,
+    circuit_breaker,
+    stop_retrying,
+    wait_within_deadline,
+)
+from settings import (
+    PLUG_STATE_RECONCILE_INTERVAL,
+    PLUG_STATE_TTL,
+    TAPO_EMAIL,
+    TAPO_PASSWORD,
+    TAPO_PLUG_IP,
+)
 
 logger = get_logger(__name__)
+tapo = lazy_import("tapo")
 
 
 class PlugAdapter:
-    def __init__(self):
-        self._ip = TAPO_PLUG_IP
-        self._api_client = ApiClient(TAPO_EMAIL, TAPO_PASSWORD)
+    def __init__(
+        self,
+        ip: str = TAPO_PLUG_IP,
+        state_ttl: float = PLUG_STATE_TTL,
+        reconcile_interval: float = PLUG_STATE_RECONCILE_INTERVAL,
+        api_client=None,
+    ):
+        self._ip = ip
+        self._api_client = api_client or tapo.ApiClient(TAPO_EMAIL, TAPO_PASSWORD)
         self._device = None
         self._state = False
+        self._last_success: Optional[float] = None
+        self._state_ttl = state_ttl
+        self._reconcile_interval = reconcile_interval
+        # Monotonic time at which the cached state was last confirmed by the device, None if it can't be trusted.
+        self._state_updated_at: Optional[float] = None
+        # Shared by every adapter of this plug, so a new session doesn't forget that the plug is down.
+        self._breaker = circuit_breaker(f"plug {ip}")
 
+    @property
+    def ip(self) -> str:
+        return self._ip
+
+    @property
+    def last_success(self) -> Optional[float]:
+        """
+        Monotonic time of the last successful interaction with the device, None if there was none.
+        """
+        return self._last_success
+
+    @property
+    def cached_state(self) -> Optional[bool]:
+        """
+        The plug state as long as the cache can be trusted, otherwise None.
+        """
+        if (
+            self._state_updated_at is None
+            or time.monotonic() - self._state_updated_at >= self._state_ttl
+        ):
+            return None
+        return self._state
+
+    def _record_state(self, state: bool):
+        now = time.monotonic()
+        self._state = state
+        self._state_updated_at = now
+        self._last_success = now
+
+    def assume_state(self, state: bool, age: float = 0.0):
+        """
+        Seeds the state cache without contacting the device, e.g. from a snapshot taken before a restart.
+        :param state: The plug state, True for ON.
+        :param age: Seconds since the state was confirmed; the cache expires `state_ttl` after that.
+        """
+        self._state = state
+        self._state_updated_at = time.monotonic() - age
+
+    def _invalidate(self):
+        """
+        Drops the device session and the cached state, so the next command performs a fresh handshake and reads the device.
+        """
+        self._device = None
+        self._last_success = None
+        self._state_updated_at = None
+
+    @timed("init_device")
     @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=30, max=180),
+        stop=stop_retrying(10),
+        wait=wait_within_deadline(wait_exponential(multiplier=1, min=30, max=180)),
+        retry=retry_if_not_exception_type(CircuitOpenError),
         before=before_log(logger, logging.INFO),
         after=after_log(logger, logging.ERROR),
+        before_sleep=count_retry,
         reraise=True,
     )
     async def _init_device(self):
+        if self._breaker.state == self._breaker.OPEN:
+            raise CircuitOpenError(f"Smart plug device at {self._ip} is unreachable")
+
         try:
             logger.info(f"🔌 Connecting to smart plug device at {self._ip}")
             self._device = await self._api_client.p110(self._ip)
+            self._last_success = time.monotonic()
             logger.info("Connected to smart plug device")
         except Exception as e:
             logger.error(f"Failed to connect to smart plug device: {str(e)}")
+            self._breaker.record_failure()
             raise
 
     async def _reset_device_callback(self, retry_state):
         """
         Tenacity will call this before each retry when trying to switch state of the device.
         """
+        count_retry(retry_state)
         logger.warning("Reinitializing device")
         await self._init_device()
 
+    @timed("turn_on")
     @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=15, max=60),
+        stop=stop_retrying(5),
+        wait=wait_within_deadline(wait_exponential(multiplier=1, min=15, max=60)),
+        retry=retry_if_not_exception_type(CircuitOpenError),
         before=before_log(logger, logging.INFO),
         after=after_log(logger, logging.ERROR),
         before_sleep=_reset_device_callback,
         reraise=True,
     )
     async def turn_on(self):
+        if self.cached_state is True:
+            logger.info(f"Device at {self._ip} remains to be ON (cached state)")
+            return
+
+        if not self._breaker.allow():
+            logger.warning(
+                f"Smart plug device at {self._ip} is unreachable, not turning it ON (circuit open)"
+            )
+            return
+
         if not self._device:
             await self._init_device()
 
@@ -55,22 +157,38 @@ class PlugAdapter:
             info = await self._device.get_device_info()
             if not info.device_on:
                 await self._device.on()
-                self._state = True
+                self._record_state(True)
                 logger.info(f"Device '{info.nickname}' turned ON")
             else:
+                self._record_state(True)
                 logger.info(f"Device '{info.nickname}' remains to be ON")
+            self._breaker.record_success()
         except Exception as e:
             logger.error(f"Failed to interact with device: {str(e)}")
+            self._breaker.record_failure()
+            self._invalidate()
 
+    @timed("turn_off")
     @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=15, max=60),
+        stop=stop_retrying(5),
+        wait=wait_within_deadline(wait_exponential(multiplier=1, min=15, max=60)),
+        retry=retry_if_not_exception_type(CircuitOpenError),
         before=before_log(logger, logging.INFO),
         after=after_log(logger, logging.ERROR),
         before_sleep=_reset_device_callback,
         reraise=True,
     )
     async def turn_off(self):
+        if self.cached_state is False:
+            logger.info(f"Device at {self._ip} remains to be OFF (cached state)")
+            return
+
+        if not self._breaker.allow():
+            logger.warning(
+                f"Smart plug device at {self._ip} is unreachable, not turning it OFF (circuit open)"
+            )
+            return
+
         if not self._device:
             await self._init_device()
 
@@ -79,9 +197,79 @@ class PlugAdapter:
                 info = await self._device.get_device_info()
                 if info.device_on:
                     await self._device.off()
-                    self._state = False
+                    self._record_state(False)
                     logger.info(f"Device '{info.nickname}' turned OFF")
                 else:
+                    self._record_state(False)
                     logger.info(f"Device '{info.nickname}' remains to be OFF")
+                self._breaker.record_success()
         except Exception as e:
             logger.error(f"Failed to interact with device: {str(e)}")
+            self._breaker.record_failure()
+            self._invalidate()
+
+    async def check_health(self) -> bool:
+        """
+        Probes the device session with a lightweight request.
+        :return: True if the session answered, otherwise False. A failed session is dropped so the next command reconnects.
+        """
+        if not self._device:
+            return False
+
+        try:
+            info = await self._device.get_device_info()
+            self._record_state(info.device_on)
+            self._breaker.record_success()
+            return True
+        except Exception as e:
+            logger.warning(
+                f"Smart plug session at {self._ip} failed health check: {str(e)}"
+            )
+            self._breaker.record_failure()
+            self._invalidate()
+            return False
+
+    async def read_energy(self) -> Optional[tuple[float, float]]:
+        """
+        Reads the power metering of the plug over the existing session. It never connects, retries or
+        drops the session, so it can't get in the way of switching the plug.
+        :return: Current power in W and today's energy usage in Wh, None if there is no session.
+        """
+        if not self._device:
+            return None
+
+        power = await self._device.get_current_power()
+        usage = await self._device.get_energy_usage()
+        self._last_success = time.monotonic()
+        return power.current_power, usage.today_energy
+
+    async def reconcile(self):
+        """
+        Re-reads the plug state from the device once the cached state is older than the reconciliation
+        interval, so manual changes (e.g. from the Tapo app) are picked up even while no command is sent.
+        """
+        if (
+            self._state_updated_at is not None
+            and time.monotonic() - self._state_updated_at < self._reconcile_interval
+        ):
+            return
+
+        if not self._device:
+            # Reconnecting could block for minutes while the plug is down. Without a session the cache
+            # is already cleared, so the next command reads the device anyway.
+            logger.info(
+                f"No session to smart plug device at {self._ip}, skipping state reconciliation"
+            )
+            return
+
+        try:
+            info = await self._device.get_device_info()
+            self._record_state(info.device_on)
+            logger.info(
+                f"Device '{info.nickname}' reconciled, it is {'ON' if info.device_on else 'OFF'}"
+            )
+            self._breaker.record_success()
+        except Exception as e:
+            logger.error(f"Failed to reconcile device state: {str(e)}")
+            self._breaker.record_failure()
+            self._invalidate()
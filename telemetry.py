@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from logger import get_logger
+from metrics import PLUG_ENERGY, PLUG_ENERGY_TODAY, PLUG_POWER
+from scheduler import Ticker
+from settings import ENERGY_SAMPLE_INTERVAL, ENERGY_SAMPLE_TIMEOUT
+
+logger = get_logger(__name__)
+
+# Resolution (seconds) and number of retained buckets of each rolling aggregate: a day of minutes,
+# a week of hours and a year of days. Memory stays bounded no matter how long the controller runs.
+AGGREGATES = {
+    "minute": (60, 60 * 24),
+    "hour": (60 * 60, 24 * 7),
+    "day": (60 * 60 * 24, 365),
+}
+
+
+@dataclass(slots=True)
+class Bucket:
+    """
+    Power readings of one aggregation period.
+    """
+
+    start: float
+    count: int = 0
+    power_sum: float = 0.0
+    power_min: float = float("inf")
+    power_max: float = float("-inf")
+    # Energy in Wh integrated from the power readings.
+    energy: float = 0.0
+
+    @property
+    def mean_power(self) -> float:
+        return self.power_sum / self.count if self.count else 0.0
+
+
+class RollingAggregate:
+    """
+    Fixed-width buckets of power readings; only the newest `size` buckets are kept.
+    """
+
+    def __init__(self, width: float, size: int):
+        self._width = width
+        self._buckets: deque[Bucket] = deque(maxlen=size)
+
+    @property
+    def buckets(self) -> list[Bucket]:
+        return list(self._buckets)
+
+    def add(self, timestamp: float, power: float, energy: float):
+        start = timestamp - timestamp % self._width
+        if not self._buckets or self._buckets[-1].start < start:
+            self._buckets.append(Bucket(start))
+        elif self._buckets[-1].start > start:
+            # Readings older than the current bucket are dropped instead of reopening history.
+            return
+
+        bucket = self._buckets[-1]
+        bucket.count += 1
+        bucket.power_sum += power
+        bucket.power_min = min(bucket.power_min, power)
+        bucket.power_max = max(bucket.power_max, power)
+        bucket.energy += energy
+
+
+class EnergyTelemetry:
+    """
+    Samples the power metering of a P110 on its own schedule and keeps per minute, hour and day aggregates.
+
+    Sampling runs as a separate task with its own timeout and never sends commands, so it can't delay a
+    control decision. It only uses an existing plug session; while there is none, samples are skipped.
+    """
+
+    def __init__(
+        self,
+        session_pool,
+        ip: str,
+        interval: float = ENERGY_SAMPLE_INTERVAL,
+        timeout: float = ENERGY_SAMPLE_TIMEOUT,
+        clock=time.time,
+    ):
+        self._session_pool = session_pool
+        self._ip = ip
+        self._interval = interval
+        self._timeout = timeout
+        self._clock = clock
+        self._aggregates = {
+            name: RollingAggregate(width, size)
+            for name, (width, size) in AGGREGATES.items()
+        }
+        self._last: Optional[tuple[float, float]] = None
+        self.current_power: Optional[float] = None
+        self.today_energy: Optional[float] = None
+
+    @property
+    def ip(self) -> str:
+        return self._ip
+
+    def status(self) -> Optional[dict]:
+        """
+        :return: The last reading, as served by the local API; None before the first one.
+        """
+        if self._last is None:
+            return None
+        return {
+            "timestamp": self._last[0],
+            "power": self.current_power,
+            "today_energy": self.today_energy,
+        }
+
+    def aggregate(self, name: str) -> list[Bucket]:
+        """
+        :param name: "minute", "hour" or "day".
+        :return: Retained buckets of the aggregate, oldest first.
+        """
+        return self._aggregates[name].buckets
+
+    def add_sample(self, timestamp: float, power: float, today_energy: float):
+        """
+        Adds one reading. Energy is integrated over the time since the previous reading, so a missed
+        sample does not lose energy, but a gap longer than two intervals is not bridged.
+        :param timestamp: UNIX time of the reading.
+        :param power: Current power in W.
+        :param today_energy: Energy used today in Wh as reported by the plug.
+        """
+        energy = 0.0
+        if self._last is not None:
+            last_timestamp, last_power = self._last
+            elapsed = timestamp - last_timestamp
+            if 0 < elapsed <= 2 * self._interval:
+                energy = last_power * elapsed / 3600
+        self._last = (timestamp, power)
+        self.current_power = power
+        self.today_energy = today_energy
+        for aggregate in self._aggregates.values():
+            aggregate.add(timestamp, power, energy)
+        PLUG_POWER.set(power, ip=self._ip)
+        PLUG_ENERGY_TODAY.set(today_energy, ip=self._ip)
+        if energy:
+            PLUG_ENERGY.inc(energy, ip=self._ip)
+
+    def forget(self):
+        """
+        Stops exporting the gauges of the plug, e.g. once it is no longer controlled.
+        """
+        PLUG_POWER.remove(ip=self._ip)
+        PLUG_ENERGY_TODAY.remove(ip=self._ip)
+
+    async def sample(self):
+        """
+        Takes one reading, logging instead of raising when the plug doesn't answer in time.
+        """
+        try:
+            plug_adapter = await self._session_pool.acquire(self._ip)
+            reading = await asyncio.wait_for(plug_adapter.read_energy(), self._timeout)
+        except Exception as e:
+            logger.warning(f"Failed to sample energy of plug {self._ip}: {str(e)}")
+            return
+        if reading is not None:
+            self.add_sample(self._clock(), *reading)
+
+    async def run(self):
+        """
+        Samples every `interval` seconds until cancelled.
+        """
+        ticker = Ticker(self._interval)
+        while True:
+            await self.sample()
+            await ticker.wait()
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import statistics
+import time
+from typing import Optional, Protocol, Sequence
+
+from logger import get_logger
+from metrics import REJECTED_READINGS
+from settings import (
+    AGGREGATION_ALPHA,
+    AGGREGATION_MAX_DEVIATION,
+    AGGREGATION_SOURCE_DEADLINE,
+    AGGREGATION_WINDOW,
+    OWM_STATIONS,
+    SENSOR_MAX_AGE,
+    SENSOR_TIMEOUT,
+)
+from smoothing import Smoother, reject_outliers
+
+logger = get_logger(__name__)
+
+
+class TemperatureProvider(Protocol):
+    """
+    Anything the controller can read the current temperature from. `WeatherAdapter` and the weather
+    service's `LocationWeather` already are providers.
+    """
+
+    async def fetch_current_temp(self) -> float: ...
+
+
+def parse_reading(text: str) -> float:
+    """
+    Parses a sensor reading: either the `w1_slave` output of a 1-Wire DS18B20, whose second line
+    ends with `t=<millidegrees>`, or a plain temperature in °C.
+    :raises ValueError: If the reading is malformed or failed its CRC check.
+    """
+    text = text.strip()
+    if "t=" in text:
+        first_line = text.splitlines()[0]
+        if not first_line.endswith("YES"):
+            raise ValueError("1-Wire reading failed its CRC check")
+        return int(text.rsplit("t=", 1)[1]) / 1000
+    return float(text)
+
+
+class FileSensor:
+    """
+    Reads the temperature from a local file, such as `/sys/bus/w1/devices/28-*/w1_slave` or a file
+    that another process keeps up to date.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_age: Optional[float] = SENSOR_MAX_AGE,
+        timeout: float = SENSOR_TIMEOUT,
+    ):
+        self._path = path
+        self._max_age = max_age
+        self._timeout = timeout
+        # sysfs files are always "new"; only regular files can go stale.
+        self._check_age = max_age is not None and not path.startswith("/sys/")
+
+    def _read(self) -> float:
+        if (
+            self._check_age
+            and time.time() - os.path.getmtime(self._path) > self._max_age
+        ):
+            raise ValueError(f"Sensor file {self._path} is stale")
+        with open(self._path, encoding="ascii") as file:
+            return parse_reading(file.read())
+
+    async def fetch_current_temp(self) -> float:
+        # A 1-Wire read blocks for the sensor's conversion time (up to 750 ms), keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(None, self._read), self._timeout
+        )
+
+
+class SocketSensor:
+    """
+    Reads the temperature from a TCP or Unix socket that answers every connection with one reading.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        path: Optional[str] = None,
+        timeout: float = SENSOR_TIMEOUT,
+    ):
+        if path is None and (host is None or port is None):
+            raise ValueError("either a host and port or a socket path is required")
+        self._host = host
+        self._port = port
+        self._path = path
+        self._timeout = timeout
+
+    async def _read(self) -> float:
+        if self._path is not None:
+            reader, writer = await asyncio.open_unix_connection(self._path)
+        else:
+            reader, writer = await asyncio.open_connection(self._host, self._port)
+        try:
+            return parse_reading((await reader.readline()).decode("ascii"))
+        finally:
+            writer.close()
+
+    async def fetch_current_temp(self) -> float:
+        return await asyncio.wait_for(self._read(), self._timeout)
+
+
+class FusedProvider:
+    """
+    Prefers a local sensor and falls back to another provider (OWM) when the sensor fails.
+    """
+
+    def __init__(self, primary: TemperatureProvider, fallback: TemperatureProvider):
+        self._primary = primary
+        self._fallback = fallback
+
+    async def fetch_current_temp(self) -> float:
+        try:
+            return await self._primary.fetch_current_temp()
+        except Exception as e:
+            logger.warning(
+                f"Local temperature sensor failed, falling back to OWM: {str(e) or type(e).__name__}"
+            )
+        return await self._fallback.fetch_current_temp()
+
+
+class StationProvider:
+    """
+    Reads the OWM temperature of another location than the adapter's, e.g. a station close to the fridge.
+    """
+
+    def __init__(self, weather_adapter, location: str):
+        self._weather_adapter = weather_adapter
+        self._location = location
+
+    async def fetch_current_temp(self) -> float:
+        return await self._weather_adapter.fetch_current_temp(self._location)
+
+
+class AggregatedProvider:
+    """
+    Reads several providers concurrently and combines them into one stable temperature.
+
+    Every source gets `deadline` seconds, retries included, so a slow source only costs its own reading.
+    Readings more than `max_deviation` °C from the median of all readings are dropped, the median of
+    the rest is taken and smoothed over the last checks (see `smoothing.Smoother`). A spike of a single
+    station therefore can't switch the plug across the band on its own.
+    """
+
+    def __init__(
+        self,
+        sources: dict[str, TemperatureProvider],
+        deadline: float = AGGREGATION_SOURCE_DEADLINE,
+        max_deviation: float = AGGREGATION_MAX_DEVIATION,
+        window: int = AGGREGATION_WINDOW,
+        alpha: float = AGGREGATION_ALPHA,
+    ):
+        if not sources:
+            raise ValueError("at least one temperature source is required")
+        self._sources = sources
+        self._deadline = deadline
+        self._max_deviation = max_deviation
+        self._smoother = Smoother(window, alpha)
+
+    async def _read(self, provider: TemperatureProvider) -> float:
+        async with asyncio.timeout(self._deadline):
+            return await provider.fetch_current_temp()
+
+    async def fetch_current_temp(self) -> float:
+        """
+        :raises LookupError: If no source returned a reading.
+        """
+        results = await asyncio.gather(
+            *(self._read(provider) for provider in self._sources.values()),
+            return_exceptions=True,
+        )
+        readings = {}
+        for name, result in zip(self._sources, results):
+            if isinstance(result, Exception):
+                reason = "timeout" if isinstance(result, TimeoutError) else "error"
+                REJECTED_READINGS.inc(source=name, reason=reason)
+                logger.warning(
+                    f"Temperature source {name} failed ({reason}): {str(result) or type(result).__name__}"
+                )
+            else:
+                readings[name] = result
+
+        accepted = reject_outliers(readings, self._max_deviation)
+        for name in readings.keys() - accepted.keys():
+            REJECTED_READINGS.inc(source=name, reason="outlier")
+            logger.warning(
+                f"Ignoring outlier {readings[name]} °C of temperature source {name}"
+            )
+        if not accepted:
+            raise LookupError("No temperature source returned a reading")
+
+        temp = self._smoother.add(statistics.median(accepted.values()))
+        logger.info(
+            f"Aggregated temperature {temp:.2f} °C from "
+            + ", ".join(f"{name}={reading}" for name, reading in accepted.items())
+        )
+        return temp
+
+
+def create_sensor(source: str):
+    """
+    :param source: A file path, `tcp://host:port` or `unix:///path/to/socket`.
+    :return: The sensor reading from that source.
+    """
+    if source.startswith("tcp://"):
+        host, _, port = source[len("tcp://") :].rpartition(":")
+        return SocketSensor(host=host, port=int(port))
+    if source.startswith("unix://"):
+        return SocketSensor(path=source[len("unix://") :])
+    return FileSensor(source)
+
+
+def create_temperature_provider(
+    mode: str,
+    weather_adapter: TemperatureProvider,
+    sensor: Optional[str],
+    stations: Sequence[str] = OWM_STATIONS,
+) -> TemperatureProvider:
+    """
+    :param mode: "owm", "sensor", "fused" or "aggregated".
+    :param weather_adapter: Provider of the OWM temperature.
+    :param sensor: Source of the local sensor, see `create_sensor()`.
+    :param stations: Further OWM locations read in "aggregated" mode.
+    :return: The provider the controller reads the temperature from.
+    """
+    if mode == "owm":
+        return weather_adapter
+    if mode == "aggregated":
+        sources = {"owm": weather_adapter}
+        for station in stations:
+            sources[f"owm:{station}"] = StationProvider(weather_adapter, station)
+        if sensor:
+            sources["sensor"] = create_sensor(sensor)
+        return AggregatedProvider(sources)
+    if mode not in ("sensor", "fused"):
+        raise ValueError(f"Unknown temperature source '{mode}'")
+    if not sensor:
+        raise ValueError(f"Temperature source '{mode}' requires a sensor")
+    if mode == "sensor":
+        return create_sensor(sensor)
+    return FusedProvider(create_sensor(sensor), weather_adapter)
@@ -0,0 +1,265 @@
+import asyncio
+import importlib
+import json
+import sys
+import time
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.API_MAX_OVERRIDE = 3600
+FAKE_SETTINGS.PLUG_COMMAND_CONCURRENCY = 32
+FAKE_SETTINGS.COMPRESSOR_MIN_RUN = 300
+FAKE_SETTINGS.COMPRESSOR_MIN_REST = 300
+FAKE_SETTINGS.COMPRESSOR_MAX_SWITCHES_PER_HOUR = 6
+
+FAKE_SESSION_POOL_MODULE = types.ModuleType("tapo_plug_adapter.session_pool")
+FAKE_SESSION_POOL_MODULE.SessionPool = object
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "tapo_plug_adapter.session_pool": FAKE_SESSION_POOL_MODULE,
+    },
+):
+    sys.modules.pop("api", None)
+    sys.modules.pop("compressor", None)
+    sys.modules.pop("tapo_plug_adapter.dispatcher", None)
+    api = importlib.import_module("api")
+    compressor = importlib.import_module("compressor")
+    dispatcher_module = sys.modules["tapo_plug_adapter.dispatcher"]
+
+PLUG_IPS = ("192.168.1.50", "192.168.1.51")
+
+
+class _SlowPlug:
+    """
+    A plug whose commands take as long as a chain of retries.
+    """
+
+    def __init__(self, delay: float):
+        self.cached_state = None
+        self._delay = delay
+
+    async def turn_on(self):
+        await asyncio.sleep(self._delay)
+        self.cached_state = True
+
+    async def turn_off(self):
+        await asyncio.sleep(self._delay)
+        self.cached_state = False
+
+
+def _state(**values):
+    state = types.SimpleNamespace(
+        temp=None,
+        timestamp=None,
+        decision=None,
+        decision_timestamp=None,
+        safe_mode_timestamp=None,
+        override=None,
+    )
+    state.__dict__.update(values)
+    return state
+
+
+class ControlApiTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.plugs = {ip: _SlowPlug(0.5) for ip in PLUG_IPS}
+        self.session_pool = MagicMock()
+        self.session_pool.peek = MagicMock(side_effect=self.plugs.get)
+
+        async def _acquire(ip):
+            return self.plugs[ip]
+
+        self.session_pool.acquire = _acquire
+        self.dispatcher = dispatcher_module.CommandDispatcher(self.session_pool)
+        self.states = {
+            PLUG_IPS[0]: _state(
+                temp=6.5,
+                timestamp=1000.0,
+                decision=api.Decision.ON,
+                decision_timestamp=1000.0,
+            ),
+            PLUG_IPS[1]: _state(),
+        }
+        self.api = api.ControlApi(
+            "127.0.0.1", 0, self.states, self.session_pool, self.dispatcher
+        )
+
+    async def asyncTearDown(self):
+        await self.dispatcher.close()
+
+    async def _request(self, method: str, target: str, body: bytes = b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.api.port)
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(content)
+
+    def test_status_is_answered_from_memory(self):
+        self.plugs[PLUG_IPS[0]].cached_state = True
+
+        status, payload = self.api.handle("GET", f"/plugs/{PLUG_IPS[0]}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["temp"], 6.5)
+        self.assertEqual(payload["decision"], "on")
+        self.assertIs(payload["plug_state"], True)
+        self.assertIsNone(payload["override"])
+
+    def test_bulk_query_lists_every_plug_or_the_requested_ones(self):
+        _, payload = self.api.handle("GET", "/plugs")
+        self.assertEqual([plug["ip"] for plug in payload["plugs"]], list(PLUG_IPS))
+
+        _, payload = self.api.handle("GET", f"/plugs?ip={PLUG_IPS[1]}")
+        self.assertEqual([plug["ip"] for plug in payload["plugs"]], [PLUG_IPS[1]])
+
+    def test_energy_is_served_from_telemetry(self):
+        energy_telemetry = MagicMock()
+        energy_telemetry.status.return_value = {
+            "timestamp": 1000.0,
+            "power": 85,
+            "today_energy": 420,
+        }
+        energy_telemetry.aggregate.side_effect = lambda name: {
+            "hour": [
+                types.SimpleNamespace(
+                    start=0.0,
+                    count=2,
+                    mean_power=80.0,
+                    power_min=75,
+                    power_max=85,
+                    energy=1.5,
+                )
+            ]
+        }[name]
+        self.api = api.ControlApi(
+            "127.0.0.1",
+            0,
+            self.states,
+            self.session_pool,
+            self.dispatcher,
+            telemetry={PLUG_IPS[0]: energy_telemetry},
+        )
+
+        _, payload = self.api.handle("GET", f"/plugs/{PLUG_IPS[0]}")
+        self.assertEqual(payload["energy"]["power"], 85)
+        _, payload = self.api.handle("GET", f"/plugs/{PLUG_IPS[1]}")
+        self.assertIsNone(payload["energy"])
+
+        status, payload = self.api.handle("GET", f"/plugs/{PLUG_IPS[0]}/energy")
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["aggregate"], "hour")
+        self.assertEqual(payload["buckets"][0]["energy"], 1.5)
+        for path, expected in (
+            (f"/plugs/{PLUG_IPS[0]}/energy?aggregate=week", 400),
+            (f"/plugs/{PLUG_IPS[1]}/energy", 404),
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.api.handle("GET", path)[0], expected)
+
+    def test_rejects_unknown_plugs_and_invalid_overrides(self):
+        target = f"/plugs/{PLUG_IPS[0]}/override"
+        for method, path, body, expected in (
+            ("GET", "/plugs/192.168.1.99", b"", 404),
+            ("GET", "/plugs?ip=192.168.1.99", b"", 404),
+            ("GET", "/other", b"", 404),
+            ("POST", "/plugs", b"", 405),
+            ("PUT", target, b"not json", 400),
+            ("PUT", target, b'{"state": "auto", "duration": 60}', 400),
+            ("PUT", target, b'{"state": "on", "duration": 0}', 400),
+            ("PUT", target, b'{"state": "on", "duration": 7200}', 400),
+        ):
+            with self.subTest(method=method, path=path, body=body):
+                status, payload = self.api.handle(method, path, body)
+                self.assertEqual(status, expected)
+                self.assertIn("error", payload)
+
+        self.assertIsNone(self.states[PLUG_IPS[0]].override)
+
+    async def test_override_is_stored_and_sent_without_waiting_for_the_plug(self):
+        await self.api.start()
+        try:
+            with patch.object(api.logger, "disabled", True):
+                started = time.monotonic()
+                status, payload = await self._request(
+                    "PUT",
+                    f"/plugs/{PLUG_IPS[0]}/override",
+                    b'{"state": "off", "duration": 600}',
+                )
+                # The plug is still busy with the command, yet the API keeps answering at once.
+                bulk_status, _ = await self._request("GET", "/plugs")
+                self.assertLess(time.monotonic() - started, 0.4)
+
+                self.assertEqual((status, bulk_status), (202, 200))
+                self.assertEqual(payload["override"]["state"], "off")
+                self.assertGreater(payload["override"]["remaining"], 590)
+                self.assertIs(self.states[PLUG_IPS[0]].override.state, False)
+
+                await asyncio.sleep(0.6)
+                self.assertIs(self.plugs[PLUG_IPS[0]].cached_state, False)
+
+                status, payload = await self._request(
+                    "DELETE", f"/plugs/{PLUG_IPS[0]}/override"
+                )
+        finally:
+            await self.api.stop()
+
+        self.assertEqual(status, 200)
+        self.assertIsNone(payload["override"])
+        self.assertIsNone(self.states[PLUG_IPS[0]].override)
+
+    async def test_override_drops_the_deferred_command_of_a_check(self):
+        plug = self.plugs[PLUG_IPS[0]]
+        plug.ip = PLUG_IPS[0]
+        plug.cached_state = False
+        guard = compressor.CompressorGuard(
+            min_run=0.1, min_rest=0.1, max_switches_per_hour=None
+        )
+        guard_task = asyncio.create_task(guard.run())
+        guard.record_switch(plug.ip, False)
+
+        async def _acquire(ip):
+            return guard.protect(self.plugs[ip])
+
+        dispatcher = dispatcher_module.CommandDispatcher(
+            self.session_pool, acquire=_acquire
+        )
+        control_api = api.ControlApi(
+            "127.0.0.1", 0, self.states, self.session_pool, dispatcher
+        )
+
+        with patch.object(compressor.logger, "disabled", True):
+            # The check wants the plug ON, too soon after it was switched OFF.
+            self.assertFalse(await guard.protect(plug).turn_on())
+            status, _ = control_api.handle(
+                "PUT",
+                f"/plugs/{PLUG_IPS[0]}/override",
+                b'{"state": "off", "duration": 60}',
+            )
+            self.assertEqual(status, 202)
+            await asyncio.sleep(1)
+
+        guard_task.cancel()
+        await dispatcher.close()
+        # The deferred ON never fired after the OFF override.
+        self.assertIs(plug.cached_state, False)
+
+    def test_expired_override_is_not_reported(self):
+        self.states[PLUG_IPS[0]].override = api.Override(True, time.time() - 1)
+
+        _, payload = self.api.handle("GET", f"/plugs/{PLUG_IPS[0]}")
+
+        self.assertIsNone(payload["override"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from benchmarks import fakes
+
+
+class FakeP110Tests(unittest.IsolatedAsyncioTestCase):
+    async def test_handshake_and_switching(self):
+        async with fakes.FakeP110Server() as server:
+            device = await fakes.FakeApiClient(server).p110("plug-1")
+            self.assertFalse((await device.get_device_info()).device_on)
+
+            await device.on()
+
+            self.assertTrue((await device.get_device_info()).device_on)
+            self.assertEqual((await device.get_current_power()).current_power, 85)
+            self.assertEqual(server.handshakes, 1)
+            self.assertEqual(server.switches, 1)
+            self.assertEqual(server.requests, 5)
+
+    async def test_injects_failures_into_device_requests_only(self):
+        async with fakes.FakeP110Server(failure_rate=1.0) as server:
+            device = await fakes.FakeApiClient(server).p110("plug-1")
+
+            with self.assertRaises(RuntimeError):
+                await device.on()
+
+            self.assertEqual(server.failures, 1)
+            self.assertFalse(server.device_on("plug-1"))
+
+
+class FakeOwmTests(unittest.IsolatedAsyncioTestCase):
+    async def test_cycles_temperatures_per_location(self):
+        async with fakes.FakeOwmServer() as server:
+            adapter = fakes.FakeOwmAdapter(server)
+            temps = [await adapter.fetch_current_temp("Paris, FR") for _ in range(3)]
+            other = await adapter.fetch_current_temp("Lyon, FR")
+
+        self.assertEqual(temps, [1.0, 4.0, 7.0])
+        self.assertEqual(other, 1.0)
+        self.assertIsNone(adapter.city_id("Paris, FR"))
+
+    def test_reset_starts_every_location_over(self):
+        server = fakes.FakeOwmServer()
+        server.temp("Paris, FR")
+        server.reset()
+
+        self.assertEqual(server.temp("Paris, FR"), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
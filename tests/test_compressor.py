@@ -0,0 +1,160 @@
+import asyncio
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.COMPRESSOR_MIN_RUN = 300
+FAKE_SETTINGS.COMPRESSOR_MIN_REST = 300
+FAKE_SETTINGS.COMPRESSOR_MAX_SWITCHES_PER_HOUR = 6
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("compressor", None)
+    compressor = importlib.import_module("compressor")
+
+
+class _FakePlug:
+    def __init__(self, ip="192.168.1.50"):
+        self.ip = ip
+        self.cached_state = None
+        self.commands = []
+
+    async def turn_on(self):
+        self.commands.append(True)
+        self.cached_state = True
+
+    async def turn_off(self):
+        self.commands.append(False)
+        self.cached_state = False
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CompressorGuardLimitTests(unittest.IsolatedAsyncioTestCase):
+    async def test_enforces_minimum_run_and_rest(self):
+        clock = _Clock()
+        guard = compressor.CompressorGuard(
+            min_run=300, min_rest=600, max_switches_per_hour=None, clock=clock
+        )
+        plug = _FakePlug()
+
+        with patch.object(compressor.logger, "disabled", True):
+            self.assertTrue(await guard.request(plug, True))
+            clock.now += 100
+            self.assertFalse(await guard.request(plug, False))
+            self.assertEqual(guard.earliest(plug.ip, False), 1300)
+
+            clock.now = 1300
+            self.assertTrue(await guard.request(plug, False))
+            self.assertEqual(guard.earliest(plug.ip, True), 1900)
+
+        self.assertEqual(plug.commands, [True, False])
+
+    async def test_limits_switches_per_hour(self):
+        clock = _Clock()
+        guard = compressor.CompressorGuard(
+            min_run=0, min_rest=0, max_switches_per_hour=2, clock=clock
+        )
+        plug = _FakePlug()
+
+        with patch.object(compressor.logger, "disabled", True):
+            for state in (True, False):
+                self.assertTrue(await guard.request(plug, state))
+                clock.now += 60
+            self.assertFalse(await guard.request(plug, True))
+
+        # Allowed again when the first switch leaves the one hour window.
+        self.assertEqual(guard.earliest(plug.ip, True), 1000 + compressor.HOUR)
+
+    async def test_repeating_the_current_state_is_never_delayed(self):
+        guard = compressor.CompressorGuard(clock=_Clock())
+        plug = _FakePlug()
+        guard.record_switch(plug.ip, True)
+
+        self.assertTrue(await guard.request(plug, True))
+        self.assertEqual(plug.commands, [True])
+
+    def test_seeded_switch_keeps_counting_after_a_restart(self):
+        clock = _Clock()
+        guard = compressor.CompressorGuard(min_run=300, min_rest=300, clock=clock)
+
+        guard.record_switch("192.168.1.50", False, switched_ago=200)
+
+        self.assertEqual(guard.earliest("192.168.1.50", True), 1100)
+        self.assertEqual(guard.switched_ago("192.168.1.50"), 200)
+        self.assertIsNone(guard.switched_ago("192.168.1.51"))
+
+
+class CompressorGuardRunTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.guard = compressor.CompressorGuard(
+            min_run=0.1, min_rest=0.1, max_switches_per_hour=None
+        )
+        self.task = asyncio.create_task(self.guard.run())
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    async def test_sends_deferred_command_when_due(self):
+        plug = _FakePlug()
+        self.guard.record_switch(plug.ip, True)
+
+        with patch.object(compressor.logger, "disabled", True):
+            await self.guard.protect(plug).turn_off()
+            self.assertEqual(plug.commands, [])
+            await asyncio.sleep(0.2)
+
+        self.assertEqual(plug.commands, [False])
+
+    async def test_subscribers_hear_of_confirmed_deferred_commands(self):
+        plug = _FakePlug()
+        self.guard.record_switch(plug.ip, True)
+        confirmed = []
+        self.guard.subscribe(lambda ip, state: confirmed.append((ip, state)))
+
+        with patch.object(compressor.logger, "disabled", True):
+            await self.guard.protect(plug).turn_off()
+            await asyncio.sleep(0.2)
+
+        self.assertEqual(confirmed, [(plug.ip, False)])
+
+    async def test_later_command_replaces_or_drops_the_deferred_one(self):
+        plug = _FakePlug()
+        self.guard.record_switch(plug.ip, True)
+        protected = self.guard.protect(plug)
+
+        with patch.object(compressor.logger, "disabled", True):
+            await protected.turn_off()
+            await protected.turn_on()
+            await asyncio.sleep(0.2)
+
+        # The OFF was dropped: the plug was asked to stay ON.
+        self.assertEqual(plug.commands, [True])
+
+    async def test_many_waiting_plugs_share_one_task(self):
+        plugs = [_FakePlug(f"192.168.1.{i}") for i in range(200)]
+        tasks_before = len(asyncio.all_tasks())
+
+        with patch.object(compressor.logger, "disabled", True):
+            for plug in plugs:
+                self.guard.record_switch(plug.ip, False)
+                await self.guard.protect(plug).turn_on()
+            self.assertEqual(len(asyncio.all_tasks()), tasks_before)
+            await asyncio.sleep(0.3)
+
+        self.assertTrue(all(plug.commands == [True] for plug in plugs))
+        # Everything else is the adapter's own.
+        self.assertEqual(self.guard.protect(plugs[0]).ip, plugs[0].ip)
+
+
+if __name__ == "__main__":
+    unittest.main()
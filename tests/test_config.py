@@ -0,0 +1,139 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.CONFIG_RELOAD_INTERVAL = 5
+FAKE_SETTINGS.CONTROLLER_JITTER = 0
+FAKE_SETTINGS.CONTROLLER_TIMEOUT = 600
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("config", None)
+    config_module = importlib.import_module("config")
+
+TOML = """
+threshold = 6.0
+interval = 300
+
+[devices."192.168.1.50"]
+delta = 1.5
+"""
+
+
+def _write(path: str, content: str, mtime: float):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+    # Make the change visible even on file systems with a coarse modification time.
+    os.utime(path, (mtime, mtime))
+
+
+class ParseConfigTests(unittest.TestCase):
+    def test_device_overrides_apply_on_top_of_the_defaults(self):
+        config = config_module.parse_config(
+            {"threshold": 6.0, "devices": {"192.168.1.50": {"delta": 1.5}}}
+        )
+
+        self.assertEqual(
+            config.tuning("192.168.1.50"), config_module.Tuning(6.0, 1.5, 600)
+        )
+        self.assertEqual(
+            config.tuning("192.168.1.51", config_module.Tuning(interval=60)),
+            config_module.Tuning(6.0, 2.0, 60),
+        )
+
+    def test_rejects_invalid_values_and_unknown_keys(self):
+        for data in (
+            {"delta": 0},
+            {"interval": -1},
+            {"threshold": "warm"},
+            {"threshold": True},
+            {"treshold": 5.0},
+            {"devices": {"192.168.1.50": {"delta": -1}}},
+            {"devices": ["192.168.1.50"]},
+        ):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                config_module.parse_config(data)
+
+    def test_loads_toml_and_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            toml_path = os.path.join(directory, "config.toml")
+            json_path = os.path.join(directory, "config.json")
+            _write(toml_path, TOML, 1000)
+            _write(
+                json_path,
+                json.dumps(
+                    {
+                        "threshold": 6.0,
+                        "interval": 300,
+                        "devices": {"192.168.1.50": {"delta": 1.5}},
+                    }
+                ),
+                1000,
+            )
+
+            self.assertEqual(
+                config_module.load_config(toml_path),
+                config_module.load_config(json_path),
+            )
+
+
+class ConfigWatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def test_reloads_changed_file_and_keeps_config_when_invalid(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.toml")
+            _write(path, TOML, 1000)
+            watcher = config_module.ConfigWatcher(path)
+            applied = []
+            watcher.subscribe(applied.append)
+
+            self.assertFalse(await watcher.check())
+
+            _write(path, "threshold = 4.0\n", 2000)
+            self.assertTrue(await watcher.check())
+            self.assertEqual(applied[-1].tuning("192.168.1.50").threshold, 4.0)
+
+            _write(path, "threshold = 4.0\ndelta = 0\n", 3000)
+            with patch.object(config_module.logger, "disabled", True):
+                self.assertFalse(await watcher.check())
+            _write(path, "threshold = [\n", 4000)
+            with patch.object(config_module.logger, "disabled", True):
+                self.assertFalse(await watcher.check())
+
+        self.assertEqual(len(applied), 2)
+        self.assertEqual(watcher.config.tuning("").threshold, 4.0)
+
+    async def test_run_polls_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            _write(path, "{}", 1000)
+            watcher = config_module.ConfigWatcher(path, interval=0.01)
+            applied = asyncio.Event()
+            watcher.subscribe(lambda config: config.defaults and applied.set())
+            task = asyncio.create_task(watcher.run())
+            try:
+                _write(path, '{"interval": 120}', 2000)
+                await asyncio.wait_for(applied.wait(), timeout=5)
+            finally:
+                task.cancel()
+
+        self.assertEqual(watcher.config.tuning("").interval, 120)
+
+    def test_invalid_file_at_startup_raises(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            _write(path, '{"delta": 0}', 1000)
+
+            with self.assertRaises(ValueError):
+                config_module.ConfigWatcher(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
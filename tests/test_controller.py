@@ -1,188 +1,591 @@
 import importlib
+import os
 import sys
+import tempfile
+import time
 import types
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
 
 FAKE_SETTINGS = types.ModuleType("settings")
 FAKE_SETTINGS.CONTROLLER_TIMEOUT = 1
+FAKE_SETTINGS.CONTROLLER_JITTER = 0
+FAKE_SETTINGS.CONTROLLER_POLLING = "fixed"
+FAKE_SETTINGS.RECORDER_DIR = None
+FAKE_SETTINGS.METRICS_HOST = "127.0.0.1"
+FAKE_SETTINGS.METRICS_PORT = None
+FAKE_SETTINGS.API_HOST = "127.0.0.1"
+FAKE_SETTINGS.API_PORT = None
+FAKE_SETTINGS.API_MAX_OVERRIDE = 43200
+FAKE_SETTINGS.ENERGY_SAMPLE_INTERVAL = None
+FAKE_SETTINGS.ENERGY_SAMPLE_TIMEOUT = 10
+FAKE_SETTINGS.TAPO_PLUG_IP = "192.168.1.50"
 FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
 FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
-
-FAKE_WEATHER_MODULE = types.ModuleType("openweathermap_adapter.weather_adapter")
-FAKE_WEATHER_MODULE.WeatherAdapter = object
-
-FAKE_PLUG_MODULE = types.ModuleType("tapo_plug_adapter.tapo_plug_adapter")
-FAKE_PLUG_MODULE.PlugAdapter = object
+FAKE_SETTINGS.COMPRESSOR_MIN_RUN = 0
+FAKE_SETTINGS.COMPRESSOR_MIN_REST = 0
+FAKE_SETTINGS.COMPRESSOR_MAX_SWITCHES_PER_HOUR = None
+FAKE_SETTINGS.JOURNAL_FILE = None
+FAKE_SETTINGS.JOURNAL_MAX_AGE = 1800
+FAKE_SETTINGS.JOURNAL_COMPACT_THRESHOLD = 1000
+FAKE_SETTINGS.TICK_DEADLINE = 180
+FAKE_SETTINGS.CONFIG_FILE = None
+FAKE_SETTINGS.CONFIG_RELOAD_INTERVAL = 5
+FAKE_SETTINGS.STATE_FILE = None
+FAKE_SETTINGS.STATE_MAX_AGE = 1800
+FAKE_SETTINGS.TEMPERATURE_SOURCE = "owm"
+FAKE_SETTINGS.SENSOR_SOURCE = None
+FAKE_SETTINGS.SENSOR_TIMEOUT = 2
+FAKE_SETTINGS.SENSOR_MAX_AGE = 300
+FAKE_SETTINGS.OWM_STATIONS = []
+FAKE_SETTINGS.AGGREGATION_SOURCE_DEADLINE = 30
+FAKE_SETTINGS.AGGREGATION_MAX_DEVIATION = 3.0
+FAKE_SETTINGS.AGGREGATION_WINDOW = 3
+FAKE_SETTINGS.AGGREGATION_ALPHA = 0.5
+FAKE_SETTINGS.EVENT_LISTEN = None
+FAKE_SETTINGS.EVENT_SENSOR_INTERVAL = 5
+FAKE_SETTINGS.EVENT_DEBOUNCE = 2.0
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
+FAKE_SETTINGS.OWM_API_KEY = "test-key"
+FAKE_SETTINGS.OWM_LOCATION = "Paris, FR"
+FAKE_SETTINGS.OWM_CITY_IDS = {}
+FAKE_SETTINGS.TAPO_EMAIL = "user@example.com"
+FAKE_SETTINGS.TAPO_PASSWORD = "secret"
+FAKE_SETTINGS.PLUG_STATE_TTL = 300
+FAKE_SETTINGS.PLUG_STATE_RECONCILE_INTERVAL = 900
+FAKE_SETTINGS.PLUG_SESSION_IDLE_TIMEOUT = 3600
+FAKE_SETTINGS.PLUG_SESSION_HEALTH_CHECK_INTERVAL = 900
+FAKE_SETTINGS.PLUG_COMMAND_CONCURRENCY = 32
+
+FAKE_POLLING_MODULE = types.ModuleType("polling")
+FAKE_POLLING_MODULE.create_polling_policy = lambda mode, weather_adapter: None
 
 with patch.dict(
     sys.modules,
     {
         "settings": FAKE_SETTINGS,
-        "openweathermap_adapter.weather_adapter": FAKE_WEATHER_MODULE,
-        "tapo_plug_adapter.tapo_plug_adapter": FAKE_PLUG_MODULE,
+        "polling": FAKE_POLLING_MODULE,
     },
 ):
     sys.modules.pop("controller", None)
     controller = importlib.import_module("controller")
+    config = sys.modules["config"]
+
+
+def _stopping_ticker(ticks: int):
+    ticker = MagicMock()
+    ticker.wait = AsyncMock(
+        side_effect=[None] * (ticks - 1) + [RuntimeError("stop loop")]
+    )
+    return ticker
+
+
+def _plug_adapter():
+    adapter = MagicMock()
+    adapter.turn_on = AsyncMock()
+    adapter.turn_off = AsyncMock()
+    adapter.reconcile = AsyncMock()
+    return adapter
+
+
+def _session_pool(plug_adapter):
+    session_pool = MagicMock()
+    session_pool.acquire = AsyncMock(return_value=plug_adapter)
+    return session_pool
 
 
 class ControllerFlowTests(unittest.IsolatedAsyncioTestCase):
     async def test_init_turns_plug_off(self):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
+        plug_adapter = _plug_adapter()
+        session_pool = _session_pool(plug_adapter)
 
-        with patch.object(controller, "PlugAdapter", return_value=init_adapter):
-            await controller.init()
+        await controller.init(session_pool)
 
-        init_adapter.turn_off.assert_awaited_once()
+        session_pool.acquire.assert_awaited_once_with("192.168.1.50")
+        plug_adapter.turn_off.assert_awaited_once()
 
-    async def test_control_turns_on_when_temperature_above_threshold(self):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
+    async def test_control_reuses_plug_session_between_ticks(self):
+        plug_adapter = _plug_adapter()
+        session_pool = _session_pool(plug_adapter)
+
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
+
+        with patch.object(
+            controller, "SessionPool", return_value=session_pool
+        ) as session_pool_class, patch.object(
+            controller, "WeatherAdapter", return_value=weather_adapter
+        ), patch.object(
+            controller, "Ticker", return_value=_stopping_ticker(3)
+        ):
+            with self.assertRaises(RuntimeError):
+                await controller.control()
 
-        loop_adapter = MagicMock()
-        loop_adapter.turn_on = AsyncMock()
-        loop_adapter.turn_off = AsyncMock()
+        session_pool_class.assert_called_once_with()
+        # One acquire for init() and one for each of the three ticks, all from the same pool.
+        self.assertEqual(session_pool.acquire.await_count, 4)
+
+    async def test_control_turns_on_when_temperature_above_threshold(self):
+        plug_adapter = _plug_adapter()
 
         weather_adapter = MagicMock()
-        weather_adapter.get_current_temp.return_value = 7.0
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=7.0)
 
         with patch.object(
-            controller, "PlugAdapter", side_effect=[init_adapter, loop_adapter]
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
         ), patch.object(
             controller, "WeatherAdapter", return_value=weather_adapter
         ), patch.object(
-            controller.time, "sleep", side_effect=RuntimeError("stop loop")
+            controller, "Ticker", return_value=_stopping_ticker(1)
         ):
             with self.assertRaises(RuntimeError):
                 await controller.control()
 
-        loop_adapter.turn_on.assert_awaited_once()
-        loop_adapter.turn_off.assert_not_awaited()
+        plug_adapter.turn_on.assert_awaited_once()
+        # The only turn_off is the one from init().
+        plug_adapter.turn_off.assert_awaited_once()
 
     async def test_control_turns_off_when_temperature_below_threshold(self):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
-
-        loop_adapter = MagicMock()
-        loop_adapter.turn_on = AsyncMock()
-        loop_adapter.turn_off = AsyncMock()
+        plug_adapter = _plug_adapter()
 
         weather_adapter = MagicMock()
-        weather_adapter.get_current_temp.return_value = 2.5
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=2.5)
 
         with patch.object(
-            controller, "PlugAdapter", side_effect=[init_adapter, loop_adapter]
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
         ), patch.object(
             controller, "WeatherAdapter", return_value=weather_adapter
         ), patch.object(
-            controller.time, "sleep", side_effect=RuntimeError("stop loop")
+            controller, "Ticker", return_value=_stopping_ticker(1)
         ):
             with self.assertRaises(RuntimeError):
                 await controller.control()
 
-        loop_adapter.turn_off.assert_awaited_once()
-        loop_adapter.turn_on.assert_not_awaited()
+        self.assertEqual(plug_adapter.turn_off.await_count, 2)
+        plug_adapter.turn_on.assert_not_awaited()
 
     async def test_control_stays_idle_when_temperature_is_in_hysteresis_window(self):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
-
-        loop_adapter = MagicMock()
-        loop_adapter.turn_on = AsyncMock()
-        loop_adapter.turn_off = AsyncMock()
+        plug_adapter = _plug_adapter()
 
         weather_adapter = MagicMock()
-        weather_adapter.get_current_temp.return_value = 4.0
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
 
         with patch.object(
-            controller, "PlugAdapter", side_effect=[init_adapter, loop_adapter]
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
         ), patch.object(
             controller, "WeatherAdapter", return_value=weather_adapter
         ), patch.object(
-            controller.time, "sleep", side_effect=RuntimeError("stop loop")
+            controller, "Ticker", return_value=_stopping_ticker(1)
         ):
             with self.assertRaises(RuntimeError):
                 await controller.control()
 
-        loop_adapter.turn_off.assert_not_awaited()
-        loop_adapter.turn_on.assert_not_awaited()
+        plug_adapter.turn_off.assert_awaited_once()
+        plug_adapter.turn_on.assert_not_awaited()
+        plug_adapter.reconcile.assert_awaited_once()
 
     async def test_control_uses_cached_temperature_when_fetch_fails_and_cache_is_fresh(
         self,
     ):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
-
-        first_loop_adapter = MagicMock()
-        first_loop_adapter.turn_on = AsyncMock()
-        first_loop_adapter.turn_off = AsyncMock()
-
-        second_loop_adapter = MagicMock()
-        second_loop_adapter.turn_on = AsyncMock()
-        second_loop_adapter.turn_off = AsyncMock()
+        plug_adapter = _plug_adapter()
 
         weather_adapter = MagicMock()
-        weather_adapter.get_current_temp.side_effect = [7.0, RuntimeError("OWM down")]
+        weather_adapter.fetch_current_temp = AsyncMock(
+            side_effect=[7.0, RuntimeError("OWM down")]
+        )
 
         with patch.object(
-            controller,
-            "PlugAdapter",
-            side_effect=[init_adapter, first_loop_adapter, second_loop_adapter],
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
         ), patch.object(
             controller, "WeatherAdapter", return_value=weather_adapter
         ), patch.object(
             controller.time, "time", side_effect=[1000.0, 1010.0]
         ), patch.object(
-            controller.time, "sleep", side_effect=[None, RuntimeError("stop loop")]
+            controller, "Ticker", return_value=_stopping_ticker(2)
         ), patch.object(
             controller.logger, "disabled", True
         ):
             with self.assertRaises(RuntimeError):
                 await controller.control()
 
-        first_loop_adapter.turn_on.assert_awaited_once()
-        second_loop_adapter.turn_on.assert_awaited_once()
-        second_loop_adapter.turn_off.assert_not_awaited()
-
-    async def test_control_enters_safe_mode_after_30_minutes_without_valid_data(self):
-        init_adapter = MagicMock()
-        init_adapter.turn_off = AsyncMock()
+        self.assertEqual(plug_adapter.turn_on.await_count, 2)
+        plug_adapter.turn_off.assert_awaited_once()
 
-        first_loop_adapter = MagicMock()
-        first_loop_adapter.turn_on = AsyncMock()
-        first_loop_adapter.turn_off = AsyncMock()
+    async def test_tick_marks_cached_temperature_as_not_measured(self):
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(
+            side_effect=[7.0, RuntimeError("OWM down")]
+        )
+        state = controller.ControlState()
+
+        with patch.object(controller.logger, "disabled", True):
+            self.assertEqual(
+                await controller.tick(_plug_adapter(), weather_adapter, state), 7.0
+            )
+            self.assertTrue(state.measured)
+            self.assertEqual(
+                await controller.tick(_plug_adapter(), weather_adapter, state), 7.0
+            )
+            self.assertFalse(state.measured)
+
+    async def test_tick_records_decision(self):
+        plug_adapter = _plug_adapter()
+        plug_adapter.cached_state = True
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=6.0)
+        recorder = MagicMock()
+
+        await controller.tick(
+            plug_adapter, weather_adapter, controller.ControlState(), recorder
+        )
+
+        recorder.append.assert_called_once()
+        temp, decision, plug_state, latency = recorder.append.call_args.args
+        self.assertEqual(
+            (temp, decision, plug_state), (6.0, controller.Decision.ON, True)
+        )
+        self.assertGreaterEqual(latency, 0)
+
+    async def test_tick_applies_active_override_and_clears_expired_one(self):
+        plug_adapter = _plug_adapter()
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=8.0)
+        state = controller.ControlState(
+            override=controller.Override(False, time.time() + 600)
+        )
+
+        with patch.object(controller.logger, "disabled", True):
+            self.assertIsNone(
+                await controller.tick(plug_adapter, weather_adapter, state)
+            )
+            plug_adapter.turn_off.assert_awaited_once()
+            plug_adapter.turn_on.assert_not_awaited()
+            weather_adapter.fetch_current_temp.assert_not_awaited()
+            self.assertEqual(state.decision, controller.Decision.OVERRIDE)
+
+            state.override = controller.Override(False, time.time() - 1)
+            self.assertEqual(
+                await controller.tick(plug_adapter, weather_adapter, state), 8.0
+            )
+
+        self.assertIsNone(state.override)
+        plug_adapter.turn_on.assert_awaited_once()
+        self.assertEqual(state.decision, controller.Decision.ON)
+
+    async def test_tick_counts_cache_lookups_and_safe_mode_time(self):
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(
+            side_effect=[7.0, RuntimeError("OWM down"), RuntimeError("OWM down")]
+        )
+        state = controller.ControlState()
+        hits = controller.TEMP_CACHE.value(result="hit")
+        misses = controller.TEMP_CACHE.value(result="miss")
+        safe_mode_seconds = controller.SAFE_MODE_SECONDS.value()
+
+        with patch.object(controller.logger, "disabled", True):
+            await controller.tick(_plug_adapter(), weather_adapter, state)
+            await controller.tick(_plug_adapter(), weather_adapter, state)
+            state.timestamp -= 7200
+            state.first_fetch_failure_timestamp = state.timestamp
+            await controller.tick(_plug_adapter(), weather_adapter, state)
+            state.safe_mode_timestamp -= 600
+            weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
+            await controller.tick(_plug_adapter(), weather_adapter, state)
+
+        self.assertEqual(controller.TEMP_CACHE.value(result="hit"), hits + 1)
+        self.assertEqual(controller.TEMP_CACHE.value(result="miss"), misses + 1)
+        self.assertAlmostEqual(
+            controller.SAFE_MODE_SECONDS.value() - safe_mode_seconds, 600, delta=5
+        )
+        self.assertIsNone(state.safe_mode_timestamp)
 
-        second_loop_adapter = MagicMock()
-        second_loop_adapter.turn_on = AsyncMock()
-        second_loop_adapter.turn_off = AsyncMock()
+    async def test_control_enters_safe_mode_after_30_minutes_without_valid_data(self):
+        plug_adapter = _plug_adapter()
 
         weather_adapter = MagicMock()
-        weather_adapter.get_current_temp.side_effect = [
-            RuntimeError("OWM down"),
-            RuntimeError("OWM still down"),
-        ]
+        weather_adapter.fetch_current_temp = AsyncMock(
+            side_effect=[
+                RuntimeError("OWM down"),
+                RuntimeError("OWM still down"),
+            ]
+        )
 
         with patch.object(
-            controller,
-            "PlugAdapter",
-            side_effect=[init_adapter, first_loop_adapter, second_loop_adapter],
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
         ), patch.object(
             controller, "WeatherAdapter", return_value=weather_adapter
         ), patch.object(
             controller.time, "time", side_effect=[1000.0, 2801.0]
         ), patch.object(
-            controller.time, "sleep", side_effect=[None, RuntimeError("stop loop")]
+            controller, "Ticker", return_value=_stopping_ticker(2)
         ), patch.object(
             controller.logger, "disabled", True
         ):
             with self.assertRaises(RuntimeError):
                 await controller.control()
 
-        first_loop_adapter.turn_on.assert_not_awaited()
-        second_loop_adapter.turn_on.assert_awaited_once()
-        second_loop_adapter.turn_off.assert_not_awaited()
+        plug_adapter.turn_on.assert_awaited_once()
+        plug_adapter.turn_off.assert_awaited_once()
+
+    async def test_control_sleeps_for_interval_of_polling_policy(self):
+        plug_adapter = _plug_adapter()
+
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
+
+        polling_policy = MagicMock()
+        polling_policy.next_interval = AsyncMock(return_value=5400.0)
+        ticker = _stopping_ticker(1)
+
+        with patch.object(
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
+        ), patch.object(
+            controller, "WeatherAdapter", return_value=weather_adapter
+        ), patch.object(
+            controller, "Ticker", return_value=ticker
+        ), patch.object(
+            controller, "create_polling_policy", return_value=polling_policy
+        ):
+            with self.assertRaises(RuntimeError):
+                await controller.control()
+
+        polling_policy.next_interval.assert_awaited_once_with(4.0, measured=True)
+        ticker.wait.assert_awaited_once_with(5400.0)
+
+    async def test_control_keeps_running_when_a_tick_fails(self):
+        plug_adapter = _plug_adapter()
+        plug_adapter.turn_on = AsyncMock(side_effect=RuntimeError("plug down"))
+
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=7.0)
+
+        with patch.object(
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
+        ), patch.object(
+            controller, "WeatherAdapter", return_value=weather_adapter
+        ), patch.object(
+            controller, "Ticker", return_value=_stopping_ticker(2)
+        ), patch.object(
+            controller.logger, "disabled", True
+        ):
+            with self.assertRaisesRegex(RuntimeError, "stop loop"):
+                await controller.control()
+
+        self.assertEqual(plug_adapter.turn_on.await_count, 2)
+
+    async def test_control_resumes_from_fresh_snapshot_without_switching_off(self):
+        plug_adapter = _plug_adapter()
+        plug_adapter.cached_state = True
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(side_effect=RuntimeError("down"))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.json")
+            controller.save_snapshot(
+                path,
+                controller.Snapshot(
+                    temp=6.0,
+                    timestamp=time.time() - 60,
+                    first_fetch_failure_timestamp=None,
+                    plug_state=True,
+                    last_switch_timestamp=time.time() - 120,
+                    saved_at=time.time() - 60,
+                ),
+            )
+            with patch.object(
+                controller, "SessionPool", return_value=_session_pool(plug_adapter)
+            ), patch.object(
+                controller, "WeatherAdapter", return_value=weather_adapter
+            ), patch.object(
+                controller, "Ticker", return_value=_stopping_ticker(1)
+            ), patch.object(
+                controller, "STATE_FILE", path
+            ), patch.object(
+                controller.logger, "disabled", True
+            ):
+                with self.assertRaises(RuntimeError):
+                    await controller.control()
+
+            saved = controller.load_snapshot(path)
+
+        plug_adapter.turn_off.assert_not_awaited()
+        plug_adapter.assume_state.assert_called_once()
+        self.assertIs(plug_adapter.assume_state.call_args.args[0], True)
+        # The fetch failed, so the tick decided on the restored temperature.
+        plug_adapter.turn_on.assert_awaited_once()
+        self.assertEqual(saved.temp, 6.0)
+        self.assertTrue(saved.plug_state)
+        # The compressor run that started before the restart keeps its start time.
+        self.assertAlmostEqual(saved.last_switch_timestamp, time.time() - 120, delta=5)
+
+    async def test_control_ignores_stale_snapshot(self):
+        plug_adapter = _plug_adapter()
+        plug_adapter.cached_state = None
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.json")
+            controller.save_snapshot(
+                path, controller.Snapshot(temp=6.0, saved_at=time.time() - 86400)
+            )
+            with patch.object(
+                controller, "SessionPool", return_value=_session_pool(plug_adapter)
+            ), patch.object(
+                controller, "WeatherAdapter", return_value=weather_adapter
+            ), patch.object(
+                controller, "Ticker", return_value=_stopping_ticker(1)
+            ), patch.object(
+                controller, "STATE_FILE", path
+            ):
+                with self.assertRaises(RuntimeError):
+                    await controller.control()
+
+        plug_adapter.assume_state.assert_not_called()
+        plug_adapter.turn_off.assert_awaited_once()
+
+    async def test_control_replays_unconfirmed_command_from_journal(self):
+        plug_adapter = _plug_adapter()
+        plug_adapter.ip = controller.TAPO_PLUG_IP
+        plug_adapter.cached_state = None
+        weather_adapter = MagicMock()
+        # Inside the hysteresis window, so the tick itself doesn't switch the plug.
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "journal")
+            previous = controller.CommandJournal(path)
+            await previous.record(controller.TAPO_PLUG_IP, True)
+            await previous.close()
+            with patch.object(
+                controller, "SessionPool", return_value=_session_pool(plug_adapter)
+            ), patch.object(
+                controller, "WeatherAdapter", return_value=weather_adapter
+            ), patch.object(
+                controller, "Ticker", return_value=_stopping_ticker(1)
+            ), patch.object(
+                controller, "JOURNAL_FILE", path
+            ), patch.object(
+                controller.logger, "disabled", True
+            ):
+                with self.assertRaises(RuntimeError):
+                    await controller.control()
+
+        # Switched ON as journaled before the restart, without the startup OFF in between.
+        plug_adapter.turn_off.assert_not_awaited()
+        plug_adapter.turn_on.assert_awaited_once()
+
+    async def test_control_applies_reloaded_config_without_a_new_session(self):
+        plug_adapter = _plug_adapter()
+        session_pool = _session_pool(plug_adapter)
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(return_value=4.5)
+        ticker = MagicMock()
+        ticks = 0
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write('{"threshold": 6.0}')
+
+            async def _wait(interval=None):
+                nonlocal ticks
+                ticks += 1
+                if ticks == 2:
+                    raise RuntimeError("stop loop")
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write('{"threshold": 4.0, "interval": 120}')
+                os.utime(path, (time.time() + 10, time.time() + 10))
+                await watcher.check()
+
+            ticker.wait = AsyncMock(side_effect=_wait)
+            watcher = controller.ConfigWatcher(path)
+
+            with patch.object(
+                controller, "SessionPool", return_value=session_pool
+            ), patch.object(
+                controller, "WeatherAdapter", return_value=weather_adapter
+            ), patch.object(
+                controller, "Ticker", return_value=ticker
+            ), patch.object(
+                controller, "ConfigWatcher", return_value=watcher
+            ), patch.object(
+                controller, "CONFIG_FILE", path
+            ), patch.object(
+                controller.logger, "disabled", True
+            ):
+                with self.assertRaisesRegex(RuntimeError, "stop loop"):
+                    await controller.control()
+
+        # 4.5 °C is idle below a 6 °C threshold and ON above a 4 °C one, on the same session.
+        plug_adapter.reconcile.assert_awaited_once()
+        plug_adapter.turn_on.assert_awaited_once()
+        self.assertEqual(ticker.interval, 120)
+        self.assertEqual(session_pool.acquire.await_count, 3)
+
+    def test_reloaded_config_reaches_the_polling_policy(self):
+        # The adaptive and forecast policies keep the regular cadence in `interval`.
+        polling_policy = types.SimpleNamespace(threshold=5.0, delta=2.0, interval=600)
+        ticker = MagicMock()
+
+        with patch.object(controller.logger, "disabled", True):
+            controller._apply_config(
+                config.parse_config({"threshold": 4.0, "delta": 1.0, "interval": 120}),
+                controller.ControlState(),
+                ticker,
+                polling_policy,
+                None,
+            )
+
+        self.assertEqual(
+            vars(polling_policy), {"threshold": 4.0, "delta": 1.0, "interval": 120}
+        )
+        self.assertEqual(ticker.interval, 120)
+
+    async def test_control_in_event_mode_waits_for_readings_instead_of_ticker(self):
+        plug_adapter = _plug_adapter()
+        weather_adapter = MagicMock()
+        weather_adapter.fetch_current_temp = AsyncMock(side_effect=RuntimeError("down"))
+        ticker = _stopping_ticker(1)
+
+        event_source = controller.EventSource(
+            weather_adapter, heartbeat=5, debounce=0.01
+        )
+        wait = event_source.wait
+        waits = 0
+
+        async def _wait():
+            nonlocal waits
+            waits += 1
+            if waits == 1:
+                event_source.push(7.0)
+                return await wait()
+            raise RuntimeError("stop loop")
+
+        event_source.wait = _wait
+
+        with patch.object(
+            controller, "SessionPool", return_value=_session_pool(plug_adapter)
+        ), patch.object(
+            controller, "WeatherAdapter", return_value=weather_adapter
+        ), patch.object(
+            controller, "Ticker", return_value=ticker
+        ), patch.object(
+            controller, "EventSource", return_value=event_source
+        ), patch.object(
+            controller, "CONTROLLER_POLLING", "event"
+        ), patch.object(
+            controller.logger, "disabled", True
+        ):
+            with self.assertRaisesRegex(RuntimeError, "stop loop"):
+                await controller.control()
+
+        ticker.wait.assert_not_awaited()
+        # The first tick had no reading yet; the pushed one crossed the threshold and switched the plug on.
+        plug_adapter.turn_on.assert_awaited_once()
 
 
 if __name__ == "__main__":
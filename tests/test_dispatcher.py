@@ -0,0 +1,167 @@
+import asyncio
+import importlib
+import sys
+import time
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.PLUG_COMMAND_CONCURRENCY = 32
+
+FAKE_SESSION_POOL_MODULE = types.ModuleType("tapo_plug_adapter.session_pool")
+FAKE_SESSION_POOL_MODULE.SessionPool = object
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "tapo_plug_adapter.session_pool": FAKE_SESSION_POOL_MODULE,
+    },
+):
+    sys.modules.pop("tapo_plug_adapter.dispatcher", None)
+    dispatcher_module = importlib.import_module("tapo_plug_adapter.dispatcher")
+
+
+class _FakePlug:
+    def __init__(self, ip, delay=0.05, error=None):
+        self.ip = ip
+        self.cached_state = None
+        self.commands = []
+        self._delay = delay
+        self._error = error
+
+    async def _switch(self, state):
+        self.commands.append(state)
+        await asyncio.sleep(self._delay)
+        if self._error:
+            raise self._error
+        self.cached_state = state
+
+    async def turn_on(self):
+        await self._switch(True)
+
+    async def turn_off(self):
+        await self._switch(False)
+
+
+def _session_pool(plugs):
+    session_pool = MagicMock()
+    session_pool.acquire = AsyncMock(side_effect=lambda ip: plugs[ip])
+    return session_pool
+
+
+class CommandDispatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def test_dispatch_runs_commands_concurrently(self):
+        plugs = {f"192.168.1.{i}": _FakePlug(f"192.168.1.{i}") for i in range(20)}
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool(plugs))
+
+        started = time.monotonic()
+        results = await dispatcher.dispatch({ip: True for ip in plugs})
+
+        # Twenty commands of 50 ms each take about as long as one.
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([result.ip for result in results], list(plugs))
+        self.assertTrue(all(result.ok and result.state for result in results))
+        self.assertTrue(all(result.latency >= 0.04 for result in results))
+
+    async def test_concurrency_is_bounded(self):
+        plugs = {f"192.168.1.{i}": _FakePlug(f"192.168.1.{i}") for i in range(6)}
+        running = 0
+        max_running = 0
+        session_pool = _session_pool(plugs)
+        acquire = session_pool.acquire.side_effect
+
+        async def _acquire(ip):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return acquire(ip)
+
+        session_pool.acquire = AsyncMock(side_effect=_acquire)
+        dispatcher = dispatcher_module.CommandDispatcher(
+            session_pool, max_concurrency=2
+        )
+
+        await dispatcher.dispatch({ip: False for ip in plugs})
+
+        self.assertEqual(max_running, 2)
+
+    async def test_queued_commands_for_a_plug_collapse_into_the_latest(self):
+        plug = _FakePlug("192.168.1.50")
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool({plug.ip: plug}))
+
+        first = dispatcher.submit(plug.ip, True)
+        await asyncio.sleep(0.01)
+        # The first command is in flight; these two wait for it and only the last one is sent.
+        second = dispatcher.submit(plug.ip, True)
+        third = dispatcher.submit(plug.ip, False)
+
+        first_result, second_result, third_result = await asyncio.gather(
+            first, second, third
+        )
+
+        self.assertEqual(plug.commands, [True, False])
+        self.assertTrue(first_result.state)
+        self.assertIs(second_result, third_result)
+        self.assertFalse(third_result.state)
+        self.assertFalse(plug.cached_state)
+
+    async def test_failures_are_reported_per_device(self):
+        plugs = {
+            "192.168.1.50": _FakePlug("192.168.1.50"),
+            "192.168.1.51": _FakePlug("192.168.1.51", error=RuntimeError("timeout")),
+        }
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool(plugs))
+
+        with patch.object(dispatcher_module.logger, "disabled", True):
+            ok, failed = await dispatcher.dispatch({ip: True for ip in plugs})
+
+        self.assertTrue(ok.ok)
+        self.assertIsNone(ok.error)
+        self.assertFalse(failed.ok)
+        self.assertEqual(failed.error, "timeout")
+
+    async def test_unconfirmed_state_is_a_failure(self):
+        plug = _FakePlug("192.168.1.50")
+        plug.turn_on = AsyncMock()
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool({plug.ip: plug}))
+
+        with patch.object(dispatcher_module.logger, "disabled", True):
+            (result,) = await dispatcher.dispatch({plug.ip: True})
+
+        self.assertFalse(result.ok)
+
+    async def test_deferred_command_is_not_a_failure(self):
+        plug = _FakePlug("192.168.1.50")
+        plug.turn_on = AsyncMock(return_value=False)
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool({plug.ip: plug}))
+
+        with patch.object(dispatcher_module.logger, "disabled", True):
+            (result,) = await dispatcher.dispatch({plug.ip: True})
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.deferred)
+        self.assertIsNone(result.error)
+
+    async def test_close_cancels_pending_commands(self):
+        plug = _FakePlug("192.168.1.50", delay=10)
+        dispatcher = dispatcher_module.CommandDispatcher(_session_pool({plug.ip: plug}))
+        running = dispatcher.submit(plug.ip, True)
+        await asyncio.sleep(0.01)
+        queued = dispatcher.submit(plug.ip, False)
+
+        await dispatcher.close()
+
+        self.assertTrue(running.cancelled())
+        self.assertTrue(queued.cancelled())
+
+    def test_rejects_non_positive_concurrency(self):
+        with self.assertRaises(ValueError):
+            dispatcher_module.CommandDispatcher(MagicMock(), max_concurrency=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import importlib
+import sys
+import time
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.CONTROLLER_TIMEOUT = 600
+FAKE_SETTINGS.EVENT_DEBOUNCE = 0.05
+FAKE_SETTINGS.EVENT_SENSOR_INTERVAL = 5
+FAKE_SETTINGS.SENSOR_MAX_AGE = 300
+FAKE_SETTINGS.OWM_STATIONS = []
+FAKE_SETTINGS.AGGREGATION_SOURCE_DEADLINE = 30
+FAKE_SETTINGS.AGGREGATION_MAX_DEVIATION = 3.0
+FAKE_SETTINGS.AGGREGATION_WINDOW = 3
+FAKE_SETTINGS.AGGREGATION_ALPHA = 0.5
+FAKE_SETTINGS.SENSOR_TIMEOUT = 2
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("events", None)
+    events = importlib.import_module("events")
+
+
+def _fallback(temp=None):
+    provider = MagicMock()
+    provider.fetch_current_temp = AsyncMock(
+        return_value=temp, side_effect=None if temp is not None else LookupError()
+    )
+    return provider
+
+
+class ZoneTests(unittest.TestCase):
+    def test_zones_follow_the_hysteresis_boundaries(self):
+        self.assertEqual(events.zone(5.0), events.ABOVE)
+        self.assertEqual(events.zone(4.0), events.BAND)
+        self.assertEqual(events.zone(3.0), events.BELOW)
+
+
+class EventSourceTests(unittest.IsolatedAsyncioTestCase):
+    async def test_readings_inside_the_band_are_coalesced_until_the_heartbeat(self):
+        source = events.EventSource(_fallback(), heartbeat=0.2)
+        for temp in (3.5, 4.0, 4.5):
+            source.push(temp)
+
+        started = time.monotonic()
+        await source.wait()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(await source.provider.fetch_current_temp(), 4.5)
+
+    async def test_crossing_a_boundary_wakes_up_after_the_debounce(self):
+        source = events.EventSource(_fallback(), heartbeat=5)
+        source.push(4.0)
+        source.push(6.0)
+
+        started = time.monotonic()
+        await source.wait()
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(await source.provider.fetch_current_temp(), 6.0)
+
+    async def test_spike_that_falls_back_within_the_debounce_is_ignored(self):
+        source = events.EventSource(_fallback(), heartbeat=0.3, debounce=0.1)
+        waiting = asyncio.create_task(source.wait())
+        source.push(6.0)
+        await asyncio.sleep(0.02)
+        source.push(4.0)
+
+        await asyncio.sleep(0.2)
+        self.assertFalse(waiting.done())
+        await waiting
+
+    async def test_zone_already_acted_on_does_not_wake_up_again(self):
+        source = events.EventSource(_fallback(), heartbeat=0.2)
+        source.push(6.0)
+        await source.wait()
+
+        source.push(7.0)
+        started = time.monotonic()
+        await source.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        # Dropping through the band into the OFF zone needs a decision again.
+        source.push(4.0)
+        source.push(2.0)
+        started = time.monotonic()
+        await source.wait()
+        self.assertLess(time.monotonic() - started, 0.2)
+
+    async def test_provider_falls_back_without_recent_reading(self):
+        source = events.EventSource(_fallback(8.0), heartbeat=0.01)
+
+        self.assertEqual(await source.provider.fetch_current_temp(), 8.0)
+
+        source.push(4.0, timestamp=time.time() - 3600)
+        await source.wait()
+        self.assertEqual(await source.provider.fetch_current_temp(), 8.0)
+
+    async def test_listener_accepts_line_readings(self):
+        source = events.EventSource(_fallback(), heartbeat=5)
+        await source.start("127.0.0.1:0")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", source.port)
+            writer.write(b"4.0\nnot a temperature\n6.5\n")
+            await writer.drain()
+            await source.wait()
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            await source.stop()
+
+        self.assertEqual(await source.provider.fetch_current_temp(), 6.5)
+
+    async def test_polled_sensor_pushes_readings(self):
+        sensor = _fallback(2.5)
+        source = events.EventSource(_fallback(), heartbeat=5)
+        await source.start(sensor=sensor, sensor_interval=0.01)
+        try:
+            await source.wait()
+        finally:
+            await source.stop()
+
+        self.assertEqual(await source.provider.fetch_current_temp(), 2.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
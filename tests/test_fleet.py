@@ -0,0 +1,401 @@
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.CONTROLLER_TIMEOUT = 1
+FAKE_SETTINGS.CONTROLLER_JITTER = 0
+FAKE_SETTINGS.CONTROLLER_POLLING = "fixed"
+FAKE_SETTINGS.RECORDER_DIR = None
+FAKE_SETTINGS.METRICS_HOST = "127.0.0.1"
+FAKE_SETTINGS.METRICS_PORT = None
+FAKE_SETTINGS.API_HOST = "127.0.0.1"
+FAKE_SETTINGS.API_PORT = None
+FAKE_SETTINGS.API_MAX_OVERRIDE = 43200
+FAKE_SETTINGS.ENERGY_SAMPLE_INTERVAL = None
+FAKE_SETTINGS.ENERGY_SAMPLE_TIMEOUT = 10
+FAKE_SETTINGS.TAPO_PLUG_IP = "192.168.1.50"
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+FAKE_SETTINGS.COMPRESSOR_MIN_RUN = 0
+FAKE_SETTINGS.COMPRESSOR_MIN_REST = 0
+FAKE_SETTINGS.COMPRESSOR_MAX_SWITCHES_PER_HOUR = None
+FAKE_SETTINGS.JOURNAL_FILE = None
+FAKE_SETTINGS.JOURNAL_MAX_AGE = 1800
+FAKE_SETTINGS.JOURNAL_COMPACT_THRESHOLD = 1000
+FAKE_SETTINGS.FLEET_DEVICES = [
+    {"plug_ip": "192.168.1.50", "location": "Paris, FR"},
+    {"plug_ip": "192.168.1.51", "location": "Lyon, FR", "interval": 300},
+]
+FAKE_SETTINGS.FLEET_MAX_CONCURRENCY = 4
+FAKE_SETTINGS.FLEET_WORKERS = 4
+FAKE_SETTINGS.FLEET_WORKER_RESTART_DELAY = 5
+FAKE_SETTINGS.PLUG_COMMAND_CONCURRENCY = 32
+FAKE_SETTINGS.TICK_DEADLINE = 180
+FAKE_SETTINGS.CONFIG_FILE = None
+FAKE_SETTINGS.CONFIG_RELOAD_INTERVAL = 5
+FAKE_SETTINGS.STATE_FILE = None
+FAKE_SETTINGS.STATE_MAX_AGE = 1800
+FAKE_SETTINGS.TEMPERATURE_SOURCE = "owm"
+FAKE_SETTINGS.SENSOR_SOURCE = None
+FAKE_SETTINGS.SENSOR_TIMEOUT = 2
+FAKE_SETTINGS.SENSOR_MAX_AGE = 300
+FAKE_SETTINGS.OWM_STATIONS = []
+FAKE_SETTINGS.AGGREGATION_SOURCE_DEADLINE = 30
+FAKE_SETTINGS.AGGREGATION_MAX_DEVIATION = 3.0
+FAKE_SETTINGS.AGGREGATION_WINDOW = 3
+FAKE_SETTINGS.AGGREGATION_ALPHA = 0.5
+FAKE_SETTINGS.EVENT_LISTEN = None
+FAKE_SETTINGS.EVENT_SENSOR_INTERVAL = 5
+FAKE_SETTINGS.EVENT_DEBOUNCE = 2.0
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
+
+FAKE_WEATHER_MODULE = types.ModuleType("openweathermap_adapter.weather_adapter")
+FAKE_WEATHER_MODULE.WeatherAdapter = object
+
+FAKE_POLLING_MODULE = types.ModuleType("polling")
+FAKE_POLLING_MODULE.create_polling_policy = lambda mode, weather_adapter: None
+
+FAKE_WEATHER_SERVICE_MODULE = types.ModuleType("openweathermap_adapter.weather_service")
+FAKE_WEATHER_SERVICE_MODULE.LocationWeather = object
+FAKE_WEATHER_SERVICE_MODULE.WeatherService = object
+
+FAKE_SESSION_POOL_MODULE = types.ModuleType("tapo_plug_adapter.session_pool")
+FAKE_SESSION_POOL_MODULE.SessionPool = object
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "openweathermap_adapter.weather_adapter": FAKE_WEATHER_MODULE,
+        "polling": FAKE_POLLING_MODULE,
+        "openweathermap_adapter.weather_service": FAKE_WEATHER_SERVICE_MODULE,
+        "tapo_plug_adapter.session_pool": FAKE_SESSION_POOL_MODULE,
+    },
+):
+    sys.modules.pop("controller", None)
+    sys.modules.pop("fleet", None)
+    fleet = importlib.import_module("fleet")
+    temperature_provider = sys.modules["temperature_provider"]
+    config = sys.modules["config"]
+    metrics = sys.modules["metrics"]
+    journal = sys.modules["journal"]
+
+
+def _plug_adapter_factory():
+    adapter = MagicMock()
+    adapter.turn_on = AsyncMock()
+    adapter.turn_off = AsyncMock()
+    return adapter
+
+
+def _session_pool(acquire):
+    session_pool = MagicMock()
+    session_pool.acquire = AsyncMock(side_effect=acquire)
+    return session_pool
+
+
+class FleetControllerTests(unittest.IsolatedAsyncioTestCase):
+    def test_load_device_configs_uses_default_interval(self):
+        configs = fleet.load_device_configs()
+
+        self.assertEqual(
+            configs,
+            [
+                fleet.DeviceConfig("192.168.1.50", "Paris, FR", 1),
+                fleet.DeviceConfig("192.168.1.51", "Lyon, FR", 300),
+            ],
+        )
+
+    def test_devices_share_one_weather_service(self):
+        configs = [
+            fleet.DeviceConfig("192.168.1.50", "Paris, FR"),
+            fleet.DeviceConfig("192.168.1.51", "Paris, FR"),
+            fleet.DeviceConfig("192.168.1.52", "Lyon, FR"),
+        ]
+        weather_service = MagicMock()
+
+        with patch.object(
+            fleet, "WeatherService", return_value=weather_service
+        ) as weather_service_class, patch.object(
+            fleet, "SessionPool", return_value=MagicMock()
+        ):
+            controller = fleet.FleetController(configs)
+
+        weather_service_class.assert_called_once_with()
+        self.assertEqual(
+            [call.args[0] for call in weather_service.for_location.call_args_list],
+            ["Paris, FR", "Paris, FR", "Lyon, FR"],
+        )
+        first, second, _ = controller.devices
+        self.assertIsNot(first.state, second.state)
+
+    def test_device_with_sensor_prefers_it_over_owm(self):
+        configs = [
+            fleet.DeviceConfig.from_dict(
+                {
+                    "plug_ip": "192.168.1.50",
+                    "location": "Paris, FR",
+                    "sensor": "tcp://192.168.1.60:7000",
+                }
+            ),
+            fleet.DeviceConfig("192.168.1.51", "Paris, FR"),
+        ]
+        weather_service = MagicMock()
+
+        with patch.object(
+            fleet, "WeatherService", return_value=weather_service
+        ), patch.object(fleet, "SessionPool", return_value=MagicMock()):
+            controller = fleet.FleetController(configs)
+
+        with_sensor, without_sensor = controller.devices
+        self.assertIsInstance(
+            with_sensor.temperature_provider,
+            temperature_provider.FusedProvider,
+        )
+        self.assertIs(without_sensor.temperature_provider, without_sensor.weather)
+
+    def test_rejects_non_positive_interval(self):
+        for interval in (0, -60):
+            with self.assertRaises(ValueError):
+                fleet.DeviceConfig.from_dict(
+                    {
+                        "plug_ip": "192.168.1.50",
+                        "location": "Paris, FR",
+                        "interval": interval,
+                    }
+                )
+
+    def test_apply_config_swaps_tuning_and_keeps_device_state(self):
+        configs = [
+            fleet.DeviceConfig("192.168.1.50", "Paris, FR", 300),
+            fleet.DeviceConfig("192.168.1.51", "Paris, FR", 300),
+        ]
+        with patch.object(
+            fleet, "WeatherService", return_value=MagicMock()
+        ), patch.object(fleet, "SessionPool", return_value=MagicMock()):
+            controller = fleet.FleetController(configs)
+        first, second = controller.devices
+        first.state.temp = 6.0
+
+        controller.apply_config(
+            config.parse_config(
+                {"threshold": 4.0, "devices": {"192.168.1.51": {"interval": 60}}}
+            )
+        )
+
+        self.assertEqual(first.state.tuning, config.Tuning(4.0, 2.0, 300))
+        self.assertEqual(second.state.tuning, config.Tuning(4.0, 2.0, 60))
+        self.assertEqual(first.state.temp, 6.0)
+
+        # Dropping the override goes back to the interval of the device entry.
+        controller.apply_config(config.parse_config({}))
+        self.assertEqual(second.state.tuning, config.Tuning(5.0, 2.0, 300))
+
+    async def test_set_devices_adds_and_removes_plugs_while_running(self):
+        configs = [
+            fleet.DeviceConfig("192.168.1.50", "Paris, FR", 0.05),
+            fleet.DeviceConfig("192.168.1.51", "Paris, FR", 0.05),
+        ]
+        checked = []
+        added_checked = asyncio.Event()
+
+        async def _tick(plug_adapter, weather, state, recorder):
+            checked.append(plug_adapter.ip)
+            if plug_adapter.ip == "192.168.1.52":
+                added_checked.set()
+
+        def _acquire(ip):
+            adapter = _plug_adapter_factory()
+            adapter.ip = ip
+            return adapter
+
+        session_pool = _session_pool(_acquire)
+        with patch.object(
+            fleet, "WeatherService", return_value=MagicMock()
+        ), patch.object(fleet, "SessionPool", return_value=session_pool):
+            controller = fleet.FleetController(configs)
+        kept = controller.devices[0]
+
+        with patch.object(fleet, "tick", side_effect=_tick), patch.object(
+            fleet.logger, "disabled", True
+        ):
+            task = asyncio.create_task(controller.run())
+            await asyncio.sleep(0.1)
+            controller.set_devices(
+                [configs[0], fleet.DeviceConfig("192.168.1.52", "Paris, FR", 0.05)]
+            )
+            checked.clear()
+            await asyncio.wait_for(added_checked.wait(), timeout=5)
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertNotIn("192.168.1.51", checked)
+        self.assertIs(controller.devices[0], kept)
+        self.assertEqual(
+            [device.config.plug_ip for device in controller.devices],
+            ["192.168.1.50", "192.168.1.52"],
+        )
+        session_pool.discard.assert_called_once_with("192.168.1.51")
+
+    async def test_energy_of_every_plug_is_sampled_and_served(self):
+        configs = [
+            fleet.DeviceConfig("192.168.1.50", "Paris, FR", 300),
+            fleet.DeviceConfig("192.168.1.51", "Paris, FR", 300),
+        ]
+
+        def _acquire(ip):
+            adapter = _plug_adapter_factory()
+            adapter.ip = ip
+            adapter.read_energy = AsyncMock(return_value=(85, 420))
+            return adapter
+
+        with patch.object(fleet, "ENERGY_SAMPLE_INTERVAL", 0.05), patch.object(
+            fleet, "WeatherService", return_value=MagicMock()
+        ), patch.object(fleet, "SessionPool", return_value=_session_pool(_acquire)):
+            controller = fleet.FleetController(configs)
+            with patch.object(fleet, "tick", AsyncMock()), patch.object(
+                fleet.logger, "disabled", True
+            ):
+                task = asyncio.create_task(controller.run())
+                while not all(
+                    device.telemetry.status() for device in controller.devices
+                ):
+                    await asyncio.sleep(0.01)
+                controller.set_devices(configs[:1])
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        kept = controller.devices[0]
+        self.assertEqual(kept.telemetry.current_power, 85)
+        self.assertEqual(metrics.PLUG_POWER.value(ip="192.168.1.50"), 85)
+        # A removed plug is no longer exported.
+        self.assertNotIn('ip="192.168.1.51"', metrics.PLUG_POWER.render())
+
+    def test_rejects_non_positive_concurrency(self):
+        with self.assertRaises(ValueError):
+            fleet.FleetController([], max_concurrency=0)
+
+    async def test_init_turns_every_plug_off_and_staggers_first_runs(self):
+        configs = [
+            fleet.DeviceConfig(f"192.168.1.{i}", "Paris, FR", 100) for i in range(4)
+        ]
+        adapters = {}
+
+        def _plug_adapter(ip):
+            adapters[ip] = _plug_adapter_factory()
+            return adapters[ip]
+
+        with patch.object(
+            fleet, "WeatherService", return_value=MagicMock()
+        ), patch.object(
+            fleet, "SessionPool", return_value=_session_pool(_plug_adapter)
+        ):
+            controller = fleet.FleetController(configs)
+
+        await controller.init()
+
+        self.assertEqual(len(adapters), 4)
+        for adapter in adapters.values():
+            adapter.turn_off.assert_awaited_once()
+
+        first_run = controller.devices[0].next_run
+        for device, offset in zip(controller.devices, [0, 25, 50, 75]):
+            self.assertAlmostEqual(device.next_run - first_run, offset)
+
+    async def test_run_replays_the_journal_instead_of_the_startup_off(self):
+        configs = [
+            fleet.DeviceConfig(f"192.168.1.{i}", "Paris, FR", 100) for i in range(2)
+        ]
+        adapters = {}
+
+        def _plug_adapter(ip):
+            adapter = adapters.setdefault(ip, _plug_adapter_factory())
+            adapter.ip = ip
+            return adapter
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "journal")
+            previous = fleet.CommandJournal(path)
+            await previous.record("192.168.1.0", True)
+            # A plug that moved to another worker in the meantime.
+            await previous.record("192.168.1.99", True)
+            await previous.close()
+            with patch.object(
+                fleet, "WeatherService", return_value=MagicMock()
+            ), patch.object(
+                fleet, "SessionPool", return_value=_session_pool(_plug_adapter)
+            ):
+                controller = fleet.FleetController(configs)
+            with patch.object(fleet, "tick", AsyncMock()), patch.object(
+                fleet.logger, "disabled", True
+            ), patch.object(journal.logger, "disabled", True):
+                task = asyncio.create_task(controller.run(journal_file=path))
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            reopened = fleet.CommandJournal(path)
+            outstanding = reopened.outstanding()
+            await reopened.close()
+
+        adapters["192.168.1.0"].turn_on.assert_awaited_once()
+        adapters["192.168.1.0"].turn_off.assert_not_awaited()
+        adapters["192.168.1.1"].turn_off.assert_awaited_once()
+        self.assertNotIn("192.168.1.99", adapters)
+        # Only the replayed ON is left: the mock adapter never confirms a state.
+        self.assertEqual([intent.ip for intent in outstanding], ["192.168.1.0"])
+
+    async def test_run_bounds_concurrency_and_isolates_failures(self):
+        configs = [
+            fleet.DeviceConfig(f"192.168.1.{i}", "Paris, FR", 0.05) for i in range(10)
+        ]
+        running = 0
+        max_running = 0
+        ticks = []
+        second_round_done = asyncio.Event()
+
+        async def _tick(plug_adapter, weather, state, recorder):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            ticks.append(plug_adapter)
+            if len(ticks) == 2 * len(configs):
+                second_round_done.set()
+            if len(ticks) == 1:
+                raise RuntimeError("plug unreachable")
+
+        session_pool = _session_pool(lambda ip: _plug_adapter_factory())
+        with patch.object(
+            fleet, "WeatherService", return_value=MagicMock()
+        ), patch.object(fleet, "SessionPool", return_value=session_pool):
+            controller = fleet.FleetController(configs, max_concurrency=3)
+
+        with patch.object(fleet, "tick", side_effect=_tick), patch.object(
+            fleet.logger, "disabled", True
+        ):
+            task = asyncio.create_task(controller.run())
+            await asyncio.wait_for(second_round_done.wait(), timeout=5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertLessEqual(max_running, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
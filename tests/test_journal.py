@@ -0,0 +1,182 @@
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.JOURNAL_MAX_AGE = 1800
+FAKE_SETTINGS.JOURNAL_COMPACT_THRESHOLD = 1000
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("journal", None)
+    journal = importlib.import_module("journal")
+
+PLUG_IP = "192.168.1.50"
+
+
+class _FakePlug:
+    def __init__(self, ip=PLUG_IP, works=True):
+        self.ip = ip
+        self.cached_state = None
+        self.commands = []
+        self._works = works
+
+    async def turn_on(self):
+        self.commands.append(True)
+        if self._works:
+            self.cached_state = True
+
+    async def turn_off(self):
+        self.commands.append(False)
+        if self._works:
+            self.cached_state = False
+
+
+class CommandJournalTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_unconfirmed_command_survives_a_crash_and_is_replayed_once(self):
+        command_journal = journal.CommandJournal(self.path)
+        await command_journal.track(_FakePlug(works=False)).turn_on()
+        # No close(): the process died right after the command.
+
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(
+            [(intent.ip, intent.state) for intent in reopened.outstanding()],
+            [(PLUG_IP, True)],
+        )
+
+        plug = _FakePlug()
+
+        async def _acquire(ip):
+            return plug
+
+        with patch.object(journal.logger, "disabled", True):
+            self.assertEqual(await reopened.replay(_acquire), 1)
+        await reopened.close()
+
+        # Replaying again after another restart sends nothing.
+        again = journal.CommandJournal(self.path)
+        self.assertEqual(await again.replay(_acquire), 0)
+        await again.close()
+        self.assertEqual(plug.commands, [True])
+
+    async def test_only_the_latest_intent_of_a_plug_is_replayed(self):
+        command_journal = journal.CommandJournal(self.path)
+        plug = command_journal.track(_FakePlug(works=False))
+        await plug.turn_on()
+        await plug.turn_off()
+        await command_journal.track(_FakePlug("192.168.1.51")).turn_on()
+        await command_journal.close()
+
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(
+            [(intent.ip, intent.state) for intent in reopened.outstanding()],
+            [(PLUG_IP, False)],
+        )
+        await reopened.close()
+
+    async def test_intents_of_plugs_no_longer_controlled_are_dropped(self):
+        command_journal = journal.CommandJournal(self.path)
+        await command_journal.record(PLUG_IP, True)
+        await command_journal.record("192.168.1.51", True)
+        plug = _FakePlug()
+
+        async def _acquire(ip):
+            return plug
+
+        with patch.object(journal.logger, "disabled", True):
+            self.assertEqual(await command_journal.replay(_acquire, ips={PLUG_IP}), 1)
+        await command_journal.close()
+
+        self.assertEqual(plug.commands, [True])
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(reopened.outstanding(), [])
+        await reopened.close()
+
+    async def test_deferred_command_is_done_once_confirmed(self):
+        command_journal = journal.CommandJournal(self.path)
+        # The guard deferred the command, so the plug didn't confirm it yet.
+        await command_journal.track(_FakePlug(works=False)).turn_on()
+
+        command_journal.confirm(PLUG_IP, False)
+        self.assertEqual(len(command_journal.outstanding()), 1)
+        command_journal.confirm(PLUG_IP, True)
+        self.assertEqual(command_journal.outstanding(), [])
+        await command_journal.close()
+
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(reopened.outstanding(), [])
+        await reopened.close()
+
+    async def test_stale_intent_is_dropped_instead_of_replayed(self):
+        command_journal = journal.CommandJournal(self.path)
+        await command_journal.record(PLUG_IP, True)
+        plug = _FakePlug()
+
+        async def _acquire(ip):
+            return plug
+
+        with patch.object(journal.logger, "disabled", True):
+            self.assertEqual(await command_journal.replay(_acquire, max_age=-1), 0)
+
+        self.assertEqual(plug.commands, [])
+        self.assertEqual(command_journal.outstanding(), [])
+        await command_journal.close()
+
+    async def test_concurrent_commands_share_one_fsync(self):
+        command_journal = journal.CommandJournal(self.path)
+        batches = journal.JOURNAL_BATCH_RECORDS.count()
+
+        with patch.object(journal.os, "fsync", wraps=os.fsync) as fsync:
+            await asyncio.gather(
+                *(command_journal.record(f"10.0.0.{i}", True) for i in range(100))
+            )
+
+        self.assertEqual(fsync.call_count, 1)
+        self.assertEqual(journal.JOURNAL_BATCH_RECORDS.count(), batches + 1)
+        await command_journal.close()
+
+    async def test_compaction_keeps_outstanding_intents_and_sequence(self):
+        command_journal = journal.CommandJournal(self.path, compact_threshold=10)
+        for i in range(50):
+            await command_journal.track(_FakePlug(f"10.0.0.{i}")).turn_on()
+        pending = await command_journal.record(PLUG_IP, False)
+        await command_journal.close()
+
+        with open(self.path, "rb") as file:
+            self.assertLess(len(file.readlines()), 20)
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(reopened.outstanding(), [pending])
+        self.assertGreater((await reopened.record(PLUG_IP, True)).seq, pending.seq)
+        await reopened.close()
+
+    async def test_torn_record_is_cut_off(self):
+        command_journal = journal.CommandJournal(self.path)
+        intent = await command_journal.record(PLUG_IP, True)
+        await command_journal.close()
+        with open(self.path, "ab") as file:
+            file.write(b'{"seq": 2, "ip": "192.1')
+
+        with patch.object(journal.logger, "disabled", True):
+            reopened = journal.CommandJournal(self.path)
+        following = await reopened.record("192.168.1.51", False)
+        await reopened.close()
+
+        self.assertEqual(following.seq, 2)
+        reopened = journal.CommandJournal(self.path)
+        self.assertEqual(reopened.outstanding(), [intent, following])
+        await reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import logging
+import queue
+import unittest
+
+import logger
+
+
+class _RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.flushes = 0
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def flush(self):
+        self.flushes += 1
+
+
+def _record(message: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, message, None, None)
+
+
+class JsonFormatterTests(unittest.TestCase):
+    def test_formats_one_json_object_per_record(self):
+        line = logger.JsonFormatter().format(_record("Plug 🔌 on"))
+
+        entry = json.loads(line)
+        self.assertNotIn("\n", line)
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "test")
+        self.assertEqual(entry["message"], "Plug 🔌 on")
+
+
+class DroppingQueueHandlerTests(unittest.TestCase):
+    def test_drops_records_instead_of_blocking_when_full(self):
+        handler = logger.DroppingQueueHandler(queue.Queue(1))
+
+        handler.handle(_record("first"))
+        handler.handle(_record("second"))
+
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "first")
+
+
+class LogWriterTests(unittest.TestCase):
+    def test_writes_every_record_and_flushes_per_batch(self):
+        log_queue = queue.Queue()
+        handler = _RecordingHandler()
+        writer = logger.LogWriter(log_queue, [handler], batch_size=2)
+        for index in range(5):
+            log_queue.put(_record(f"message {index}"))
+
+        writer.start()
+        writer.stop()
+
+        self.assertEqual(handler.messages, [f"message {index}" for index in range(5)])
+        # Two full batches, then the remainder when stopping.
+        self.assertEqual(handler.flushes, 3)
+
+    def test_reports_dropped_records_once(self):
+        log_queue = queue.Queue()
+        handler = _RecordingHandler()
+        dropped = 0
+        writer = logger.LogWriter(log_queue, [handler], dropped=lambda: dropped)
+        writer.start()
+        dropped = 3
+        log_queue.put(_record("after the drops"))
+        writer.stop()
+
+        self.assertEqual(
+            handler.messages,
+            [
+                "after the drops",
+                "Dropped 3 log records, the log queue was full",
+            ],
+        )
+
+    def test_skips_handlers_above_the_record_level(self):
+        log_queue = queue.Queue()
+        handler = _RecordingHandler()
+        handler.setLevel(logging.WARNING)
+        writer = logger.LogWriter(log_queue, [handler])
+        log_queue.put(_record("info"))
+        log_queue.put(_record("warning", logging.WARNING))
+
+        writer.start()
+        writer.stop()
+
+        self.assertEqual(handler.messages, ["warning"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import types
+import unittest
+
+import metrics
+
+
+class HistogramTests(unittest.TestCase):
+    def test_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+        histogram.observe(0.05, operation="tick")
+        histogram.observe(0.5, operation="tick")
+        histogram.observe(5, operation="tick")
+
+        lines = histogram.render().splitlines()
+
+        self.assertEqual(lines[1], "# TYPE latency_seconds histogram")
+        self.assertIn('latency_seconds_bucket{operation="tick",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{operation="tick",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{operation="tick",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum{operation="tick"} 5.55', lines)
+        self.assertIn('latency_seconds_count{operation="tick"} 3', lines)
+
+
+class CounterTests(unittest.TestCase):
+    def test_counts_per_label_and_escapes_values(self):
+        counter = metrics.Counter("retries_total", "Retries.")
+        counter.inc(operation="turn_on")
+        counter.inc(2, operation='say "hi"')
+
+        self.assertEqual(counter.value(operation="turn_on"), 1)
+        self.assertIn('retries_total{operation="say \\"hi\\""} 2', counter.render())
+
+
+class InstrumentationTests(unittest.IsolatedAsyncioTestCase):
+    async def test_timed_records_calls_and_errors(self):
+        @metrics.timed("test_async")
+        async def _fails():
+            raise RuntimeError("boom")
+
+        @metrics.timed("test_sync")
+        def _succeeds():
+            return 42
+
+        self.assertEqual(_succeeds(), 42)
+        with self.assertRaises(RuntimeError):
+            await _fails()
+
+        self.assertEqual(metrics.OPERATION_SECONDS.count(operation="test_sync"), 1)
+        self.assertEqual(metrics.OPERATION_SECONDS.count(operation="test_async"), 1)
+        self.assertEqual(metrics.OPERATION_ERRORS.value(operation="test_async"), 1)
+        self.assertEqual(metrics.OPERATION_ERRORS.value(operation="test_sync"), 0)
+
+    def test_count_retry_uses_function_name(self):
+        def test_operation():
+            pass
+
+        metrics.count_retry(types.SimpleNamespace(fn=test_operation))
+
+        self.assertEqual(metrics.RETRIES.value(operation="test_operation"), 1)
+
+
+class MetricsServerTests(unittest.IsolatedAsyncioTestCase):
+    async def _get(self, port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_serves_registry(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter("ticks_total", "Ticks.")).inc()
+        server = metrics.MetricsServer("127.0.0.1", 0, registry)
+        await server.start()
+        try:
+            response = await self._get(server.port, "/metrics")
+            missing = await self._get(server.port, "/other")
+        finally:
+            await server.stop()
+
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK"))
+        self.assertIn(b"\r\n\r\n# HELP ticks_total Ticks.\n", response)
+        self.assertIn(b"ticks_total 1\n", response)
+        self.assertTrue(missing.startswith(b"HTTP/1.1 404"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.CONTROLLER_TIMEOUT = 600
+FAKE_SETTINGS.ADAPTIVE_WINDOW = 4
+FAKE_SETTINGS.ADAPTIVE_MIN_INTERVAL = 120
+FAKE_SETTINGS.ADAPTIVE_MAX_INTERVAL = 3600
+FAKE_SETTINGS.ADAPTIVE_MIN_RATE = 1.0
+FAKE_SETTINGS.FORECAST_REFRESH_INTERVAL = 10800
+FAKE_SETTINGS.FORECAST_WAKE_MARGIN = 2700
+FAKE_SETTINGS.FORECAST_MAX_SLEEP = 7200
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("polling", None)
+    polling = importlib.import_module("polling")
+
+
+def _weather_adapter(forecast):
+    weather_adapter = MagicMock()
+    weather_adapter.fetch_forecast = AsyncMock(return_value=forecast)
+    return weather_adapter
+
+
+class ThresholdCrossingsTests(unittest.TestCase):
+    def test_interpolates_crossings_of_both_boundaries(self):
+        points = [(0.0, 1.0), (100.0, 7.0), (200.0, 1.0)]
+
+        # 3.0 is crossed at 1/3 of each segment, 5.0 at 2/3.
+        crossings = polling.threshold_crossings(points)
+
+        self.assertEqual(
+            [round(crossing, 6) for crossing in crossings],
+            [33.333333, 66.666667, 133.333333, 166.666667],
+        )
+
+    def test_no_crossings_while_outside_the_band(self):
+        self.assertEqual(
+            polling.threshold_crossings([(0.0, 8.0), (100.0, 9.5), (200.0, 6.0)]),
+            [],
+        )
+
+
+class TemperatureSlopeTests(unittest.TestCase):
+    def test_fits_slope_through_samples(self):
+        samples = [(0.0, 4.0), (600.0, 4.6), (1200.0, 5.0), (1800.0, 5.8)]
+
+        self.assertAlmostEqual(polling.temperature_slope(samples) * 3600, 3.48)
+
+    def test_is_none_without_time_span(self):
+        self.assertIsNone(polling.temperature_slope([(0.0, 4.0)]))
+        self.assertIsNone(polling.temperature_slope([(0.0, 4.0), (0.0, 4.5)]))
+
+
+class SecondsToCrossingTests(unittest.TestCase):
+    def test_uses_trend_towards_the_boundary(self):
+        # 1 °C below the threshold, warming 4 °C per hour.
+        self.assertAlmostEqual(
+            polling.seconds_to_crossing(4.0, 4.0 / 3600, 1.0 / 3600), 900
+        )
+
+    def test_falls_back_to_minimum_rate_for_flat_or_receding_trend(self):
+        self.assertAlmostEqual(polling.seconds_to_crossing(3.5, None, 1.0 / 3600), 1800)
+        self.assertAlmostEqual(
+            polling.seconds_to_crossing(4.5, -2.0 / 3600, 1.0 / 3600), 1800
+        )
+
+    def test_only_counts_the_boundary_that_can_switch_the_plug(self):
+        # Above the band only cooling down to 3.0 switches the plug off.
+        self.assertAlmostEqual(
+            polling.seconds_to_crossing(10.0, 2.0 / 3600, 1.0 / 3600), 7 * 3600
+        )
+        # On the lower boundary and warming, the plug already switched off there.
+        self.assertAlmostEqual(
+            polling.seconds_to_crossing(3.0, 3.0 / 3600, 1.0 / 3600), 2400
+        )
+
+
+class AdaptivePolicyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_sleeps_long_far_from_the_band(self):
+        policy = polling.AdaptivePolicy(clock=lambda: 0.0)
+
+        self.assertEqual(await policy.next_interval(-10.0), 3600)
+
+    async def test_sleeps_shorter_as_temperature_approaches_threshold(self):
+        policy = polling.AdaptivePolicy(
+            clock=MagicMock(side_effect=[0.0, 1200.0, 2400.0])
+        )
+
+        intervals = [await policy.next_interval(temp) for temp in (2.0, 3.0, 4.0)]
+
+        # Warming 3 °C per hour: the threshold is 40 and then 20 minutes away.
+        self.assertEqual(intervals[0], 3600)
+        self.assertAlmostEqual(intervals[1], 1200)
+        self.assertAlmostEqual(intervals[2], 600)
+
+    async def test_respects_minimum_interval_close_to_the_boundary(self):
+        policy = polling.AdaptivePolicy(clock=MagicMock(side_effect=[0.0, 600.0]))
+
+        await policy.next_interval(4.0)
+        self.assertEqual(await policy.next_interval(4.9), 120)
+
+    async def test_cached_temperature_is_not_a_sample(self):
+        clock = MagicMock(side_effect=[0.0, 1200.0])
+        policy = polling.AdaptivePolicy(clock=clock)
+
+        await policy.next_interval(2.0)
+        await policy.next_interval(2.0, measured=False)
+        interval = await policy.next_interval(3.0)
+
+        self.assertEqual(clock.call_count, 2)
+        # The trend is 3 °C per hour, not flattened by the cached value.
+        self.assertAlmostEqual(interval, 1200)
+
+    async def test_keeps_regular_cadence_without_measurement(self):
+        self.assertEqual(await polling.AdaptivePolicy().next_interval(None), 600)
+
+    async def test_reloaded_interval_sets_the_regular_cadence(self):
+        policy = polling.AdaptivePolicy()
+        policy.interval = 120
+
+        self.assertEqual(await policy.next_interval(None), 120)
+
+    def test_rejects_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            polling.AdaptivePolicy(min_interval=600, max_interval=300)
+        with self.assertRaises(ValueError):
+            polling.AdaptivePolicy(min_rate=0)
+
+
+class ForecastPolicyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_sleeps_until_margin_before_next_crossing(self):
+        now = 100000.0
+        weather_adapter = _weather_adapter([(now + 10800, 7.0)])
+        policy = polling.ForecastPolicy(
+            weather_adapter, max_sleep=86400, clock=lambda: now
+        )
+
+        interval = await policy.next_interval(1.0)
+
+        # The lower boundary (3.0) is crossed first, a third of the way to the forecast point.
+        self.assertAlmostEqual(interval, 3600 - 2700)
+
+    async def test_sleeps_max_sleep_without_expected_crossing(self):
+        now = 100000.0
+        weather_adapter = _weather_adapter([(now + 10800, 9.0), (now + 21600, 10.0)])
+        policy = polling.ForecastPolicy(weather_adapter, clock=lambda: now)
+
+        self.assertEqual(await policy.next_interval(8.0), 7200)
+
+    async def test_polls_regularly_close_to_a_crossing(self):
+        now = 100000.0
+        weather_adapter = _weather_adapter([(now + 3600, 8.0)])
+        policy = polling.ForecastPolicy(weather_adapter, clock=lambda: now)
+
+        self.assertEqual(await policy.next_interval(4.0), 600)
+
+    async def test_reuses_forecast_until_refresh_interval(self):
+        weather_adapter = _weather_adapter([])
+        clock = MagicMock(side_effect=[0.0, 5000.0, 11000.0])
+        policy = polling.ForecastPolicy(weather_adapter, clock=clock)
+
+        for _ in range(3):
+            await policy.next_interval(8.0)
+
+        self.assertEqual(weather_adapter.fetch_forecast.await_count, 2)
+
+    async def test_falls_back_to_regular_cadence(self):
+        weather_adapter = _weather_adapter([])
+        weather_adapter.fetch_forecast.side_effect = RuntimeError("API down")
+        policy = polling.ForecastPolicy(weather_adapter)
+
+        self.assertEqual(await policy.next_interval(8.0), 600)
+        self.assertEqual(await policy.next_interval(None), 600)
+
+    async def test_reloaded_interval_sets_the_regular_cadence(self):
+        now = 100000.0
+        weather_adapter = _weather_adapter([(now + 3600, 8.0)])
+        policy = polling.ForecastPolicy(weather_adapter, clock=lambda: now)
+        policy.interval = 120
+
+        # Close to a crossing and without a measurement alike.
+        self.assertEqual(await policy.next_interval(4.0), 120)
+        self.assertEqual(await policy.next_interval(None), 120)
+
+
+class CreatePollingPolicyTests(unittest.TestCase):
+    def test_returns_policy_for_mode(self):
+        self.assertIsNone(polling.create_polling_policy("fixed", MagicMock()))
+        self.assertIsNone(polling.create_polling_policy("event", MagicMock()))
+        self.assertIsInstance(
+            polling.create_polling_policy("adaptive", MagicMock()),
+            polling.AdaptivePolicy,
+        )
+        self.assertIsInstance(
+            polling.create_polling_policy("forecast", MagicMock()),
+            polling.ForecastPolicy,
+        )
+        with self.assertRaises(ValueError):
+            polling.create_polling_policy("hourly", MagicMock())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import math
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import recorder
+
+# 2026-03-01 23:59:00 UTC and one minute later, on the next day.
+LATE = 1772409540.0
+NEXT_DAY = LATE + 60
+
+
+class RecorderTests(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self.directory = self._directory.name
+
+    def test_reads_back_appended_samples(self):
+        series_recorder = recorder.Recorder(self.directory)
+        series_recorder.append(6.5, recorder.Decision.ON, True, 0.25, timestamp=LATE)
+        series_recorder.append(None, recorder.Decision.NO_DATA, timestamp=LATE + 10)
+        series_recorder.close()
+
+        series = series_recorder.read()
+
+        self.assertEqual(len(series), 2)
+        self.assertEqual(list(series.time), [LATE, LATE + 10])
+        self.assertEqual(series.temp[0], 6.5)
+        self.assertTrue(math.isnan(series.temp[1]))
+        self.assertEqual(
+            list(series.decision), [recorder.Decision.ON, recorder.Decision.NO_DATA]
+        )
+        self.assertEqual(list(series.plug_state), [1, recorder.PLUG_STATE_UNKNOWN])
+        self.assertAlmostEqual(series.latency[0], 0.25)
+        self.assertTrue(math.isnan(series.latency[1]))
+
+    def test_segments_per_day_and_filters_by_day(self):
+        series_recorder = recorder.Recorder(self.directory)
+        series_recorder.append(2.0, recorder.Decision.OFF, False, timestamp=LATE)
+        series_recorder.append(2.5, recorder.Decision.OFF, False, timestamp=NEXT_DAY)
+        series_recorder.close()
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), ["2026-03-01", "2026-03-02"]
+        )
+        self.assertEqual(
+            list(recorder.read_series(self.directory, start=date(2026, 3, 2)).temp),
+            [2.5],
+        )
+        self.assertEqual(
+            list(recorder.read_series(self.directory, end=date(2026, 3, 1)).temp),
+            [2.0],
+        )
+
+    def test_ignores_and_repairs_torn_row(self):
+        series_recorder = recorder.Recorder(self.directory)
+        series_recorder.append(4.0, recorder.Decision.IDLE, timestamp=LATE)
+        series_recorder.close()
+        # Simulate a crash after only the time column of the next row was written.
+        with open(os.path.join(self.directory, "2026-03-01", "time"), "ab") as file:
+            file.write(b"\0" * 8)
+
+        self.assertEqual(len(recorder.read_series(self.directory)), 1)
+
+        series_recorder.append(4.5, recorder.Decision.IDLE, timestamp=LATE + 10)
+        series_recorder.close()
+
+        series = recorder.read_series(self.directory)
+        self.assertEqual(list(series.time), [LATE, LATE + 10])
+        self.assertEqual(list(series.temp), [4.0, 4.5])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc")
+    def test_many_recorders_hold_no_open_files(self):
+        open_files = len(os.listdir("/proc/self/fd"))
+        recorders = [
+            recorder.Recorder(os.path.join(self.directory, str(index)))
+            for index in range(300)
+        ]
+        for series_recorder in recorders:
+            series_recorder.append(4.0, recorder.Decision.IDLE, timestamp=LATE)
+
+        self.assertEqual(len(os.listdir("/proc/self/fd")), open_files)
+        self.assertEqual(len(recorders[-1].read()), 1)
+
+    def test_unwritable_directory_is_logged_instead_of_raised(self):
+        # A file where the recorder's directory should be makes every append fail.
+        path = os.path.join(self.directory, "file")
+        with open(path, "w"):
+            pass
+        series_recorder = recorder.Recorder(path)
+
+        with self.assertLogs(recorder.logger, "ERROR"):
+            series_recorder.append(4.0, recorder.Decision.IDLE, timestamp=LATE)
+
+    def test_reads_nothing_from_missing_directory(self):
+        self.assertEqual(
+            len(recorder.read_series(os.path.join(self.directory, "missing"))), 0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import asyncio
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+from tenacity import retry, retry_if_not_exception_type, wait_fixed
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("resilience", None)
+    resilience = importlib.import_module("resilience")
+
+
+class _Clock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        clock = _Clock()
+        breaker = resilience.CircuitBreaker(
+            "owm", failure_threshold=2, reset_timeout=60, clock=clock
+        )
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_lets_a_single_probe_through_after_the_reset_timeout(self):
+        clock = _Clock()
+        breaker = resilience.CircuitBreaker(
+            "owm", failure_threshold=1, reset_timeout=60, clock=clock
+        )
+        breaker.record_failure()
+
+        clock.now = 60
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens_the_circuit(self):
+        clock = _Clock()
+        breaker = resilience.CircuitBreaker(
+            "owm", failure_threshold=5, reset_timeout=60, clock=clock
+        )
+        for _ in range(5):
+            breaker.record_failure()
+        clock.now = 60
+        breaker.allow()
+
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, breaker.OPEN)
+        clock.now = 119
+        self.assertFalse(breaker.allow())
+        clock.now = 120
+        self.assertTrue(breaker.allow())
+
+    def test_guard_fails_fast_while_open(self):
+        breaker = resilience.CircuitBreaker(
+            "owm", failure_threshold=1, reset_timeout=60, clock=_Clock()
+        )
+        with self.assertRaises(RuntimeError):
+            with breaker.guard():
+                raise RuntimeError("down")
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            with breaker.guard():
+                self.fail("the endpoint must not be called")
+
+
+class RetryBudgetTests(unittest.TestCase):
+    def test_refills_at_the_configured_rate(self):
+        clock = _Clock()
+        budget = resilience.RetryBudget(capacity=2, per_minute=1, clock=clock)
+
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+        clock.now = 60
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+
+class RetryPolicyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_stop_at_the_deadline(self):
+        calls = []
+
+        @retry(
+            stop=resilience.stop_retrying(
+                100, budget=resilience.RetryBudget(capacity=100)
+            ),
+            wait=resilience.wait_within_deadline(wait_fixed(0.05)),
+            reraise=True,
+        )
+        async def _fails():
+            calls.append(None)
+            raise RuntimeError("down")
+
+        with resilience.deadline(0.12):
+            with self.assertRaises(RuntimeError):
+                await _fails()
+
+        self.assertLessEqual(len(calls), 4)
+        self.assertIsNone(resilience.remaining_time())
+
+    async def test_retries_stop_when_the_budget_is_exhausted(self):
+        calls = []
+
+        @retry(
+            stop=resilience.stop_retrying(
+                100, budget=resilience.RetryBudget(capacity=2, per_minute=0)
+            ),
+            reraise=True,
+        )
+        async def _fails():
+            calls.append(None)
+            raise RuntimeError("down")
+
+        with self.assertRaises(RuntimeError):
+            await _fails()
+
+        self.assertEqual(len(calls), 3)
+
+    async def test_open_circuit_is_not_retried(self):
+        breaker = resilience.CircuitBreaker("owm", failure_threshold=1)
+        breaker.record_failure()
+        calls = []
+
+        @retry(
+            stop=resilience.stop_retrying(5),
+            retry=retry_if_not_exception_type(resilience.CircuitOpenError),
+            reraise=True,
+        )
+        async def _call():
+            calls.append(None)
+            with breaker.guard():
+                await asyncio.sleep(0)
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            await _call()
+
+        self.assertEqual(len(calls), 1)
+
+    def test_inner_deadline_never_extends_the_outer_one(self):
+        with resilience.deadline(10):
+            with resilience.deadline(100):
+                self.assertLessEqual(resilience.remaining_time(), 10)
+            with resilience.deadline(1):
+                self.assertLessEqual(resilience.remaining_time(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import scheduler
+
+
+class NextDeadlineTests(unittest.TestCase):
+    def test_advances_by_one_interval_from_previous_deadline(self):
+        self.assertEqual(scheduler.next_deadline(100.0, 10.0, now=105.0), 110.0)
+
+    def test_skips_missed_deadlines_without_leaving_the_grid(self):
+        self.assertEqual(scheduler.next_deadline(100.0, 10.0, now=135.0), 140.0)
+        self.assertEqual(scheduler.next_deadline(100.0, 10.0, now=140.0), 150.0)
+
+
+class JitteredTests(unittest.TestCase):
+    def test_returns_deadline_unchanged_without_jitter(self):
+        self.assertEqual(scheduler.jittered(100.0, 0), 100.0)
+
+    def test_stays_within_jitter_bounds(self):
+        for _ in range(100):
+            self.assertTrue(95.0 <= scheduler.jittered(100.0, 5.0) <= 105.0)
+
+
+class TickerTests(unittest.IsolatedAsyncioTestCase):
+    def test_rejects_invalid_interval_and_jitter(self):
+        with self.assertRaises(ValueError):
+            scheduler.Ticker(0)
+        with self.assertRaises(ValueError):
+            scheduler.Ticker(10, jitter=10)
+
+    def test_interval_can_be_changed_but_not_below_the_jitter(self):
+        ticker = scheduler.Ticker(10, jitter=2)
+
+        ticker.interval = 5
+
+        self.assertEqual(ticker.interval, 5)
+        with self.assertRaises(ValueError):
+            ticker.interval = 2
+
+    async def test_wait_does_not_drift_with_slow_ticks(self):
+        ticker = scheduler.Ticker(600)
+        sleep = AsyncMock()
+        clock = MagicMock(side_effect=[1000.0, 1650.0, 2230.0])
+
+        with patch.object(
+            scheduler, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(scheduler.asyncio, "sleep", sleep):
+            await ticker.wait()
+            await ticker.wait()
+            await ticker.wait()
+
+        # Deadlines stay on the 1000 + k * 600 grid even when work takes a while.
+        self.assertEqual(
+            [call.args[0] for call in sleep.await_args_list], [600.0, 550.0, 570.0]
+        )
+
+    async def test_wait_with_interval_moves_the_grid(self):
+        ticker = scheduler.Ticker(600)
+        sleep = AsyncMock()
+        clock = MagicMock(side_effect=[1000.0, 1650.0, 5300.0])
+
+        with patch.object(
+            scheduler, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(scheduler.asyncio, "sleep", sleep):
+            await ticker.wait()
+            await ticker.wait(3600)
+            await ticker.wait()
+
+        self.assertEqual(
+            [call.args[0] for call in sleep.await_args_list], [600.0, 3600.0, 550.0]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.PLUG_SESSION_IDLE_TIMEOUT = 3600
+FAKE_SETTINGS.PLUG_SESSION_HEALTH_CHECK_INTERVAL = 900
+
+FAKE_PLUG_MODULE = types.ModuleType("tapo_plug_adapter.tapo_plug_adapter")
+FAKE_PLUG_MODULE.PlugAdapter = object
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "tapo_plug_adapter.tapo_plug_adapter": FAKE_PLUG_MODULE,
+    },
+):
+    sys.modules.pop("tapo_plug_adapter.session_pool", None)
+    pool_module = importlib.import_module("tapo_plug_adapter.session_pool")
+
+
+def _plug_adapter(ip, last_success=None, cached_state=None):
+    adapter = MagicMock()
+    adapter.ip = ip
+    adapter.last_success = last_success
+    adapter.cached_state = cached_state
+    adapter.check_health = AsyncMock(return_value=True)
+    return adapter
+
+
+class SessionPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire_reuses_session_for_same_ip(self):
+        with patch.object(
+            pool_module, "PlugAdapter", side_effect=_plug_adapter
+        ) as plug_adapter_class:
+            pool = pool_module.SessionPool()
+            first = await pool.acquire("192.168.1.50")
+            second = await pool.acquire("192.168.1.50")
+            other = await pool.acquire("192.168.1.51")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(plug_adapter_class.call_count, 2)
+        self.assertEqual(len(pool), 2)
+
+    async def test_acquire_skips_health_check_for_recently_used_session(self):
+        clock = MagicMock(return_value=1000.0)
+        adapter = _plug_adapter("192.168.1.50", last_success=900.0)
+
+        with patch.object(
+            pool_module, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(pool_module, "PlugAdapter", return_value=adapter):
+            pool = pool_module.SessionPool()
+            await pool.acquire("192.168.1.50")
+            await pool.acquire("192.168.1.50")
+
+        adapter.check_health.assert_not_awaited()
+
+    async def test_acquire_probes_session_that_was_quiet_too_long(self):
+        clock = MagicMock(return_value=1000.0)
+        adapter = _plug_adapter("192.168.1.50", last_success=50.0)
+
+        with patch.object(
+            pool_module, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(pool_module, "PlugAdapter", return_value=adapter):
+            pool = pool_module.SessionPool()
+            await pool.acquire("192.168.1.50")
+            await pool.acquire("192.168.1.50")
+
+        adapter.check_health.assert_awaited_once()
+
+    async def test_acquire_trusts_fresh_cached_state(self):
+        clock = MagicMock(return_value=1000.0)
+        adapter = _plug_adapter("192.168.1.50", last_success=50.0, cached_state=True)
+
+        with patch.object(
+            pool_module, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(pool_module, "PlugAdapter", return_value=adapter):
+            pool = pool_module.SessionPool()
+            await pool.acquire("192.168.1.50")
+            await pool.acquire("192.168.1.50")
+
+        adapter.check_health.assert_not_awaited()
+
+    async def test_idle_sessions_expire(self):
+        clock = MagicMock(return_value=1000.0)
+
+        with patch.object(
+            pool_module, "time", types.SimpleNamespace(monotonic=clock)
+        ), patch.object(pool_module, "PlugAdapter", side_effect=_plug_adapter):
+            pool = pool_module.SessionPool(idle_timeout=60)
+            await pool.acquire("192.168.1.50")
+            clock.return_value = 1030.0
+            await pool.acquire("192.168.1.51")
+            clock.return_value = 1070.0
+            await pool.acquire("192.168.1.51")
+
+        self.assertNotIn("192.168.1.50", pool)
+        self.assertIn("192.168.1.51", pool)
+
+    async def test_discard_forgets_session(self):
+        with patch.object(pool_module, "PlugAdapter", side_effect=_plug_adapter):
+            pool = pool_module.SessionPool()
+            await pool.acquire("192.168.1.50")
+            pool.discard("192.168.1.50")
+
+        self.assertEqual(len(pool), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
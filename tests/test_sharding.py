@@ -0,0 +1,256 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.CONTROLLER_TIMEOUT = 1
+FAKE_SETTINGS.CONTROLLER_JITTER = 0
+FAKE_SETTINGS.CONTROLLER_POLLING = "fixed"
+FAKE_SETTINGS.RECORDER_DIR = None
+FAKE_SETTINGS.METRICS_HOST = "127.0.0.1"
+FAKE_SETTINGS.METRICS_PORT = None
+FAKE_SETTINGS.API_HOST = "127.0.0.1"
+FAKE_SETTINGS.API_PORT = None
+FAKE_SETTINGS.API_MAX_OVERRIDE = 43200
+FAKE_SETTINGS.ENERGY_SAMPLE_INTERVAL = None
+FAKE_SETTINGS.ENERGY_SAMPLE_TIMEOUT = 10
+FAKE_SETTINGS.TAPO_PLUG_IP = "192.168.1.50"
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+FAKE_SETTINGS.COMPRESSOR_MIN_RUN = 0
+FAKE_SETTINGS.COMPRESSOR_MIN_REST = 0
+FAKE_SETTINGS.COMPRESSOR_MAX_SWITCHES_PER_HOUR = None
+FAKE_SETTINGS.JOURNAL_FILE = None
+FAKE_SETTINGS.JOURNAL_MAX_AGE = 1800
+FAKE_SETTINGS.JOURNAL_COMPACT_THRESHOLD = 1000
+FAKE_SETTINGS.FLEET_DEVICES = [
+    {"plug_ip": "192.168.1.50", "location": "Paris, FR"},
+    {"plug_ip": "192.168.1.51", "location": "Lyon, FR", "interval": 300},
+]
+FAKE_SETTINGS.FLEET_MAX_CONCURRENCY = 4
+FAKE_SETTINGS.FLEET_WORKERS = 4
+FAKE_SETTINGS.FLEET_WORKER_RESTART_DELAY = 5
+FAKE_SETTINGS.PLUG_COMMAND_CONCURRENCY = 32
+FAKE_SETTINGS.TICK_DEADLINE = 180
+FAKE_SETTINGS.CONFIG_FILE = None
+FAKE_SETTINGS.CONFIG_RELOAD_INTERVAL = 5
+FAKE_SETTINGS.STATE_FILE = None
+FAKE_SETTINGS.STATE_MAX_AGE = 1800
+FAKE_SETTINGS.TEMPERATURE_SOURCE = "owm"
+FAKE_SETTINGS.SENSOR_SOURCE = None
+FAKE_SETTINGS.SENSOR_TIMEOUT = 2
+FAKE_SETTINGS.SENSOR_MAX_AGE = 300
+FAKE_SETTINGS.OWM_STATIONS = []
+FAKE_SETTINGS.AGGREGATION_SOURCE_DEADLINE = 30
+FAKE_SETTINGS.AGGREGATION_MAX_DEVIATION = 3.0
+FAKE_SETTINGS.AGGREGATION_WINDOW = 3
+FAKE_SETTINGS.AGGREGATION_ALPHA = 0.5
+FAKE_SETTINGS.EVENT_LISTEN = None
+FAKE_SETTINGS.EVENT_SENSOR_INTERVAL = 5
+FAKE_SETTINGS.EVENT_DEBOUNCE = 2.0
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
+
+FAKE_WEATHER_MODULE = types.ModuleType("openweathermap_adapter.weather_adapter")
+FAKE_WEATHER_MODULE.WeatherAdapter = object
+
+FAKE_POLLING_MODULE = types.ModuleType("polling")
+FAKE_POLLING_MODULE.create_polling_policy = lambda mode, weather_adapter: None
+
+FAKE_WEATHER_SERVICE_MODULE = types.ModuleType("openweathermap_adapter.weather_service")
+FAKE_WEATHER_SERVICE_MODULE.LocationWeather = object
+FAKE_WEATHER_SERVICE_MODULE.WeatherService = object
+
+FAKE_SESSION_POOL_MODULE = types.ModuleType("tapo_plug_adapter.session_pool")
+FAKE_SESSION_POOL_MODULE.SessionPool = object
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "openweathermap_adapter.weather_adapter": FAKE_WEATHER_MODULE,
+        "polling": FAKE_POLLING_MODULE,
+        "openweathermap_adapter.weather_service": FAKE_WEATHER_SERVICE_MODULE,
+        "tapo_plug_adapter.session_pool": FAKE_SESSION_POOL_MODULE,
+    },
+):
+    sys.modules.pop("controller", None)
+    sys.modules.pop("fleet", None)
+    sys.modules.pop("sharding", None)
+    sharding = importlib.import_module("sharding")
+    fleet = sys.modules["fleet"]
+    resilience = sys.modules["resilience"]
+
+
+def _configs(count: int, start: int = 0) -> list:
+    return [
+        fleet.DeviceConfig(f"10.0.{i // 256}.{i % 256}", "Paris, FR")
+        for i in range(start, start + count)
+    ]
+
+
+class _LocationWeather:
+    def __init__(self, service, location):
+        self.service = service
+        self.location = location
+
+    async def fetch_current_temp(self):
+        return await self.service.get_temp(self.location)
+
+
+class HashRingTests(unittest.TestCase):
+    def test_spreads_plugs_evenly(self):
+        ring = sharding.HashRing(f"worker-{i}" for i in range(4))
+        counts = {}
+        for config in _configs(10000):
+            node = ring.node_for(config.plug_ip)
+            counts[node] = counts.get(node, 0) + 1
+
+        self.assertEqual(len(counts), 4)
+        for count in counts.values():
+            self.assertLess(abs(count - 2500), 2500 * 0.25)
+
+    def test_new_worker_only_takes_plugs_from_the_others(self):
+        ring = sharding.HashRing(f"worker-{i}" for i in range(4))
+        ips = [config.plug_ip for config in _configs(10000)]
+        before = {ip: ring.node_for(ip) for ip in ips}
+
+        ring.add("worker-4")
+        moved = [ip for ip in ips if ring.node_for(ip) != before[ip]]
+
+        self.assertTrue(all(ring.node_for(ip) == "worker-4" for ip in moved))
+        self.assertLess(abs(len(moved) - 2000), 2000 * 0.25)
+
+        ring.remove("worker-4")
+        self.assertEqual({ip: ring.node_for(ip) for ip in ips}, before)
+
+    def test_empty_ring_raises(self):
+        with self.assertRaises(LookupError):
+            sharding.HashRing().node_for("10.0.0.1")
+
+
+class ShardedFleetTests(unittest.TestCase):
+    def test_adding_plugs_only_changes_the_shares_that_get_them(self):
+        sharded_fleet = sharding.ShardedFleet(_configs(100), workers=4)
+        before = sharded_fleet.assignment()
+        workers = sharded_fleet._workers
+        for worker in workers:
+            worker.process = MagicMock()
+            worker.process.is_alive.return_value = True
+            worker.connection = MagicMock()
+
+        added = _configs(1, start=100)
+        with patch.object(sharding.logger, "disabled", True):
+            sharded_fleet.set_devices(_configs(100) + added)
+        after = sharded_fleet.assignment()
+
+        changed = [index for index in before if before[index] != after[index]]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(after[changed[0]], before[changed[0]] + [added[0].plug_ip])
+        for worker in workers:
+            if worker.index in changed:
+                worker.connection.send.assert_called_once_with(worker.configs)
+            else:
+                worker.connection.send.assert_not_called()
+
+    def test_dead_worker_is_restarted_after_a_growing_delay(self):
+        sharded_fleet = sharding.ShardedFleet(_configs(10), workers=1)
+        worker = sharded_fleet._workers[0]
+        started = []
+
+        def _start(worker):
+            started.append(worker.index)
+            worker.process = MagicMock(exitcode=1)
+            worker.process.is_alive.return_value = False
+            worker.connection = MagicMock()
+            worker.started_at = now
+
+        with patch.object(sharded_fleet, "_start", side_effect=_start), patch.object(
+            sharding.logger, "disabled", True
+        ):
+            now = 1000.0
+            sharded_fleet._supervise(now)
+            self.assertEqual(started, [0])
+
+            # It died at once: restarted after 5 seconds, then after 10.
+            sharded_fleet._supervise(now + 1)
+            self.assertEqual(worker.restart_at, now + 6)
+            sharded_fleet._supervise(now + 6)
+            self.assertEqual(started, [0, 0])
+            now += 6
+            sharded_fleet._supervise(now + 1)
+            self.assertEqual(worker.restart_at, now + 11)
+
+    def test_rejects_no_workers(self):
+        with self.assertRaises(ValueError):
+            sharding.ShardedFleet(_configs(1), workers=-1)
+
+
+class WeatherServerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_workers_share_the_supervisor_weather_service(self):
+        async def _get_temp(location):
+            if location != "Paris, FR":
+                raise RuntimeError("city not found")
+            return 6.5
+
+        weather_service = MagicMock()
+        weather_service.get_temp = AsyncMock(side_effect=_get_temp)
+
+        with tempfile.TemporaryDirectory() as directory:
+            server = sharding.WeatherServer(
+                weather_service, os.path.join(directory, "weather.sock")
+            )
+            await server.start()
+            try:
+                remote = sharding.RemoteWeatherService(server.path)
+                with patch.object(sharding, "LocationWeather", _LocationWeather):
+                    paris = remote.for_location("Paris, FR")
+                temps = await asyncio.gather(
+                    *(paris.fetch_current_temp() for _ in range(5))
+                )
+                with self.assertRaises(RuntimeError):
+                    await remote.get_temp("Atlantis")
+            finally:
+                await server.stop()
+
+        self.assertEqual(temps, [6.5] * 5)
+
+    async def test_requests_are_bounded_by_the_worker_deadline(self):
+        async def _get_temp(location):
+            await asyncio.sleep(10)
+
+        weather_service = MagicMock()
+        weather_service.get_temp = AsyncMock(side_effect=_get_temp)
+
+        with tempfile.TemporaryDirectory() as directory:
+            server = sharding.WeatherServer(
+                weather_service, os.path.join(directory, "weather.sock")
+            )
+            await server.start()
+            try:
+                remote = sharding.RemoteWeatherService(server.path)
+                with resilience.deadline(0.1):
+                    with self.assertRaises(TimeoutError):
+                        await remote.get_temp("Paris, FR")
+                # The supervisor gave up on its side too, within the time the worker sent.
+                reader, writer = await asyncio.open_unix_connection(server.path)
+                writer.write(b'{"location": "Paris, FR", "timeout": 0.1}\n')
+                async with asyncio.timeout(5):
+                    answer = json.loads(await reader.readline())
+                writer.close()
+            finally:
+                await server.stop()
+
+        self.assertEqual(answer, {"error": "timed out"})
+
+
+if __name__ == "__main__":
+    unittest.main()
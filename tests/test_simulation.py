@@ -0,0 +1,100 @@
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.TEMPERATURE_THRESHOLD = 5.0
+FAKE_SETTINGS.TEMPERATURE_DELTA = 2.0
+
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("util", None)
+    sys.modules.pop("simulation", None)
+    simulation = importlib.import_module("simulation")
+    util = sys.modules["util"]
+
+
+def _replay(temps, threshold, delta):
+    # Per-sample reference of the controller's decisions, starting OFF like init().
+    state = False
+    states = []
+    for temp in temps:
+        if util.is_temperature_above_threshold(temp, threshold):
+            state = True
+        elif util.is_temperature_below_threshold(temp, threshold, delta):
+            state = False
+        states.append(state)
+    return states
+
+
+class PlugStatesTests(unittest.TestCase):
+    def test_matches_per_sample_decisions(self):
+        _, temps = simulation.synthetic_series(days=3, noise=1.5, seed=7)
+        temps[50:60] = np.nan
+        thresholds, deltas = simulation.parameter_grid([3.0, 5.0, 7.5], [0.5, 2.0])
+
+        states = simulation.plug_states(temps, thresholds, deltas)
+
+        for index, (threshold, delta) in enumerate(zip(thresholds, deltas)):
+            self.assertEqual(states[index].tolist(), _replay(temps, threshold, delta))
+
+
+class SimulateTests(unittest.TestCase):
+    def test_reports_switches_on_hours_and_unsafe_minutes(self):
+        times = np.arange(6) * 600.0
+        temps = np.array([12.0, 6.0, 4.0, 2.0, -1.0, 4.0])
+
+        result = simulation.simulate(times, temps, [5.0, 11.0], [2.0, 2.0])
+
+        np.testing.assert_array_equal(result.switches, [2, 2])
+        # ON from the first sample until it drops to 2.0 (threshold 5.0), or only for the first sample.
+        np.testing.assert_allclose(result.on_hours, [0.5, 1 / 6])
+        # Threshold 11.0 is off at 6.0 and 4.0 but no sample after the first is above 10.0.
+        np.testing.assert_allclose(result.warm_minutes, [0, 0])
+        np.testing.assert_allclose(result.cold_minutes, [0, 0])
+
+    def test_unsafe_minutes_follow_the_plug_state(self):
+        times = np.arange(3) * 600.0
+        temps = np.array([12.0, 12.0, -2.0])
+
+        result = simulation.simulate(times, temps, [15.0, 5.0], [20.0, 1.0])
+
+        # Threshold 15.0 never switches on while it is warm.
+        self.assertEqual(result.warm_minutes[0], 20)
+        self.assertEqual(result.cold_minutes[1], 0)
+        self.assertEqual(result.best(1), [1])
+
+    def test_sweeps_in_chunks(self):
+        times, temps = simulation.synthetic_series(days=2)
+        thresholds, deltas = simulation.parameter_grid(
+            np.arange(2.0, 8.0, 0.5), np.arange(0.5, 3.0, 0.5)
+        )
+
+        whole = simulation.simulate(times, temps, thresholds, deltas)
+        with patch.object(simulation, "MAX_CELLS_PER_CHUNK", len(temps) * 7):
+            chunked = simulation.simulate(times, temps, thresholds, deltas)
+
+        np.testing.assert_array_equal(whole.switches, chunked.switches)
+        np.testing.assert_allclose(whole.on_hours, chunked.on_hours)
+
+    def test_rejects_mismatched_inputs(self):
+        with self.assertRaises(ValueError):
+            simulation.simulate([0.0, 1.0], [4.0], [5.0], [2.0])
+        with self.assertRaises(ValueError):
+            simulation.simulate([0.0], [4.0], [5.0, 6.0], [2.0])
+
+
+class ParameterGridTests(unittest.TestCase):
+    def test_skips_non_positive_deltas(self):
+        thresholds, deltas = simulation.parameter_grid([4.0, 5.0], [0.0, 1.0, 2.0])
+
+        self.assertEqual(len(thresholds), 4)
+        self.assertTrue((deltas > 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
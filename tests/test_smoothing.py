@@ -0,0 +1,62 @@
+import random
+import statistics
+import unittest
+
+import smoothing
+
+
+class RollingMedianTests(unittest.TestCase):
+    def test_matches_the_median_of_the_last_samples(self):
+        rng = random.Random(1)
+        samples = [round(rng.uniform(-5, 15), 1) for _ in range(200)]
+        rolling = smoothing.RollingMedian(5)
+
+        for index, sample in enumerate(samples):
+            self.assertEqual(
+                rolling.add(sample),
+                statistics.median(samples[max(0, index - 4) : index + 1]),
+            )
+
+    def test_rejects_empty_window(self):
+        with self.assertRaises(ValueError):
+            smoothing.RollingMedian(0)
+
+
+class EwmaTests(unittest.TestCase):
+    def test_starts_at_the_first_sample_and_moves_by_alpha(self):
+        ewma = smoothing.Ewma(0.25)
+
+        self.assertEqual(ewma.add(4.0), 4.0)
+        self.assertEqual(ewma.add(8.0), 5.0)
+
+    def test_rejects_invalid_alpha(self):
+        for alpha in (0, 1.5):
+            with self.subTest(alpha=alpha), self.assertRaises(ValueError):
+                smoothing.Ewma(alpha)
+
+
+class SmootherTests(unittest.TestCase):
+    def test_single_spike_does_not_cross_the_band(self):
+        smoother = smoothing.Smoother(window=3, alpha=0.5)
+
+        temps = [smoother.add(temp) for temp in (4.0, 4.2, 12.0, 4.1, 4.0)]
+
+        # The spike is the median of no window, so the signal stays far below a 5 °C threshold.
+        self.assertLess(max(temps), 5.0)
+
+
+class RejectOutliersTests(unittest.TestCase):
+    def test_drops_readings_far_from_the_median(self):
+        self.assertEqual(
+            smoothing.reject_outliers({"a": 6.0, "b": 6.5, "c": 14.0}, 3.0),
+            {"a": 6.0, "b": 6.5},
+        )
+
+    def test_keeps_everything_without_a_majority(self):
+        readings = {"a": 6.0, "b": 14.0}
+
+        self.assertEqual(smoothing.reject_outliers(readings, 3.0), readings)
+
+
+if __name__ == "__main__":
+    unittest.main()
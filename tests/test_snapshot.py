@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import snapshot
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "state.json")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_round_trips_and_leaves_no_temporary_files(self):
+        saved = snapshot.Snapshot(
+            temp=4.5,
+            timestamp=1000.0,
+            first_fetch_failure_timestamp=None,
+            plug_state=True,
+            saved_at=1010.0,
+        )
+
+        snapshot.save_snapshot(self.path, saved)
+        snapshot.save_snapshot(self.path, saved)
+
+        self.assertEqual(snapshot.load_snapshot(self.path), saved)
+        self.assertEqual(os.listdir(self._directory.name), ["state.json"])
+        self.assertEqual(saved.age(now=1070.0), 60.0)
+
+    def test_missing_or_corrupt_snapshot_is_ignored(self):
+        self.assertIsNone(snapshot.load_snapshot(self.path))
+
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write('{"version": 1, "temp": 4.')
+        with patch.object(snapshot.logger, "disabled", True):
+            self.assertIsNone(snapshot.load_snapshot(self.path))
+
+    def test_failed_write_keeps_the_previous_snapshot(self):
+        snapshot.save_snapshot(self.path, snapshot.Snapshot(temp=1.0))
+
+        with patch.object(snapshot.os, "fsync", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                snapshot.save_snapshot(self.path, snapshot.Snapshot(temp=2.0))
+
+        self.assertEqual(snapshot.load_snapshot(self.path).temp, 1.0)
+        self.assertEqual(os.listdir(self._directory.name), ["state.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
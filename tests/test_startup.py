@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from benchmarks import startup
+
+REPORT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | site
+import time:       200 |        200 |     tenacity.wait
+import time:       800 |       1000 |   tenacity
+import time:       500 |        500 |   logger
+import time:      2000 |       3500 | controller
+"""
+
+
+class ImportTimeReportTests(unittest.TestCase):
+    def test_parses_nesting_and_times(self):
+        entries = startup.parse_importtime(REPORT)
+
+        self.assertEqual(entries[1], ("site", 0, 0.3, 0.42))
+        self.assertEqual(entries[2], ("tenacity.wait", 2, 0.2, 0.2))
+
+    def test_direct_imports_stop_at_the_previous_top_level_module(self):
+        entries = startup.parse_importtime(REPORT)
+
+        self.assertEqual(
+            startup.direct_imports(entries, "controller"),
+            {"tenacity": 1.0, "logger": 0.5},
+        )
+
+
+class ColdStartTests(unittest.TestCase):
+    def test_importing_the_controller_loads_no_heavy_dependency(self):
+        code = (
+            "import sys, controller; "
+            "print(','.join(m for m in ('requests', 'pyowm.owm', 'tapo.tapo') if m in sys.modules))"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            env = startup._environment(
+                os.path.join(startup.ROOT, "settings.template"), directory
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=startup.ROOT,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+
+        self.assertEqual(result.stdout.strip(), "")
+        # Importing must not start logging or create the log directory.
+        self.assertEqual(result.stderr, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
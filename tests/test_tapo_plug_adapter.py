@@ -8,6 +8,13 @@ FAKE_SETTINGS = types.ModuleType("settings")
 FAKE_SETTINGS.TAPO_EMAIL = "test@example.com"
 FAKE_SETTINGS.TAPO_PASSWORD = "secret"
 FAKE_SETTINGS.TAPO_PLUG_IP = "192.168.1.50"
+FAKE_SETTINGS.PLUG_STATE_TTL = 3600
+FAKE_SETTINGS.PLUG_STATE_RECONCILE_INTERVAL = 3600
+FAKE_SETTINGS.TICK_DEADLINE = 180
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
 
 FAKE_TAPO = types.ModuleType("tapo")
 FAKE_TAPO.ApiClient = object
@@ -30,6 +37,7 @@ def _identity(*args, **kwargs):
 FAKE_TENACITY.retry = _fake_retry
 FAKE_TENACITY.after_log = _identity
 FAKE_TENACITY.before_log = _identity
+FAKE_TENACITY.retry_if_not_exception_type = _identity
 FAKE_TENACITY.stop_after_attempt = _identity
 FAKE_TENACITY.wait_exponential = _identity
 
@@ -44,15 +52,20 @@ with patch.dict(
 ):
     sys.modules.pop("tapo_plug_adapter.tapo_plug_adapter", None)
     plug_module = importlib.import_module("tapo_plug_adapter.tapo_plug_adapter")
+    resilience = sys.modules["resilience"]
 
 
 class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Circuit breakers are shared per plug IP; start every test with a closed one.
+        resilience._BREAKERS.clear()
+
     async def test_init_device_connects_to_configured_ip(self):
         client = MagicMock()
         device = MagicMock()
         client.p110 = AsyncMock(return_value=device)
 
-        with patch.object(plug_module, "ApiClient", return_value=client):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=client):
             adapter = plug_module.PlugAdapter()
             await plug_module.PlugAdapter._init_device.__wrapped__(adapter)
 
@@ -60,7 +73,7 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
         self.assertIs(adapter._device, device)
 
     async def test_reset_device_callback_reinitializes_device(self):
-        with patch.object(plug_module, "ApiClient", return_value=MagicMock()):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
             adapter = plug_module.PlugAdapter()
 
         adapter._init_device = AsyncMock()
@@ -68,7 +81,7 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
         adapter._init_device.assert_awaited_once()
 
     async def test_turn_on_switches_device_when_currently_off(self):
-        with patch.object(plug_module, "ApiClient", return_value=MagicMock()):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
             adapter = plug_module.PlugAdapter()
 
         device = MagicMock()
@@ -84,7 +97,7 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(adapter._state)
 
     async def test_turn_on_does_not_switch_when_already_on(self):
-        with patch.object(plug_module, "ApiClient", return_value=MagicMock()):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
             adapter = plug_module.PlugAdapter()
 
         device = MagicMock()
@@ -99,7 +112,7 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
         device.on.assert_not_awaited()
 
     async def test_turn_off_switches_device_when_currently_on(self):
-        with patch.object(plug_module, "ApiClient", return_value=MagicMock()):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
             adapter = plug_module.PlugAdapter()
 
         device = MagicMock()
@@ -116,7 +129,7 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
         self.assertFalse(adapter._state)
 
     async def test_turn_off_does_not_switch_when_already_off(self):
-        with patch.object(plug_module, "ApiClient", return_value=MagicMock()):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
             adapter = plug_module.PlugAdapter()
 
         device = MagicMock()
@@ -130,6 +143,195 @@ class PlugAdapterTests(unittest.IsolatedAsyncioTestCase):
 
         device.off.assert_not_awaited()
 
+    async def test_failed_interaction_drops_session(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(side_effect=RuntimeError("session expired"))
+        adapter._device = device
+
+        await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        self.assertIsNone(adapter._device)
+        self.assertIsNone(adapter.last_success)
+
+    async def test_check_health_keeps_responsive_session(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(
+            return_value=types.SimpleNamespace(device_on=True, nickname="Fridge Plug")
+        )
+        adapter._device = device
+
+        self.assertTrue(await adapter.check_health())
+        self.assertIs(adapter._device, device)
+        self.assertIsNotNone(adapter.last_success)
+
+    async def test_check_health_drops_failed_session(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(side_effect=RuntimeError("timeout"))
+        adapter._device = device
+
+        self.assertFalse(await adapter.check_health())
+        self.assertIsNone(adapter._device)
+
+    async def test_check_health_without_session_returns_false(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        self.assertFalse(await adapter.check_health())
+
+    async def test_turn_on_skips_network_when_cached_state_is_on(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(
+            return_value=types.SimpleNamespace(device_on=False, nickname="Fridge Plug")
+        )
+        device.on = AsyncMock()
+        adapter._device = device
+
+        await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+        await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        device.get_device_info.assert_awaited_once()
+        device.on.assert_awaited_once()
+        self.assertTrue(adapter.cached_state)
+
+    async def test_assumed_state_is_trusted_until_it_expires(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter(state_ttl=600)
+        adapter._init_device = AsyncMock()
+
+        adapter.assume_state(True, age=60)
+        await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        adapter._init_device.assert_not_awaited()
+        adapter.assume_state(True, age=600)
+        self.assertIsNone(adapter.cached_state)
+
+    async def test_turn_off_skips_network_without_session_when_cached_state_is_off(
+        self,
+    ):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        adapter._init_device = AsyncMock()
+        adapter._record_state(False)
+
+        await plug_module.PlugAdapter.turn_off.__wrapped__(adapter)
+
+        adapter._init_device.assert_not_awaited()
+
+    async def test_expired_cache_is_read_from_device(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter(state_ttl=60)
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(
+            return_value=types.SimpleNamespace(device_on=True, nickname="Fridge Plug")
+        )
+        device.on = AsyncMock()
+        adapter._device = device
+
+        with patch.object(plug_module.time, "monotonic", return_value=1000.0):
+            adapter._record_state(True)
+        with patch.object(plug_module.time, "monotonic", return_value=1061.0):
+            self.assertIsNone(adapter.cached_state)
+            await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        device.get_device_info.assert_awaited_once()
+        device.on.assert_not_awaited()
+
+    async def test_failed_interaction_clears_cached_state(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(
+            return_value=types.SimpleNamespace(device_on=True, nickname="Fridge Plug")
+        )
+        device.off = AsyncMock(side_effect=RuntimeError("connection reset"))
+        adapter._device = device
+        adapter._record_state(True)
+
+        await plug_module.PlugAdapter.turn_off.__wrapped__(adapter)
+
+        self.assertIsNone(adapter.cached_state)
+
+    async def test_reconcile_reads_device_only_when_due(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter(reconcile_interval=600)
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(
+            return_value=types.SimpleNamespace(device_on=True, nickname="Fridge Plug")
+        )
+        adapter._device = device
+
+        with patch.object(plug_module.time, "monotonic", return_value=1000.0):
+            await adapter.reconcile()
+        with patch.object(plug_module.time, "monotonic", return_value=1300.0):
+            await adapter.reconcile()
+        with patch.object(plug_module.time, "monotonic", return_value=1600.0):
+            await adapter.reconcile()
+
+        self.assertEqual(device.get_device_info.await_count, 2)
+        self.assertTrue(adapter._state)
+
+    async def test_read_energy_returns_power_and_today_energy(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        self.assertIsNone(await adapter.read_energy())
+
+        device = MagicMock()
+        device.get_current_power = AsyncMock(
+            return_value=types.SimpleNamespace(current_power=85)
+        )
+        device.get_energy_usage = AsyncMock(
+            return_value=types.SimpleNamespace(today_energy=420)
+        )
+        adapter._device = device
+
+        self.assertEqual(await adapter.read_energy(), (85, 420))
+        self.assertIsNotNone(adapter.last_success)
+
+    async def test_reconcile_does_not_connect_without_session(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        adapter._init_device = AsyncMock(side_effect=RuntimeError("Plug offline"))
+        await adapter.reconcile()
+
+        adapter._init_device.assert_not_awaited()
+        self.assertIsNone(adapter.cached_state)
+
+    async def test_repeated_failures_open_the_circuit_and_skip_commands(self):
+        with patch.object(plug_module.tapo, "ApiClient", return_value=MagicMock()):
+            adapter = plug_module.PlugAdapter()
+
+        device = MagicMock()
+        device.get_device_info = AsyncMock(side_effect=RuntimeError("timeout"))
+        for _ in range(FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD):
+            adapter._device = device
+            await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        adapter._device = device
+        device.get_device_info.reset_mock()
+        await plug_module.PlugAdapter.turn_on.__wrapped__(adapter)
+
+        device.get_device_info.assert_not_awaited()
+        with self.assertRaises(resilience.CircuitOpenError):
+            await plug_module.PlugAdapter._init_device.__wrapped__(adapter)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.ENERGY_SAMPLE_INTERVAL = 60
+FAKE_SETTINGS.ENERGY_SAMPLE_TIMEOUT = 10
+
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("telemetry", None)
+    telemetry = importlib.import_module("telemetry")
+
+
+def _session_pool(plug_adapter):
+    session_pool = MagicMock()
+    session_pool.acquire = AsyncMock(return_value=plug_adapter)
+    return session_pool
+
+
+class RollingAggregateTests(unittest.TestCase):
+    def test_groups_readings_into_bounded_buckets(self):
+        aggregate = telemetry.RollingAggregate(60, 2)
+        for timestamp, power in [(0, 80), (30, 100), (60, 0), (150, 90), (155, 95)]:
+            aggregate.add(timestamp, power, 1.0)
+
+        buckets = aggregate.buckets
+        self.assertEqual([bucket.start for bucket in buckets], [60, 120])
+        self.assertEqual(buckets[1].count, 2)
+        self.assertEqual(buckets[1].mean_power, 92.5)
+        self.assertEqual((buckets[1].power_min, buckets[1].power_max), (90, 95))
+        self.assertEqual(buckets[1].energy, 2.0)
+
+    def test_drops_readings_older_than_current_bucket(self):
+        aggregate = telemetry.RollingAggregate(60, 10)
+        aggregate.add(120, 80, 0.0)
+        aggregate.add(30, 80, 0.0)
+
+        self.assertEqual(len(aggregate.buckets), 1)
+
+
+class EnergyTelemetryTests(unittest.IsolatedAsyncioTestCase):
+    def test_integrates_energy_between_readings(self):
+        energy_telemetry = telemetry.EnergyTelemetry(MagicMock(), "192.168.1.50")
+        energy_telemetry.add_sample(0, 90, 100)
+        energy_telemetry.add_sample(60, 0, 101.5)
+        # A gap of more than two intervals is not bridged.
+        energy_telemetry.add_sample(3600, 90, 101.5)
+
+        self.assertEqual(energy_telemetry.aggregate("minute")[1].energy, 1.5)
+        self.assertEqual(energy_telemetry.aggregate("hour")[0].energy, 1.5)
+        self.assertEqual(energy_telemetry.aggregate("day")[0].count, 3)
+        self.assertEqual(energy_telemetry.current_power, 90)
+        self.assertEqual(energy_telemetry.today_energy, 101.5)
+
+    def test_exports_last_reading_as_gauges_and_status(self):
+        ip = "192.168.1.60"
+        energy_telemetry = telemetry.EnergyTelemetry(MagicMock(), ip)
+        self.assertIsNone(energy_telemetry.status())
+        energy = telemetry.PLUG_ENERGY.value(ip=ip)
+
+        energy_telemetry.add_sample(0, 90, 100)
+        energy_telemetry.add_sample(60, 30, 101.5)
+
+        self.assertEqual(
+            energy_telemetry.status(),
+            {"timestamp": 60, "power": 30, "today_energy": 101.5},
+        )
+        self.assertEqual(telemetry.PLUG_POWER.value(ip=ip), 30)
+        self.assertEqual(telemetry.PLUG_ENERGY_TODAY.value(ip=ip), 101.5)
+        self.assertEqual(telemetry.PLUG_ENERGY.value(ip=ip), energy + 1.5)
+
+        energy_telemetry.forget()
+        self.assertNotIn(f'ip="{ip}"', telemetry.PLUG_POWER.render())
+
+    async def test_sample_records_reading(self):
+        plug_adapter = MagicMock()
+        plug_adapter.read_energy = AsyncMock(return_value=(85, 420))
+        energy_telemetry = telemetry.EnergyTelemetry(
+            _session_pool(plug_adapter), "192.168.1.50", clock=lambda: 1000.0
+        )
+
+        await energy_telemetry.sample()
+
+        self.assertEqual(energy_telemetry.current_power, 85)
+        self.assertEqual(energy_telemetry.aggregate("minute")[0].start, 960)
+
+    async def test_sample_gives_up_on_slow_plug(self):
+        async def _slow_read():
+            await asyncio.sleep(10)
+
+        plug_adapter = MagicMock()
+        plug_adapter.read_energy = _slow_read
+        energy_telemetry = telemetry.EnergyTelemetry(
+            _session_pool(plug_adapter), "192.168.1.50", timeout=0.01
+        )
+
+        with patch.object(telemetry.logger, "disabled", True):
+            await energy_telemetry.sample()
+
+        self.assertIsNone(energy_telemetry.current_power)
+
+    async def test_sample_skips_plug_without_session(self):
+        plug_adapter = MagicMock()
+        plug_adapter.read_energy = AsyncMock(return_value=None)
+        energy_telemetry = telemetry.EnergyTelemetry(
+            _session_pool(plug_adapter), "192.168.1.50"
+        )
+
+        await energy_telemetry.sample()
+
+        self.assertEqual(energy_telemetry.aggregate("minute"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.SENSOR_TIMEOUT = 2
+FAKE_SETTINGS.SENSOR_MAX_AGE = 300
+FAKE_SETTINGS.OWM_STATIONS = []
+FAKE_SETTINGS.AGGREGATION_SOURCE_DEADLINE = 30
+FAKE_SETTINGS.AGGREGATION_MAX_DEVIATION = 3.0
+FAKE_SETTINGS.AGGREGATION_WINDOW = 3
+FAKE_SETTINGS.AGGREGATION_ALPHA = 0.5
+
+with patch.dict(sys.modules, {"settings": FAKE_SETTINGS}):
+    sys.modules.pop("temperature_provider", None)
+    provider_module = importlib.import_module("temperature_provider")
+
+W1_SLAVE = (
+    "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n" "72 01 4b 46 7f ff 0e 10 57 t=23125\n"
+)
+
+
+class ParseReadingTests(unittest.TestCase):
+    def test_parses_one_wire_and_plain_readings(self):
+        self.assertEqual(provider_module.parse_reading(W1_SLAVE), 23.125)
+        self.assertEqual(provider_module.parse_reading("4.5\n"), 4.5)
+
+    def test_rejects_one_wire_reading_with_failed_crc(self):
+        with self.assertRaises(ValueError):
+            provider_module.parse_reading(W1_SLAVE.replace("YES", "NO"))
+
+
+class FileSensorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_reads_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "w1_slave")
+            with open(path, "w", encoding="ascii") as file:
+                file.write(W1_SLAVE)
+
+            temp = await provider_module.FileSensor(path).fetch_current_temp()
+
+        self.assertEqual(temp, 23.125)
+
+    async def test_rejects_a_stale_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "temp")
+            with open(path, "w", encoding="ascii") as file:
+                file.write("4.5")
+            os.utime(path, (0, 0))
+
+            with self.assertRaises(ValueError):
+                await provider_module.FileSensor(path, max_age=60).fetch_current_temp()
+
+
+class SocketSensorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_reads_one_line_from_a_tcp_socket(self):
+        async def _serve(reader, writer):
+            writer.write(b"6.25\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            sensor = provider_module.create_sensor(f"tcp://127.0.0.1:{port}")
+            temp = await sensor.fetch_current_temp()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        self.assertEqual(temp, 6.25)
+
+
+class FusedProviderTests(unittest.IsolatedAsyncioTestCase):
+    async def test_prefers_the_sensor(self):
+        sensor = MagicMock(fetch_current_temp=AsyncMock(return_value=3.0))
+        owm = MagicMock(fetch_current_temp=AsyncMock(return_value=9.0))
+
+        temp = await provider_module.FusedProvider(sensor, owm).fetch_current_temp()
+
+        self.assertEqual(temp, 3.0)
+        owm.fetch_current_temp.assert_not_awaited()
+
+    async def test_falls_back_to_owm_when_the_sensor_fails(self):
+        sensor = MagicMock(fetch_current_temp=AsyncMock(side_effect=OSError("gone")))
+        owm = MagicMock(fetch_current_temp=AsyncMock(return_value=9.0))
+
+        with patch.object(provider_module.logger, "disabled", True):
+            temp = await provider_module.FusedProvider(sensor, owm).fetch_current_temp()
+
+        self.assertEqual(temp, 9.0)
+
+
+def _source(temp=None, error=None, delay=0.0):
+    async def _fetch(*args):
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return temp
+
+    return MagicMock(fetch_current_temp=_fetch)
+
+
+class AggregatedProviderTests(unittest.IsolatedAsyncioTestCase):
+    async def test_drops_outliers_failures_and_slow_sources(self):
+        provider = provider_module.AggregatedProvider(
+            {
+                "owm": _source(6.0),
+                "station": _source(6.4),
+                "spike": _source(15.0),
+                "sensor": _source(5.8),
+                "down": _source(error=RuntimeError("OWM down")),
+                "slow": _source(6.1, delay=5),
+            },
+            deadline=0.1,
+            max_deviation=3.0,
+            window=1,
+            alpha=1,
+        )
+        outliers = provider_module.REJECTED_READINGS.value(
+            source="spike", reason="outlier"
+        )
+
+        with patch.object(provider_module.logger, "disabled", True):
+            temp = await provider.fetch_current_temp()
+
+        self.assertEqual(temp, 6.0)
+        self.assertEqual(
+            provider_module.REJECTED_READINGS.value(source="spike", reason="outlier"),
+            outliers + 1,
+        )
+        self.assertGreaterEqual(
+            provider_module.REJECTED_READINGS.value(source="slow", reason="timeout"), 1
+        )
+
+    async def test_smooths_over_checks_and_fails_without_readings(self):
+        owm = MagicMock(fetch_current_temp=AsyncMock(side_effect=[4.0, 12.0, 4.0]))
+        provider = provider_module.AggregatedProvider({"owm": owm}, window=3, alpha=1)
+
+        with patch.object(provider_module.logger, "disabled", True):
+            temps = [await provider.fetch_current_temp() for _ in range(3)]
+            # A single spike moves the median of the window only half way, and only once.
+            self.assertEqual(temps, [4.0, 8.0, 4.0])
+
+            owm.fetch_current_temp.side_effect = RuntimeError("OWM down")
+            with self.assertRaises(LookupError):
+                await provider.fetch_current_temp()
+
+    async def test_aggregated_source_reads_owm_stations_and_the_sensor(self):
+        owm = MagicMock(fetch_current_temp=AsyncMock(return_value=6.0))
+
+        provider = provider_module.create_temperature_provider(
+            "aggregated", owm, "/tmp/temp", stations=["2988507"]
+        )
+
+        self.assertIsInstance(provider, provider_module.AggregatedProvider)
+        self.assertEqual(list(provider._sources), ["owm", "owm:2988507", "sensor"])
+        self.assertEqual(
+            await provider._sources["owm:2988507"].fetch_current_temp(), 6.0
+        )
+        owm.fetch_current_temp.assert_awaited_once_with("2988507")
+
+
+class CreateTemperatureProviderTests(unittest.TestCase):
+    def test_creates_the_provider_of_each_source(self):
+        owm = MagicMock()
+
+        self.assertIs(
+            provider_module.create_temperature_provider("owm", owm, None), owm
+        )
+        self.assertIsInstance(
+            provider_module.create_temperature_provider("sensor", owm, "/tmp/temp"),
+            provider_module.FileSensor,
+        )
+        self.assertIsInstance(
+            provider_module.create_temperature_provider(
+                "fused", owm, "unix:///run/sensor.sock"
+            ),
+            provider_module.FusedProvider,
+        )
+
+    def test_rejects_unknown_sources_and_missing_sensors(self):
+        with self.assertRaises(ValueError):
+            provider_module.create_temperature_provider("sensor", MagicMock(), None)
+        with self.assertRaises(ValueError):
+            provider_module.create_temperature_provider("webcam", MagicMock(), "x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import importlib
 import sys
+import threading
 import types
 import unittest
 from unittest.mock import MagicMock, patch
@@ -7,6 +8,12 @@ from unittest.mock import MagicMock, patch
 FAKE_SETTINGS = types.ModuleType("settings")
 FAKE_SETTINGS.OWM_API_KEY = "test-key"
 FAKE_SETTINGS.OWM_LOCATION = "Paris, FR"
+FAKE_SETTINGS.OWM_CITY_IDS = {}
+FAKE_SETTINGS.TICK_DEADLINE = 180
+FAKE_SETTINGS.RETRY_BUDGET_CAPACITY = 20
+FAKE_SETTINGS.RETRY_BUDGET_PER_MINUTE = 2
+FAKE_SETTINGS.CIRCUIT_FAILURE_THRESHOLD = 3
+FAKE_SETTINGS.CIRCUIT_RESET_TIMEOUT = 300
 
 FAKE_PYOWM = types.ModuleType("pyowm")
 FAKE_PYOWM.OWM = object
@@ -16,6 +23,7 @@ FAKE_EXCEPTIONS = types.SimpleNamespace(
     NotFoundError=type("NotFoundError", (Exception,), {})
 )
 FAKE_PYOWM_COMMONS.exceptions = FAKE_EXCEPTIONS
+FAKE_PYOWM.commons = FAKE_PYOWM_COMMONS
 
 FAKE_TENACITY = types.ModuleType("tenacity")
 
@@ -35,6 +43,7 @@ def _identity(*args, **kwargs):
 FAKE_TENACITY.retry = _fake_retry
 FAKE_TENACITY.after_log = _identity
 FAKE_TENACITY.before_log = _identity
+FAKE_TENACITY.retry_if_not_exception_type = _identity
 FAKE_TENACITY.stop_after_attempt = _identity
 FAKE_TENACITY.wait_exponential = _identity
 
@@ -52,51 +61,138 @@ with patch.dict(
     weather_module = importlib.import_module("openweathermap_adapter.weather_adapter")
 
 
-class WeatherAdapterTests(unittest.TestCase):
-    def test_get_current_temp_returns_temperature_from_owm(self):
+class WeatherAdapterTests(unittest.IsolatedAsyncioTestCase):
+    def test_fetch_temp_raises_not_found_error(self):
         manager = MagicMock()
-        weather = MagicMock()
-        weather.temperature.return_value = {"temp": 6.8}
-        manager.weather_at_place.return_value = types.SimpleNamespace(weather=weather)
+        manager.weather_at_place.side_effect = (
+            weather_module.pyowm.commons.exceptions.NotFoundError("City not found")
+        )
 
         owm_client = MagicMock()
         owm_client.weather_manager.return_value = manager
 
-        with patch.object(weather_module, "OWM", return_value=owm_client):
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
             adapter = weather_module.WeatherAdapter()
-            current_temp = weather_module.WeatherAdapter.get_current_temp.__wrapped__(
-                adapter
-            )
+            with self.assertRaises(
+                weather_module.pyowm.commons.exceptions.NotFoundError
+            ):
+                adapter._fetch_temp()
+
+    def test_fetch_temp_raises_generic_error(self):
+        manager = MagicMock()
+        manager.weather_at_place.side_effect = RuntimeError("Temporary API issue")
+
+        owm_client = MagicMock()
+        owm_client.weather_manager.return_value = manager
 
-        self.assertEqual(current_temp, 6.8)
-        manager.weather_at_place.assert_called_once_with("Paris, FR")
-        weather.temperature.assert_called_once_with("celsius")
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
+            adapter = weather_module.WeatherAdapter()
+            with self.assertRaises(RuntimeError):
+                adapter._fetch_temp()
 
-    def test_get_current_temp_raises_not_found_error(self):
+    async def test_fetch_current_temp_runs_owm_call_off_the_event_loop(self):
         manager = MagicMock()
-        manager.weather_at_place.side_effect = weather_module.exceptions.NotFoundError(
-            "City not found"
+        weather = MagicMock()
+        weather.temperature.return_value = {"temp": 3.1}
+        manager.weather_at_place.return_value = types.SimpleNamespace(weather=weather)
+
+        owm_client = MagicMock()
+        owm_client.weather_manager.return_value = manager
+
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
+            adapter = weather_module.WeatherAdapter("Lyon, FR")
+
+        loop_thread = threading.get_ident()
+        call_threads = []
+        manager.weather_at_place.side_effect = lambda location: (
+            call_threads.append(threading.get_ident())
+            or types.SimpleNamespace(weather=weather)
+        )
+
+        current_temp = (
+            await weather_module.WeatherAdapter.fetch_current_temp.__wrapped__(adapter)
         )
 
+        self.assertEqual(current_temp, 3.1)
+        manager.weather_at_place.assert_called_once_with("Lyon, FR")
+        self.assertNotEqual(call_threads, [loop_thread])
+
+    def test_numeric_location_is_fetched_by_city_id(self):
+        manager = MagicMock()
+        weather = MagicMock()
+        weather.temperature.return_value = {"temp": 2.5}
+        manager.weather_at_id.return_value = types.SimpleNamespace(weather=weather)
+
+        owm_client = MagicMock()
+        owm_client.weather_manager.return_value = manager
+
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
+            adapter = weather_module.WeatherAdapter("Paris, FR")
+
+        self.assertEqual(adapter._fetch_temp("2988507"), 2.5)
+        manager.weather_at_id.assert_called_once_with(2988507)
+        manager.weather_at_place.assert_not_called()
+
+    async def test_fetch_temps_by_ids_uses_group_request(self):
+        manager = MagicMock()
+        manager.weather_at_ids.return_value = [
+            types.SimpleNamespace(
+                location=types.SimpleNamespace(id=city_id),
+                weather=MagicMock(temperature=MagicMock(return_value={"temp": temp})),
+            )
+            for city_id, temp in [(2988507, 6.5), (2996944, 8.0)]
+        ]
+
         owm_client = MagicMock()
         owm_client.weather_manager.return_value = manager
 
-        with patch.object(weather_module, "OWM", return_value=owm_client):
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
             adapter = weather_module.WeatherAdapter()
-            with self.assertRaises(weather_module.exceptions.NotFoundError):
-                weather_module.WeatherAdapter.get_current_temp.__wrapped__(adapter)
 
-    def test_get_current_temp_raises_generic_error(self):
+        temps = await weather_module.WeatherAdapter.fetch_temps_by_ids.__wrapped__(
+            adapter, [2988507, 2996944]
+        )
+
+        self.assertEqual(temps, {2988507: 6.5, 2996944: 8.0})
+        manager.weather_at_ids.assert_called_once_with([2988507, 2996944])
+
+    async def test_fetch_forecast_returns_time_and_temperature_pairs(self):
         manager = MagicMock()
-        manager.weather_at_place.side_effect = RuntimeError("Temporary API issue")
+        manager.forecast_at_place.return_value.forecast.weathers = [
+            MagicMock(
+                reference_time=MagicMock(return_value=timestamp),
+                temperature=MagicMock(return_value={"temp": temp}),
+            )
+            for timestamp, temp in [(1000, 4.5), (11800, 6.0)]
+        ]
 
         owm_client = MagicMock()
         owm_client.weather_manager.return_value = manager
 
-        with patch.object(weather_module, "OWM", return_value=owm_client):
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
             adapter = weather_module.WeatherAdapter()
-            with self.assertRaises(RuntimeError):
-                weather_module.WeatherAdapter.get_current_temp.__wrapped__(adapter)
+
+        forecast = await adapter.fetch_forecast()
+
+        self.assertEqual(forecast, [(1000, 4.5), (11800, 6.0)])
+        manager.forecast_at_place.assert_called_once_with("Paris, FR", "3h")
+
+    def test_city_id_comes_from_the_configured_mapping(self):
+        owm_client = MagicMock()
+
+        with patch.object(weather_module.pyowm, "OWM", return_value=owm_client):
+            adapter = weather_module.WeatherAdapter(city_ids={"Paris, FR": 2988507})
+
+        self.assertEqual(adapter.city_id("Paris, FR"), 2988507)
+        self.assertIsNone(adapter.city_id("Lyon, FR"))
+        # pyowm's city registry is never touched.
+        owm_client.city_id_registry.assert_not_called()
+
+    def test_city_id_accepts_numeric_location(self):
+        with patch.object(weather_module.pyowm, "OWM", return_value=MagicMock()):
+            adapter = weather_module.WeatherAdapter()
+
+        self.assertEqual(adapter.city_id("2988507"), 2988507)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+import asyncio
+import importlib
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+FAKE_SETTINGS = types.ModuleType("settings")
+FAKE_SETTINGS.WEATHER_CACHE_TTL = 300
+FAKE_SETTINGS.WEATHER_BATCH_WINDOW = 0.01
+
+FAKE_WEATHER_MODULE = types.ModuleType("openweathermap_adapter.weather_adapter")
+FAKE_WEATHER_MODULE.WeatherAdapter = object
+FAKE_WEATHER_MODULE.MAX_GROUP_SIZE = 20
+
+with patch.dict(
+    sys.modules,
+    {
+        "settings": FAKE_SETTINGS,
+        "openweathermap_adapter.weather_adapter": FAKE_WEATHER_MODULE,
+    },
+):
+    sys.modules.pop("openweathermap_adapter.weather_service", None)
+    service_module = importlib.import_module("openweathermap_adapter.weather_service")
+
+CITY_IDS = {"Paris, FR": 2988507, "Lyon, FR": 2996944, "Nice, FR": 2990440}
+TEMPS = {2988507: 6.5, 2996944: 8.0, 2990440: 12.0}
+
+
+def _weather_adapter():
+    adapter = MagicMock()
+    adapter.city_id.side_effect = CITY_IDS.get
+    adapter.fetch_temps_by_ids = AsyncMock(
+        side_effect=lambda city_ids: {city_id: TEMPS[city_id] for city_id in city_ids}
+    )
+    adapter.fetch_current_temp = AsyncMock(return_value=1.5)
+    return adapter
+
+
+class WeatherServiceTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_request(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter)
+
+        temps = await asyncio.gather(*(service.get_temp("Paris, FR") for _ in range(5)))
+
+        self.assertEqual(temps, [6.5] * 5)
+        adapter.fetch_temps_by_ids.assert_awaited_once_with([2988507])
+
+    async def test_locations_requested_together_are_fetched_in_one_group(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter)
+
+        temps = await asyncio.gather(
+            service.for_location("Paris, FR").fetch_current_temp(),
+            service.for_location("Lyon, FR").fetch_current_temp(),
+        )
+
+        self.assertEqual(temps, [6.5, 8.0])
+        adapter.fetch_temps_by_ids.assert_awaited_once_with([2988507, 2996944])
+
+    async def test_groups_are_split_by_max_group_size(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter)
+
+        with patch.object(service_module, "MAX_GROUP_SIZE", 2):
+            await asyncio.gather(*(service.get_temp(location) for location in CITY_IDS))
+
+        self.assertEqual(
+            [call.args[0] for call in adapter.fetch_temps_by_ids.await_args_list],
+            [[2988507, 2996944], [2990440]],
+        )
+
+    async def test_unresolved_location_falls_back_to_place_query(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter)
+
+        temp = await service.get_temp("Smallville, US")
+
+        self.assertEqual(temp, 1.5)
+        adapter.fetch_current_temp.assert_awaited_once_with("Smallville, US")
+        adapter.fetch_temps_by_ids.assert_not_awaited()
+
+    async def test_fresh_cache_is_served_without_request(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter, ttl=300)
+
+        await service.get_temp("Paris, FR")
+        await service.get_temp("Paris, FR")
+
+        adapter.fetch_temps_by_ids.assert_awaited_once()
+        self.assertEqual(service.cached_temp("Paris, FR"), 6.5)
+
+    async def test_expired_cache_is_fetched_again(self):
+        adapter = _weather_adapter()
+        service = service_module.WeatherService(adapter, ttl=0)
+
+        await service.get_temp("Paris, FR")
+        await service.get_temp("Paris, FR")
+
+        self.assertEqual(adapter.fetch_temps_by_ids.await_count, 2)
+        self.assertIsNone(service.cached_temp("Paris, FR"))
+
+    async def test_failure_reaches_every_waiter_and_is_not_cached(self):
+        adapter = _weather_adapter()
+        adapter.fetch_temps_by_ids.side_effect = RuntimeError("OWM down")
+        service = service_module.WeatherService(adapter)
+
+        with patch.object(service_module.logger, "disabled", True):
+            results = await asyncio.gather(
+                service.get_temp("Paris, FR"),
+                service.get_temp("Paris, FR"),
+                return_exceptions=True,
+            )
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertIsNone(service.cached_temp("Paris, FR"))
+
+    async def test_missing_city_in_group_response_fails_only_that_location(self):
+        adapter = _weather_adapter()
+        adapter.fetch_temps_by_ids.side_effect = lambda city_ids: {2988507: 6.5}
+        service = service_module.WeatherService(adapter)
+
+        paris, lyon = await asyncio.gather(
+            service.get_temp("Paris, FR"),
+            service.get_temp("Lyon, FR"),
+            return_exceptions=True,
+        )
+
+        self.assertEqual(paris, 6.5)
+        self.assertIsInstance(lyon, LookupError)
+
+
+if __name__ == "__main__":
+    unittest.main()
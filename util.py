@@ -1,19 +1,24 @@
 from settings import TEMPERATURE_DELTA, TEMPERATURE_THRESHOLD
 
 
-def is_temperature_above_threshold(temp: float) -> bool:
+def is_temperature_above_threshold(temp, threshold=TEMPERATURE_THRESHOLD):
     """
     Used to determine if the fridge should be turned on.
-    :param temp: Current temperature outside.
+    :param temp: Current temperature outside. NumPy arrays are compared element-wise.
+    :param threshold: Threshold to compare against, defaults to `TEMPERATURE_THRESHOLD`.
     :return: True if the temperature is above the threshold otherwise False.
     """
-    return temp >= TEMPERATURE_THRESHOLD
+    return temp >= threshold
 
 
-def is_temperature_below_threshold(temp: float) -> bool:
+def is_temperature_below_threshold(
+    temp, threshold=TEMPERATURE_THRESHOLD, delta=TEMPERATURE_DELTA
+):
     """
     Used to determine if the fridge should be turned off.
-    :param temp: Current temperature outside.
+    :param temp: Current temperature outside. NumPy arrays are compared element-wise.
+    :param threshold: Threshold to compare against, defaults to `TEMPERATURE_THRESHOLD`.
+    :param delta: Hysteresis below the threshold, defaults to `TEMPERATURE_DELTA`.
     :return: True if the temperature is below the threshold otherwise False.
     """
-    return temp <= TEMPERATURE_THRESHOLD - TEMPERATURE_DELTA
+    return temp <= threshold - delta